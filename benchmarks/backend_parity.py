@@ -0,0 +1,231 @@
+import argparse
+from argparse import Namespace
+import logging
+import os
+import sys
+import tempfile
+from typing import List, Optional
+
+from benchmarks.synthetic import STATEMENT_SIZE, generate_pdf, synthetic_pdf
+from command.hf_pdf_cmd import HeaderFooterPDFCmd, TextAlign
+from command.impose_engine import GridImpositor, ImposeSchema, Impositor, impose
+from command.impose_pdf_cmd import ImposePDFCmd, MultiImposePDFCmd
+from command.merge_content_pdf_cmd import MergeContentPDFCmd
+from command.merge_pdf_cmd import FilenamePages, MergePDFCmd
+from command.stamp_pdf_cmd import StampPDFCmd
+from init_log import init_log
+from pdf_backend import BACKENDS, get_backend
+
+
+logger = logging.getLogger(__name__)
+
+
+def _content_function(page_no: int):
+    return [Namespace(name="Helvetica", font_size=10, x=STATEMENT_SIZE[0] // 2, y=16, align=TextAlign.CENTER, text=f"- {page_no + 1} -")]
+
+
+def _words(text: str) -> List[str]:
+    return text.split()
+
+
+def compare_outputs(filename1: str, filename2: str) -> List[str]:
+    """Compare page count, page boxes and extracted text of the files. Both are read with PyMuPDF if available."""
+    backend = get_backend("pymupdf")
+    diffs = []
+    with backend.open_document(filename1) as doc1, backend.open_document(filename2) as doc2:
+        n1, n2 = backend.page_count(doc1), backend.page_count(doc2)
+        if n1 != n2:
+            return [f"page count {n1} != {n2}"]
+        for page_no in range(n1):
+            box1, box2 = backend.page_box(doc1, page_no), backend.page_box(doc2, page_no)
+            if any(abs(a - b) > 0.01 for a, b in zip(box1, box2)):
+                diffs.append(f"page {page_no}: box {box1} != {box2}")
+            words1, words2 = _words(backend.page_text(doc1, page_no)), _words(backend.page_text(doc2, page_no))
+            if sorted(words1) != sorted(words2):
+                diffs.append(f"page {page_no}: text {words1[:8]} != {words2[:8]}")
+
+    return diffs
+
+
+# folds, schema and options of the imposition compared between the native engine and pdfimpose
+IMPOSE_CASES = [
+    ("h", ImposeSchema.SADDLE, {}),
+    ("hv", ImposeSchema.SADDLE, {"imargin": 12, "omargin": (10, 20, 30, 40), "creep": 0.5}),
+    ("vh", ImposeSchema.SADDLE, {"group": 2, "last": 1, "bind": "top"}),
+    ("hvh", ImposeSchema.PERFECT, {"imargin": 6, "omargin": 18}),
+    ("hh", ImposeSchema.PERFECT, {"group": 0, "bind": "right"}),
+]
+
+# the imposition of pdfimpose first, compared with the others
+IMPOSE_VARIANTS = {"pdfimpose": {"engine": "pdfimpose"}, "native": {}, "streaming": {"streaming": True}}
+
+
+def compare_positions(filename1: str, filename2: str) -> List[str]:
+    """Compare page boxes and the position of every extracted word."""
+    backend = get_backend("pymupdf")
+    diffs = []
+    with backend.open_document(filename1) as doc1, backend.open_document(filename2) as doc2:
+        if doc1.page_count != doc2.page_count:
+            return [f"page count {doc1.page_count} != {doc2.page_count}"]
+        for page_no in range(doc1.page_count):
+            if doc1[page_no].rect != doc2[page_no].rect:
+                diffs.append(f"page {page_no}: rect {doc1[page_no].rect} != {doc2[page_no].rect}")
+            words1, words2 = (sorted((w[4], *(round(v, 1) for v in w[:4])) for w in doc[page_no].get_text("words")) for doc in (doc1, doc2))
+            if words1 != words2:
+                diffs.append(f"page {page_no}: words {words1[:3]} != {words2[:3]}")
+
+    return diffs
+
+
+# page index -> /Rotate of the source pages rotated in the imposition checks
+ROTATIONS = {2: 90, 5: 180, 7: 270}
+
+# the size of the pages inserted in the source of the mixed size imposition checks
+MIXED_PAGE_SIZE = (612, 792)
+
+
+def rotated_copy(source: str, filename: str) -> str:
+    """Copy the source to filename with the pages of ROTATIONS rotated."""
+    backend = get_backend("pymupdf")
+    doc = backend.open(source)
+    for page_no, rotation in ROTATIONS.items():
+        if page_no < doc.page_count:
+            doc[page_no].set_rotation(rotation)
+    backend.save(doc, filename)
+    backend.close(doc)
+    return filename
+
+
+def mixed_size_copy(source: str, filename: str) -> str:
+    """Copy the source to filename with pages of MIXED_PAGE_SIZE inserted after its second page."""
+    backend = get_backend("pymupdf")
+    other = generate_pdf(os.path.splitext(filename)[0] + "-other.pdf", 3, page_size=MIXED_PAGE_SIZE, seed=1)
+    doc = backend.open(source)
+    with backend.open_document(other) as other_doc:
+        doc.insert_pdf(other_doc, start_at=min(2, doc.page_count))
+    backend.save(doc, filename)
+    backend.close(doc)
+    return filename
+
+
+def check_impose_parity(source: str, workdir: str, label: str = "") -> List[str]:
+    diffs = []
+    for folds, schema, options in IMPOSE_CASES:
+        outputs = {}
+        for name, variant in IMPOSE_VARIANTS.items():
+            outputs[name] = os.path.join(workdir, f"impose{label}-{folds}-{schema.name}-{name}.pdf")
+            ImposePDFCmd(outputs[name], [source], folds, schema=schema, **variant, **options).execute()
+        for name in list(IMPOSE_VARIANTS)[1:]:
+            diffs += [
+                f"impose{label} {folds} {schema.name} {options} {name}: {d}" for d in compare_positions(outputs["pdfimpose"], outputs[name])
+            ]
+
+    return diffs
+
+
+def check_virtual_parity(source: str, workdir: str) -> List[str]:
+    """Impose and stamp page ranges and blank pages of the source read as one document, and compare them with
+    the same commands on the merged file."""
+    pages = [FilenamePages(source, "0:5,blank,9:,3*2"), FilenamePages([source, source], [(1, 4)])]
+    merged = os.path.join(workdir, "virtual-merged.pdf")
+    MergePDFCmd(merged, pages).execute()
+
+    diffs = []
+    for name, variant in IMPOSE_VARIANTS.items():
+        outputs = [os.path.join(workdir, f"virtual-impose-{name}.pdf"), os.path.join(workdir, f"merged-impose-{name}.pdf")]
+        ImposePDFCmd(outputs[0], pages, "hv", **variant).execute()
+        ImposePDFCmd(outputs[1], [merged], "hv", **variant).execute()
+        diffs += [f"virtual impose {name}: {d}" for d in compare_positions(*outputs)]
+
+    outputs = [os.path.join(workdir, "virtual-stamp.pdf"), os.path.join(workdir, "merged-stamp.pdf")]
+    StampPDFCmd(outputs[0], pages, _content_function).execute()
+    StampPDFCmd(outputs[1], merged, _content_function).execute()
+    diffs += [f"virtual stamp: {d}" for d in compare_positions(*outputs)]
+
+    return diffs
+
+
+# grids of the layouts imposed together, and the options of pdfimpose wire that match the cut and stack duplex one.
+GRID_CASES = [
+    ((2, 2), {}),
+    ((3, 2), {"stack": True, "imargin": 8}),
+    ((2, 3), {"stack": True, "duplex": True, "imargin": 12, "omargin": (10, 20, 30, 40), "last": 1}),
+]
+
+
+def check_multi_parity(source: str, workdir: str) -> List[str]:
+    """Impose the source in all the layouts at once, with and without workers, and compare each output with
+    the same layout imposed alone. The cut and stack duplex layout is compared with pdfimpose wire too."""
+    from pdfimpose.schema import saddle, wire
+
+    layouts = [Impositor(folds, schema, **options) for folds, schema, options in IMPOSE_CASES]
+    layouts += [GridImpositor(*grid, **options) for grid, options in GRID_CASES]
+    diffs = []
+    for workers in (1, 2):
+        outputs = [os.path.join(workdir, f"multi-{workers}-{i}.pdf") for i in range(len(layouts))]
+        MultiImposePDFCmd(outputs, [source], layouts, workers=workers).execute()
+        for i, (layout, output) in enumerate(zip(layouts, outputs)):
+            alone = os.path.join(workdir, f"alone-{i}.pdf")
+            get_backend("pymupdf").save(impose([source], layout), alone)
+            diffs += [f"multi impose {i} with {workers} workers: {d}" for d in compare_positions(alone, output)]
+
+    grid, options = GRID_CASES[-1]
+    wired = os.path.join(workdir, "wire-pdfimpose.pdf")
+    omargin = saddle.Margins(*options["omargin"])
+    wire.impose([source], wired, imargin=options["imargin"], omargin=omargin, last=options["last"], signature=grid)
+    diffs += [f"wire: {d}" for d in compare_positions(wired, outputs[-1])]
+
+    return diffs
+
+
+def check_parity(num_pages: int, data_dir: str, workdir: str) -> List[str]:
+    source = synthetic_pdf(data_dir, num_pages)
+    overlay = os.path.join(workdir, "overlay.pdf")
+    HeaderFooterPDFCmd(overlay, num_pages, STATEMENT_SIZE, _content_function).execute()
+
+    diffs = []
+    merged = {}
+    overlaid = {}
+    for name in BACKENDS:
+        merged[name] = os.path.join(workdir, f"merge-{name}.pdf")
+        half = num_pages // 2
+        MergePDFCmd(merged[name], [FilenamePages(source, [(half, 0)]), FilenamePages(source, [(0, half)])], backend=name).execute()
+        overlaid[name] = os.path.join(workdir, f"merge_content-{name}.pdf")
+        MergeContentPDFCmd(overlaid[name], [source, overlay], backend=name).execute()
+
+    names = list(BACKENDS)
+    for name in names[1:]:
+        diffs += [f"merge {names[0]}/{name}: {d}" for d in compare_outputs(merged[names[0]], merged[name])]
+        diffs += [f"merge_content {names[0]}/{name}: {d}" for d in compare_outputs(overlaid[names[0]], overlaid[name])]
+
+    diffs += check_impose_parity(source, workdir)
+    diffs += check_impose_parity(rotated_copy(source, os.path.join(workdir, "rotated.pdf")), workdir, " rotated")
+    diffs += check_impose_parity(mixed_size_copy(source, os.path.join(workdir, "mixed.pdf")), workdir, " mixed")
+    return diffs + check_virtual_parity(source, workdir) + check_multi_parity(source, workdir)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check that the PDF backends and the imposition engines produce the same pages.")
+    parser.add_argument("--sizes", default="10,100", help="Comma separated page counts.")
+    parser.add_argument("--data-dir", default="", help="A directory to keep the generated synthetic PDFs.")
+    args = parser.parse_args(argv)
+    init_log()
+
+    data_dir = args.data_dir or os.path.join(tempfile.gettempdir(), "office-pdf-benchmarks")
+    os.makedirs(data_dir, exist_ok=True)
+
+    diffs = []
+    for num_pages in [int(n) for n in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory() as workdir:
+            diffs += check_parity(num_pages, data_dir, workdir)
+
+    for d in diffs:
+        logger.error(d)
+    if not diffs:
+        logger.info("The backends produce the same pages.")
+
+    return 1 if diffs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from command.office_worker import FakeOfficeApp, OfficeWorker, OfficeWorkerClient
+from init_log import init_log
+
+
+def bench_cold_and_warm(workdir: str, jobs: int, startup: float, delay: float) -> None:
+    """Compare a new application per job, as the commands do, with the jobs sent to a warm worker."""
+    source = os.path.join(workdir, "master.docx")
+    open(source, "wb").close()
+
+    start = time.perf_counter()
+    for i in range(jobs):
+        app = FakeOfficeApp("word", startup, delay)
+        app.export({"source": source, "output": os.path.join(workdir, f"cold-{i}.pdf")})
+        app.quit()
+    cold = time.perf_counter() - start
+
+    with OfficeWorker({"word": lambda: FakeOfficeApp("word", startup, delay)}, port=0).start() as worker:
+        client = OfficeWorkerClient(*worker.address)
+        start = time.perf_counter()
+        for i in range(jobs):
+            client.export_word(source, os.path.join(workdir, f"warm-{i}.pdf"))
+        warm = time.perf_counter() - start
+
+    print(f"{jobs} exports with {startup * 1000:.0f} ms startup: cold {cold * 1000:.0f} ms, warm worker {warm * 1000:.0f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the office worker with fake Office applications.")
+    parser.add_argument("--jobs", type=int, default=10, help="Number of exports.")
+    parser.add_argument("--startup-ms", type=float, default=300, help="Startup time of the fake application.")
+    parser.add_argument("--delay-ms", type=float, default=20, help="Time of one export of the fake application.")
+    args = parser.parse_args(argv)
+    init_log()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_cold_and_warm(workdir, args.jobs, args.startup_ms / 1000, args.delay_ms / 1000)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
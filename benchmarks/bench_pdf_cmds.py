@@ -0,0 +1,300 @@
+import argparse
+from argparse import Namespace
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import STATEMENT_SIZE, synthetic_pdf
+from command.hf_pdf_cmd import HeaderFooterPDFCmd, TextAlign
+from command.impose_pdf_cmd import ImposePDFCmd
+from command.merge_content_pdf_cmd import MergeContentPDFCmd
+from command.merge_pdf_cmd import FilenamePages, MergePDFCmd
+from command.stamp_pdf_cmd import StampPDFCmd
+from init_log import init_log
+from pdf_backend import get_backend, set_default_backend
+from pdf_info import get_num_pages
+from pdf_xref import read_page_count
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+
+# Compare merge_content_parallel with merge_content for the speedup on a machine with this many cores.
+PARALLEL_WORKERS = 8
+
+
+def _content_function(page_no: int):
+    return [Namespace(name="Helvetica", font_size=10, x=STATEMENT_SIZE[0] // 2, y=16, align=TextAlign.CENTER, text=str(page_no + 1))]
+
+
+def bench_merge(source: str, num_pages: int, workdir: str) -> int:
+    half = num_pages // 2
+    cmd = MergePDFCmd(os.path.join(workdir, "merge.pdf"), [FilenamePages(source, [(half, 0)]), FilenamePages(source, [(0, half)])])
+    cmd.execute()
+    return num_pages
+
+
+def bench_merge_streaming(source: str, num_pages: int, workdir: str) -> int:
+    cmd = MergePDFCmd(os.path.join(workdir, "merge_streaming.pdf"), [FilenamePages(source, None)] * 3, streaming=True)
+    cmd.execute()
+    return num_pages * 3
+
+
+def bench_header_footer(source: str, num_pages: int, workdir: str) -> int:
+    cmd = HeaderFooterPDFCmd(os.path.join(workdir, "hf.pdf"), num_pages, STATEMENT_SIZE, _content_function)
+    cmd.execute()
+    return num_pages
+
+
+def setup_overlay(source: str, num_pages: int, workdir: str) -> None:
+    overlay = os.path.join(workdir, "overlay.pdf")
+    if not os.path.isfile(overlay):
+        HeaderFooterPDFCmd(overlay, num_pages, STATEMENT_SIZE, _content_function).execute()
+
+
+def bench_merge_content(source: str, num_pages: int, workdir: str) -> int:
+    overlay = os.path.join(workdir, "overlay.pdf")
+    cmd = MergeContentPDFCmd(os.path.join(workdir, "merge_content.pdf"), [source, overlay])
+    cmd.execute()
+    return num_pages
+
+
+def bench_merge_content_parallel(source: str, num_pages: int, workdir: str) -> int:
+    overlay = os.path.join(workdir, "overlay.pdf")
+    cmd = MergeContentPDFCmd(os.path.join(workdir, "merge_content_parallel.pdf"), [source, overlay], workers=PARALLEL_WORKERS)
+    cmd.execute()
+    return num_pages
+
+
+def bench_stamp(source: str, num_pages: int, workdir: str) -> int:
+    cmd = StampPDFCmd(os.path.join(workdir, "stamp.pdf"), source, _content_function)
+    cmd.execute()
+    return num_pages
+
+
+def bench_impose(source: str, num_pages: int, workdir: str) -> int:
+    cmd = ImposePDFCmd(os.path.join(workdir, "impose.pdf"), [source], "h")
+    cmd.execute()
+    return num_pages
+
+
+def bench_impose_pdfimpose(source: str, num_pages: int, workdir: str) -> int:
+    cmd = ImposePDFCmd(os.path.join(workdir, "impose.pdf"), [source], "h", engine="pdfimpose")
+    cmd.execute()
+    return num_pages
+
+
+def bench_get_num_pages(source: str, num_pages: int, workdir: str) -> int:
+    assert get_num_pages(source) == num_pages
+    return num_pages
+
+
+def bench_read_page_count(source: str, num_pages: int, workdir: str) -> int:
+    # get_num_pages without its cache.
+    assert read_page_count(source) == num_pages
+    return num_pages
+
+
+BENCHMARKS: Dict[str, Callable[[str, int, str], int]] = {
+    "merge": bench_merge,
+    "merge_streaming": bench_merge_streaming,
+    "header_footer": bench_header_footer,
+    "merge_content": bench_merge_content,
+    "merge_content_parallel": bench_merge_content_parallel,
+    "stamp": bench_stamp,
+    "impose": bench_impose,
+    "impose_pdfimpose": bench_impose_pdfimpose,
+    "get_num_pages": bench_get_num_pages,
+    "read_page_count": bench_read_page_count,
+}
+
+# Inputs of a benchmark made before it is timed, like the source PDF.
+SETUPS: Dict[str, Callable[[str, int, str], None]] = {
+    "merge_content": setup_overlay,
+    "merge_content_parallel": setup_overlay,
+}
+
+
+def _process_tree_rss(pid: int) -> int:
+    """Return the resident set size of the process and its descendants in bytes, or 0 without /proc."""
+    total = 0
+    pids = [pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            for tid in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{tid}/children") as f:
+                    pids += [int(child) for child in f.read().split()]
+        except (OSError, ValueError):
+            continue  # the process has exited
+    return total
+
+
+def _peak_rss() -> int:
+    """Return the peak RSS of this process in bytes from /proc, which catches the peaks between the samples.
+
+    ru_maxrss is not used, Linux keeps it across exec, so a spawned process would report the peak of its parent.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _measure_memory(name: str, source: str, num_pages: int, workdir: str, backend: str, conn) -> None:
+    """Run the benchmark in this fresh process and send the peak RSS of the process and its worker processes."""
+    set_default_backend(backend)
+    peak = 0
+    done = threading.Event()
+
+    def sample() -> None:
+        nonlocal peak
+        # the workers of a parallel command are alive at the same time, so their RSS is summed while they run.
+        while not done.wait(0.01):
+            peak = max(peak, _process_tree_rss(os.getpid()))
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        BENCHMARKS[name](source, num_pages, workdir)
+    finally:
+        done.set()
+        sampler.join()
+    conn.send(max(peak, _peak_rss()))
+    conn.close()
+
+
+def measure_peak_rss(name: str, source: str, num_pages: int, workdir: str) -> int:
+    """Return the peak RSS in bytes of a run of the benchmark in a new process, its worker processes included.
+
+    The RSS of the new process counts the interpreter and the imported modules too. tracemalloc can't see the memory
+    of MuPDF or of the worker processes, and it slows the run down, so the timed runs don't measure memory.
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_memory, args=(name, source, num_pages, workdir, get_backend().name, sender))
+    process.start()
+    sender.close()
+    try:
+        peak = receiver.recv()
+    except EOFError:
+        peak = 0  # the benchmark failed, the error is in the output of the process
+    process.join()
+    return peak
+
+
+def run_benchmark(name: str, source: str, num_pages: int, workdir: str, repeat: int = 1) -> dict:
+    """Run the benchmark and return the best time, the throughput and the peak RSS of a separate run."""
+    func = BENCHMARKS[name]
+    if name in SETUPS:
+        SETUPS[name](source, num_pages, workdir)
+    best = float("inf")
+    pages = num_pages
+    for _i in range(repeat):
+        start = time.perf_counter()
+        pages = func(source, num_pages, workdir)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+
+    return {
+        "benchmark": name,
+        "pages": pages,
+        "seconds": best,
+        "pages_per_sec": pages / best if best > 0 else 0.0,
+        "peak_rss": measure_peak_rss(name, source, num_pages, workdir),
+    }
+
+
+def compare_results(results: List[dict], baseline: List[dict], threshold: float) -> List[str]:
+    """Return the messages for the results slower than the baseline by more than the threshold ratio."""
+    base = {(r["benchmark"], r["pages"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get((r["benchmark"], r["pages"]))
+        if b is None or b["pages_per_sec"] <= 0:
+            continue
+        ratio = r["pages_per_sec"] / b["pages_per_sec"]
+        if ratio < 1.0 - threshold:
+            regressions.append(
+                f"{r['benchmark']} {r['pages']} pages: {r['pages_per_sec']:.1f} pages/s, baseline {b['pages_per_sec']:.1f} pages/s"
+            )
+
+    return regressions
+
+
+def format_results(results: List[dict]) -> str:
+    lines = [f"{'Benchmark':<22} {'Pages':>6} {'Seconds':>9} {'Pages/s':>10} {'RSS(MB)':>9}"]
+    for r in results:
+        peak_mb = r["peak_rss"] / (1024 * 1024)
+        lines.append(f"{r['benchmark']:<22} {r['pages']:>6} {r['seconds']:>9.3f} {r['pages_per_sec']:>10.1f} {peak_mb:>9.1f}")
+    return "\n".join(lines)
+
+
+def _construct_argparse():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF commands on synthetic PDFs.")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES), help="Comma separated page counts.")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS), help="Comma separated benchmark names.")
+    parser.add_argument("--backend", default="pypdf2", help="PDF backend used by the commands: pypdf2 or pymupdf.")
+    parser.add_argument("--repeat", type=int, default=1, help="Run each benchmark this many times and keep the best.")
+    parser.add_argument("--data-dir", default="", help="A directory to keep the generated synthetic PDFs.")
+    parser.add_argument("-o", "--output", default="", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", default="", help="Compare the results with this JSON file and flag regressions.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed throughput drop ratio before a regression is flagged.")
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _construct_argparse().parse_args(argv)
+    init_log()
+
+    set_default_backend(args.backend)
+    sizes = [int(n) for n in args.sizes.split(",")]
+    names = args.benchmarks.split(",")
+    data_dir = args.data_dir or os.path.join(tempfile.gettempdir(), "office-pdf-benchmarks")
+    os.makedirs(data_dir, exist_ok=True)
+
+    results = []
+    for num_pages in sizes:
+        source = synthetic_pdf(data_dir, num_pages)
+        with tempfile.TemporaryDirectory() as workdir:
+            for name in names:
+                logger.info(f"Running {name} on {num_pages} pages.")
+                results.append(run_benchmark(name, source, num_pages, workdir, args.repeat))
+
+    print(format_results(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            environment = {"python": platform.python_version(), "platform": platform.platform(), "backend": args.backend}
+            json.dump({**environment, "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(results, baseline, args.threshold)
+        for msg in regressions:
+            logger.warning(f"Regression: {msg}")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
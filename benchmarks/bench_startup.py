@@ -0,0 +1,89 @@
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from init_log import init_log
+
+
+logger = logging.getLogger(__name__)
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> python arguments of the command line whose startup is measured.
+TARGETS: Dict[str, List[str]] = {
+    "merge_pdf_cmd --help": ["-m", "command.merge_pdf_cmd", "--help"],
+    "emc_booklet --help": ["emc_booklet.py", "--help"],
+    "import stamp_pdf_cmd": ["-c", "import command.stamp_pdf_cmd"],
+    "import impose_pdf_cmd": ["-c", "import command.impose_pdf_cmd"],
+}
+
+# The libraries that must be imported on first use, not at startup.
+HEAVY_MODULES = ("PyPDF2", "reportlab", "pdfimpose", "fitz", "pymupdf", "win32com", "langdetect")
+
+DEFAULT_BUDGET_MS = 150.0
+
+
+def parse_importtime(stderr: str) -> Tuple[float, List[str]]:
+    """Return the total import time in ms and the names of the imported modules from python -X importtime output."""
+    total_us = 0
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        if not cumulative_us.strip().isdigit():
+            continue  # the header line
+        modules.append(name.strip())
+        # the modules imported by the script itself are not indented.
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative_us)
+
+    return total_us / 1000, modules
+
+
+def measure_startup(args: List[str], repeat: int = 3) -> dict:
+    """Run the command line and return the best wall time, the import time and the heavy modules it imports."""
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    best_wall = best_import = float("inf")
+    heavy: List[str] = []
+    for _i in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+        best_wall = min(best_wall, time.perf_counter() - start)
+        import_ms, modules = parse_importtime(proc.stderr)
+        best_import = min(best_import, import_ms)
+        heavy = sorted({m.split(".")[0] for m in modules if m.split(".")[0] in HEAVY_MODULES})
+
+    return {"wall_ms": best_wall * 1000, "import_ms": best_import, "heavy_modules": heavy}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the startup time of the command lines with python -X importtime.")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Maximum import time of each command line.")
+    parser.add_argument("--repeat", type=int, default=3, help="Run each command line this many times and keep the best.")
+    args = parser.parse_args(argv)
+    init_log()
+
+    failures = []
+    print(f"{'Command line':<26} {'Wall(ms)':>9} {'Import(ms)':>11}  Heavy modules")
+    for name, target in TARGETS.items():
+        r = measure_startup(target, args.repeat)
+        print(f"{name:<26} {r['wall_ms']:>9.1f} {r['import_ms']:>11.1f}  {', '.join(r['heavy_modules'])}")
+        if r["import_ms"] > args.budget_ms:
+            failures.append(f"{name}: import time {r['import_ms']:.1f} ms is over the budget of {args.budget_ms:.1f} ms")
+        if r["heavy_modules"]:
+            failures.append(f"{name}: imports {', '.join(r['heavy_modules'])} at startup")
+
+    for msg in failures:
+        logger.error(msg)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
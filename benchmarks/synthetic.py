@@ -0,0 +1,83 @@
+import logging
+import os
+import random
+from typing import Sequence, Tuple
+
+from PIL import Image
+from reportlab.lib.utils import ImageReader  # type:ignore
+from reportlab.pdfgen import canvas  # type:ignore
+
+from command.font_registry import ensure_font
+from command.font_select import KOREAN_FONT
+
+
+logger = logging.getLogger(__name__)
+
+
+STATEMENT_SIZE = (396, 612)
+
+LATIN_TEXT = "The quick brown fox jumps over the lazy dog. 0123456789"
+KOREAN_TEXT = "다람쥐 헌 쳇바퀴에 타고파. 주소록 사역자 교회 요람"
+
+
+def _make_image(seed: int, size: Tuple[int, int] = (64, 64)) -> Image.Image:
+    rnd = random.Random(seed)
+    image = Image.new("RGB", size)
+    r0, g0, b0 = rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)
+    image.putdata([((r0 + x * 4) % 256, (g0 + y * 4) % 256, (b0 + x + y) % 256) for y in range(size[1]) for x in range(size[0])])
+    return image
+
+
+def generate_pdf(
+    filename: str,
+    num_pages: int,
+    page_size: Tuple[float, float] = STATEMENT_SIZE,
+    fonts: Sequence[str] = ("Helvetica", KOREAN_FONT),
+    num_images: int = 4,
+    seed: int = 0,
+) -> str:
+    """Generate a PDF with text in the fonts and embedded images on each page.
+    The same arguments always produce the same file."""
+    for font in fonts:
+        ensure_font(font)
+
+    rnd = random.Random(seed)
+    images = [ImageReader(_make_image(seed + i)) for i in range(num_images)]
+
+    width, height = page_size
+    # invariant produces the same output regardless of the creation time.
+    c = canvas.Canvas(filename, pagesize=page_size, invariant=1)
+    for page_no in range(num_pages):
+        y = height - 48
+        for i, font in enumerate(fonts):
+            c.setFont(font, 10 + i * 2)
+            text = KOREAN_TEXT if font == KOREAN_FONT else LATIN_TEXT
+            for _line in range(3):
+                c.drawString(36, y, text)
+                y -= 16
+        if images:
+            image = images[page_no % len(images)]
+            c.drawImage(image, 36 + rnd.randrange(int(width) // 2), 72, width=96, height=96)
+        c.drawCentredString(width / 2, 24, str(page_no + 1))
+        c.showPage()
+    c.save()
+
+    return filename
+
+
+def synthetic_pdf(
+    directory: str,
+    num_pages: int,
+    page_size: Tuple[float, float] = STATEMENT_SIZE,
+    fonts: Sequence[str] = ("Helvetica", KOREAN_FONT),
+    num_images: int = 4,
+    seed: int = 0,
+) -> str:
+    """Return a synthetic PDF in the directory, generating it only if it does not exist yet."""
+    name = f"synthetic-{num_pages}p-{int(page_size[0])}x{int(page_size[1])}-{'_'.join(fonts)}-{num_images}i-{seed}.pdf"
+    filename = os.path.join(directory, name)
+    if not os.path.isfile(filename):
+        logger.info(f"Generating {filename}.")
+        generate_pdf(filename, num_pages, page_size, fonts, num_images, seed)
+
+    return filename
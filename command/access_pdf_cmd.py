@@ -1,9 +1,13 @@
 import logging
 import os
-from typing import List
+from typing import TYPE_CHECKING, List, Optional
 
 from command.base_pdf_cmd import BaseMultiPDFCmd
-from thirdparty.access_win32 import App as AccessApp
+from command.office_worker import OfficeWorkerClient
+from pdf_reader_pool import default_reader_pool
+
+if TYPE_CHECKING:
+    from thirdparty.access_win32 import App as AccessApp
 
 
 logger = logging.getLogger(__name__)
@@ -17,49 +21,77 @@ class PrintConfig:
         self.output_filename = output_filename
 
 
+def print_reports(app: "AccessApp", printout_configs: List[PrintConfig]) -> List[str]:
+    """Print each report of the configs with its query and order to its file on the open database of the app,
+    and restore the query and the order of the last report. Return the output files."""
+    saved_query = ""
+    saved_order_by = ""
+    output_files = []
+    for i, print_config in enumerate(printout_configs):
+        # After printing, the report object is no longer valid design. So open and close for each print.
+        # Change "Record Source", "Order By".
+        with app.open_report(print_config.report) as report:
+            if i == 0:
+                saved_query = report.obj.RecordSource
+                saved_order_by = report.obj.OrderBy
+            report.RecordSource = print_config.query
+            report.obj.OrderBy = print_config.order_by
+            pdf_filename = print_config.output_filename
+            default_reader_pool().discard(pdf_filename)
+            try:
+                os.remove(pdf_filename)
+            except OSError:
+                pass
+            report.print_as(pdf_filename)
+
+            output_files.append(pdf_filename)
+
+    if len(printout_configs) > 0:
+        print_config = printout_configs[-1]
+        with app.open_report(print_config.report) as report:
+            report.obj.RecordSource = saved_query
+            report.obj.OrderBy = saved_order_by
+
+    return output_files
+
+
 class AccessPDFCmd(BaseMultiPDFCmd):
-    def __init__(self, mdb_filename: str, printout_configs: List[PrintConfig]):
+    def __init__(self, mdb_filename: str, printout_configs: List[PrintConfig], worker: Optional[OfficeWorkerClient] = None):
         super().__init__()
 
         self.mdb_filename = mdb_filename
         self.printout_configs = printout_configs
+        # Print on the Access kept open by the office worker instead of starting Access.
+        self.worker = worker
 
     def _execute(self):
         logger.info(f"Generating report files from '{self.mdb_filename}'.")
 
+        if self.worker is not None:
+            self.output_files = self.worker.export_access(self.mdb_filename, self.printout_configs)
+            self.autodelete = False
+            return
+
+        # COM is loaded only when Access is started here.
+        from thirdparty.access_win32 import App as AccessApp
+
         app = AccessApp(False)
         app.open(self.mdb_filename)
 
         # Set papersize to statement in printer settings
 
-        saved_query = ""
-        saved_order_by = ""
-        output_files = []
-        for i, print_config in enumerate(self.printout_configs):
-            # After printing, the report object is no longer valid design. So open and close for each print.
-            # Change "Record Source", "Order By".
-            with app.open_report(print_config.report) as report:
-                if i == 0:
-                    saved_query = report.obj.RecordSource
-                    saved_order_by = report.obj.OrderBy
-                report.RecordSource = print_config.query
-                report.obj.OrderBy = print_config.order_by
-                pdf_filename = print_config.output_filename
-                try:
-                    os.remove(pdf_filename)
-                except OSError:
-                    pass
-                report.print_as(pdf_filename)
-
-                output_files.append(pdf_filename)
-
-        if len(self.printout_configs) > 0:
-            print_config = self.printout_configs[-1]
-            with app.open_report(print_config.report) as report:
-                report.obj.RecordSource = saved_query
-                report.obj.OrderBy = saved_order_by
+        output_files = print_reports(app, self.printout_configs)
 
         app.quit()
 
         self.output_files = output_files
         self.autodelete = False
+
+    def cache_params(self) -> Optional[object]:
+        return [[c.report, c.query, c.order_by] for c in self.printout_configs]
+
+    def input_filenames(self) -> List[str]:
+        return [self.mdb_filename]
+
+    def output_filenames(self) -> List[str]:
+        return [print_config.output_filename for print_config in self.printout_configs]
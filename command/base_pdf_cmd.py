@@ -1,7 +1,11 @@
 import errno
 import os
 import tempfile
-from typing import List
+from typing import Any, List, Optional
+
+from command.output_cache import OutputCache, fingerprint
+from command.profiler import ProfileCollector, profile_command
+from pdf_reader_pool import default_reader_pool
 
 
 def InchesToPoint(i: float) -> int:
@@ -11,31 +15,121 @@ def InchesToPoint(i: float) -> int:
 class BasePDFCmd:
     """Base class for PDF command classes."""
 
+    # Cache of the outputs shared by all the commands. Assign to an instance to cache only that command.
+    cache: Optional[OutputCache] = None
+    # Collector of the timing, memory and I/O of every command execution. Anything with add(profile) works.
+    collector: Optional[ProfileCollector] = None
+
     def __init__(self, output_file: str = "", autodelete=False) -> None:
         self.output_file: str = ""
         self.output_file: str = output_file
         self.autodelete = autodelete
 
+        # When in_memory is set, the command keeps its result in output_document (PdfReader or PdfWriter)
+        # and the next command consumes it directly. The file is written only when save_output() is called.
+        self.in_memory = False
+        self.output_document: Any = None
+        self._output_saved = False
+
     def __del__(self):
         self.close()
 
     def close(self):
+        self.output_document = None
         if self.autodelete:
             if self.output_file:
                 self.remove_safely(self.output_file)
 
     def execute(self):
         """Execute the command and produce the self.output_files files."""
+        if self.collector is None:
+            self._execute_cached()
+        else:
+            with profile_command(self, self.collector):
+                self._execute_cached()
+
+    def _execute_cached(self) -> None:
         self.create_output_filename()
 
+        self.output_document = None
+        self._output_saved = False
+
+        key = self.cache_key()
+        if key is not None:
+            # The cache works with files, so in-memory outputs need a filename too.
+            if self.in_memory:
+                self.save_output()
+            if self.cache is not None and self.cache.lookup(key, self.output_filenames()):
+                self._restored_from_cache()
+                return
+
         self._execute()
 
+        if key is not None and self.cache is not None:
+            self.save_output()
+            self.cache.store(key, self.output_filenames())
+
     def _execute(self) -> None:
         pass
 
+    def _restored_from_cache(self) -> None:
+        """Called instead of _execute() when the outputs are restored from the cache."""
+        pass
+
+    def cache_params(self) -> Optional[object]:
+        """Return JSON serializable parameters that decide the output together with the input files.
+        None means the command can't be cached."""
+        return None
+
+    def cache_key(self) -> Optional[str]:
+        if self.cache is None:
+            return None
+
+        params = self.cache_params()
+        input_files = self.input_filenames()
+        if params is None or not all(isinstance(fn, str) and os.path.isfile(fn) for fn in input_files):
+            return None
+
+        return fingerprint(type(self).__name__, params, input_files)
+
+    def input_filenames(self) -> List[Any]:
+        """Return the files or the commands whose output is read by the command.
+        Used to resolve dependencies between commands."""
+        return []
+
+    def output_filenames(self) -> List[str]:
+        """Return the files produced by the command. Used to resolve dependencies between commands."""
+        return [self.output_file] if self.output_file else []
+
+    def publish(self, document: Any) -> None:
+        """Keep the result document in memory if in_memory is set, or write it to the output file."""
+        if self.in_memory:
+            self.output_document = document
+        else:
+            self._write_document(document, self.output_file)
+
+    def save_output(self) -> str:
+        """Write the in-memory output document to the output file if not written yet and return the filename."""
+        if self.in_memory and not self.output_file:
+            self.in_memory = False
+            self.create_output_filename()
+            self.in_memory = True
+
+        if self.output_document is not None and not self._output_saved:
+            self._write_document(self.output_document, self.output_file)
+            self._output_saved = True
+
+        return self.output_file
+
+    @staticmethod
+    def _write_document(document: Any, filename: str) -> None:
+        from pdf_backend import save_document
+
+        save_document(document, filename)
+
     def create_output_filename(self):
         create_a_new_file = False
-        if not self.output_file:
+        if not self.output_file and not self.in_memory:
             create_a_new_file = True
 
         if create_a_new_file:
@@ -49,6 +143,8 @@ class BasePDFCmd:
 
     @staticmethod
     def remove_safely(filename: str):
+        # a file mapped by the reader pool can't be removed on Windows.
+        default_reader_pool().discard(filename)
         try:
             os.remove(filename)
         except OSError as e:
@@ -59,13 +155,24 @@ class BasePDFCmd:
 class BaseMultiPDFCmd(BasePDFCmd):
     """Base class for PDF command class with multiple output."""
 
-    def __init__(self, output_files: List[str] = [], autodelete=False) -> None:
+    def __init__(self, output_files: Optional[List[str]] = None, autodelete=False) -> None:
         super().__init__()
 
-        self.output_files: List[str] = output_files
+        self.output_files: List[str] = output_files if output_files is not None else []
         self.autodelete = autodelete
 
     def close(self):
         if self.autodelete:
             for fn in self.output_files:
                 self.remove_safely(fn)
+
+    def _restored_from_cache(self) -> None:
+        # _execute() sets output_files, i.e. AccessPDFCmd, so they are taken from output_filenames() here.
+        self.output_files = self.output_filenames()
+
+    def create_output_filename(self):
+        # the outputs are output_files, so no temporary output_file is made and autodelete is left as given.
+        return ""
+
+    def output_filenames(self) -> List[str]:
+        return list(self.output_files)
@@ -0,0 +1,112 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import logging
+import os
+from typing import Dict, List, Optional, Set
+
+from command.base_pdf_cmd import BasePDFCmd
+
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_filename(filename: str) -> str:
+    return os.path.normcase(os.path.abspath(filename))
+
+
+def _execute_in_process(cmd: BasePDFCmd) -> dict:
+    """Execute the command in a worker process and return its state to copy back to the original command."""
+    # The input commands are copies too, the outputs they would delete when collected belong to the parent process.
+    for source in cmd.input_filenames():
+        if isinstance(source, BasePDFCmd):
+            source.autodelete = False
+    cmd.execute()
+    # In-memory documents can't be sent back to the parent process.
+    if cmd.output_document is not None:
+        cmd.save_output()
+        cmd.output_document = None
+
+    state = dict(cmd.__dict__)
+    # The command object in the worker is a copy; do not let it delete the outputs when it is collected.
+    cmd.autodelete = False
+    return state
+
+
+class CommandExecutor:
+    """CommandExecutor manages list of `xxx_pdf_cmd`s and runs them based on their dependency.
+
+    A command depends on an earlier command in the list when it reads a file the earlier command writes,
+    writes a file the earlier command reads, or writes the same file. Independent commands run at the same time.
+    Commands that run in a process pool must be picklable.
+    """
+
+    def __init__(self, cmds: Optional[List[BasePDFCmd]] = None, max_workers: Optional[int] = None, use_processes: bool = False) -> None:
+        self.cmds: List[BasePDFCmd] = list(cmds) if cmds is not None else []
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+
+    def add(self, cmd: BasePDFCmd) -> BasePDFCmd:
+        self.cmds.append(cmd)
+        return cmd
+
+    def dependencies(self) -> List[Set[int]]:
+        """Return the indices of the commands each command depends on."""
+        for cmd in self.cmds:
+            cmd.create_output_filename()
+
+        inputs = [{_normalize_filename(fn) for fn in cmd.input_filenames() if isinstance(fn, str)} for cmd in self.cmds]
+        outputs = [{_normalize_filename(fn) for fn in cmd.output_filenames()} for cmd in self.cmds]
+        indices = {id(cmd): i for i, cmd in enumerate(self.cmds)}
+
+        deps: List[Set[int]] = []
+        for j in range(len(self.cmds)):
+            # the output of a command in memory is consumed by passing the command itself as input.
+            dep = {indices[id(fn)] for fn in self.cmds[j].input_filenames() if id(fn) in indices}
+            for i in range(j):
+                if outputs[i] & inputs[j] or inputs[i] & outputs[j] or outputs[i] & outputs[j]:
+                    dep.add(i)
+            deps.append(dep)
+
+        return deps
+
+    def execute(self) -> None:
+        """Execute all the commands, running independent ones in parallel."""
+        deps = self.dependencies()
+        pending = set(range(len(self.cmds)))
+        done: Set[int] = set()
+        running: Dict[Future, int] = {}
+        error: Optional[BaseException] = None
+
+        pool_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        with pool_class(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if error is None:
+                    for index in sorted(pending):
+                        if deps[index] <= done:
+                            cmd = self.cmds[index]
+                            logger.debug(f"Starting {type(cmd).__name__}.")
+                            if self.use_processes:
+                                future = pool.submit(_execute_in_process, cmd)
+                            else:
+                                future = pool.submit(cmd.execute)
+                            running[future] = index
+                            pending.discard(index)
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = running.pop(future)
+                    exc = future.exception()
+                    if exc is not None:
+                        logger.error(f"{type(self.cmds[index]).__name__} failed: {exc}")
+                        if error is None:
+                            error = exc
+                        continue
+
+                    if self.use_processes:
+                        self.cmds[index].__dict__.update(future.result())
+                    done.add(index)
+
+        if error is not None:
+            raise error
@@ -0,0 +1,112 @@
+import hashlib
+from io import BytesIO
+import logging
+from typing import Any, Dict, List, Optional
+
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NullObject
+
+from command.base_pdf_cmd import BasePDFCmd
+from pdf_backend import get_backend
+from pdf_info import PDFSource
+
+
+logger = logging.getLogger(__name__)
+
+
+# The objects that make the page tree. They are never merged even if they look the same.
+_STRUCTURE_TYPES = ("/Page", "/Pages", "/Catalog")
+
+MAX_ROUNDS = 10
+
+
+def _replace_references(obj: Any, remap: Dict[int, int], writer: PdfWriter) -> None:
+    """Replace the references to the duplicated objects in obj with the references to the kept ones."""
+    stack = [obj]
+    while stack:
+        data = stack.pop()
+        if isinstance(data, DictionaryObject):
+            items = list(data.items())
+        elif isinstance(data, ArrayObject):
+            items = list(enumerate(data))
+        else:
+            continue
+        for key, value in items:
+            if isinstance(value, IndirectObject):
+                if value.pdf is writer and value.idnum in remap:
+                    data[key] = IndirectObject(remap[value.idnum], 0, writer)
+            elif isinstance(value, (DictionaryObject, ArrayObject)):
+                stack.append(value)
+
+
+def _digest(obj: Any) -> str:
+    stream = BytesIO()
+    stream.write(type(obj).__name__.encode())
+    obj.write_to_stream(stream, None)
+    return hashlib.sha256(stream.getvalue()).hexdigest()
+
+
+def deduplicate_objects(writer: PdfWriter) -> int:
+    """Merge the indirect objects of the writer that serialize to the same bytes and return the number merged.
+
+    Fonts, images, form XObjects and content streams are compared after the references in them are
+    rewritten, so the objects that only refer to duplicates are merged in the next round.
+    The merged objects are replaced by null to keep the object numbers of the xref table.
+    """
+    objects: List[Any] = writer._objects
+    removed = 0
+    for _round in range(MAX_ROUNDS):
+        kept: Dict[str, int] = {}
+        remap: Dict[int, int] = {}
+        for i, obj in enumerate(objects):
+            if obj is None or isinstance(obj, NullObject):
+                continue
+            if isinstance(obj, DictionaryObject) and obj.get("/Type") in _STRUCTURE_TYPES:
+                continue
+            idnum = i + 1
+            digest = _digest(obj)
+            kept_idnum = kept.setdefault(digest, idnum)
+            if kept_idnum != idnum:
+                remap[idnum] = kept_idnum
+
+        if not remap:
+            break
+
+        for obj in objects:
+            if obj is not None:
+                _replace_references(obj, remap, writer)
+        for idnum in remap:
+            objects[idnum - 1] = NullObject()
+        removed += len(remap)
+
+    logger.debug(f"Removed {removed} duplicated objects.")
+    return removed
+
+
+class DedupPDFCmd(BasePDFCmd):
+    """Write the input with the identical fonts, images, XObjects and content streams stored once."""
+
+    def __init__(self, output_filename: str, input_file: PDFSource, backend: Optional[str] = None):
+        super().__init__(output_filename)
+
+        self.input_file = input_file
+        # PDF engine name, or None for the default backend.
+        self.backend = backend
+
+    def _execute(self) -> None:
+        logger.info(f"Removing duplicated objects to pdf file: {self.output_file}.")
+
+        backend = get_backend(self.backend)
+        doc = backend.new_document()
+        with backend.open_document(self.input_file) as src:
+            backend.insert_pages(doc, src, range(backend.page_count(src)))
+        doc = backend.deduplicate(doc)
+
+        if backend.page_count(doc):
+            self.publish(doc)
+
+    def cache_params(self) -> Optional[object]:
+        return {}
+
+    def input_filenames(self) -> List[PDFSource]:
+        return [self.input_file]
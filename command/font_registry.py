@@ -0,0 +1,81 @@
+import logging
+import threading
+from typing import Callable, Dict, Set
+
+from command.font_select import KOREAN_FONT
+
+
+logger = logging.getLogger(__name__)
+
+
+# The 14 standard PDF fonts need no registration.
+_STANDARD_FONTS = {
+    "Courier",
+    "Courier-Bold",
+    "Courier-BoldOblique",
+    "Courier-Oblique",
+    "Helvetica",
+    "Helvetica-Bold",
+    "Helvetica-BoldOblique",
+    "Helvetica-Oblique",
+    "Symbol",
+    "Times-Bold",
+    "Times-BoldItalic",
+    "Times-Italic",
+    "Times-Roman",
+    "ZapfDingbats",
+}
+
+
+def _cid_font(name: str) -> Callable[[], object]:
+    def create() -> object:
+        # https://docs.reportlab.com/reportlab/userguide/ch3_fonts/#asian-font-support
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont  # type:ignore
+
+        return UnicodeCIDFont(name)
+
+    return create
+
+
+# font name -> function that creates the reportlab font. Registered on first use.
+_factories: Dict[str, Callable[[], object]] = {
+    KOREAN_FONT: _cid_font(KOREAN_FONT),
+}
+_registered: Set[str] = set(_STANDARD_FONTS)
+_lock = threading.Lock()
+
+
+def add_font(name: str, factory: Callable[[], object]) -> None:
+    """Make the font known to ensure_font() without loading it, i.e. add_font("Malgun", lambda: TTFont("Malgun", path))."""
+    with _lock:
+        _factories[name] = factory
+
+
+def add_ttf_font(name: str, filename: str) -> None:
+    def create() -> object:
+        from reportlab.pdfbase.ttfonts import TTFont  # type:ignore
+
+        return TTFont(name, filename)
+
+    add_font(name, create)
+
+
+def ensure_font(name: str) -> str:
+    """Register the font with reportlab if it is not registered yet and return the name.
+
+    Unknown names are left to reportlab, which raises an error when the font is used.
+    """
+    if name in _registered:
+        return name
+
+    with _lock:
+        if name not in _registered:
+            factory = _factories.get(name)
+            if factory is not None:
+                from reportlab.pdfbase import pdfmetrics  # type:ignore
+
+                logger.debug(f"Registering font {name}.")
+                pdfmetrics.registerFont(factory())
+            _registered.add(name)
+
+    return name
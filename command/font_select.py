@@ -0,0 +1,110 @@
+from bisect import bisect_right
+from enum import IntEnum
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+
+# https://docs.reportlab.com/reportlab/userguide/ch3_fonts/#asian-font-support
+KOREAN_FONT = "HYSMyeongJo-Medium"
+LATIN_FONT = "Helvetica"
+
+# The font name of a content that picks the font for each run of the text, i.e. "KM 사역자".
+AUTO_FONT = "auto"
+
+
+class Script(IntEnum):
+    COMMON = 0  # spaces, digits and punctuation are drawn with the font of the text around them.
+    LATIN = 1
+    HANGUL = 2
+    CJK = 3
+
+
+# (first code point, script) sorted by code point. A range lasts until the next entry.
+_SCRIPT_RANGES: List[Tuple[int, Script]] = [
+    (0x0000, Script.COMMON),
+    (0x0041, Script.LATIN),  # A-Z
+    (0x005B, Script.COMMON),
+    (0x0061, Script.LATIN),  # a-z
+    (0x007B, Script.COMMON),
+    (0x00C0, Script.LATIN),  # Latin-1 letters, Latin Extended
+    (0x0250, Script.COMMON),
+    (0x1100, Script.HANGUL),  # Hangul Jamo
+    (0x1200, Script.COMMON),
+    (0x1E00, Script.LATIN),  # Latin Extended Additional
+    (0x1F00, Script.COMMON),
+    (0x2E80, Script.CJK),  # CJK radicals, symbols and punctuation, Kana, Bopomofo
+    (0x3130, Script.HANGUL),  # Hangul Compatibility Jamo
+    (0x3190, Script.CJK),  # Kanbun to CJK Unified Ideographs
+    (0xA000, Script.COMMON),
+    (0xA960, Script.HANGUL),  # Hangul Jamo Extended-A
+    (0xA980, Script.COMMON),
+    (0xAC00, Script.HANGUL),  # Hangul Syllables, Jamo Extended-B
+    (0xD800, Script.COMMON),
+    (0xF900, Script.CJK),  # CJK Compatibility Ideographs
+    (0xFB00, Script.COMMON),
+    (0xFE30, Script.CJK),  # CJK Compatibility Forms
+    (0xFE50, Script.COMMON),
+    (0xFF01, Script.CJK),  # Fullwidth forms
+    (0xFFA0, Script.HANGUL),  # Halfwidth Hangul
+    (0xFFE0, Script.CJK),
+    (0xFFEF, Script.COMMON),
+    (0x20000, Script.CJK),  # CJK Unified Ideographs Extension B and later
+    (0x3FFFF, Script.COMMON),
+]
+_RANGE_STARTS = [start for start, _script in _SCRIPT_RANGES]
+
+SCRIPT_FONTS: Dict[Script, str] = {
+    Script.COMMON: LATIN_FONT,
+    Script.LATIN: LATIN_FONT,
+    Script.HANGUL: KOREAN_FONT,
+    Script.CJK: KOREAN_FONT,
+}
+
+
+def script_of(ch: str) -> Script:
+    return _SCRIPT_RANGES[bisect_right(_RANGE_STARTS, ord(ch)) - 1][1]
+
+
+@lru_cache(maxsize=4096)
+def detect_script(text: str) -> Script:
+    """Return the script most letters of the text are written in. COMMON if the text has no letters."""
+    counts = [0] * len(Script)
+    for ch in text:
+        counts[script_of(ch)] += 1
+    counts[Script.COMMON] = 0
+    best = max(Script, key=lambda script: counts[script])
+    return best if counts[best] else Script.COMMON
+
+
+def select_font(text: str) -> str:
+    """Return the font that can draw most of the text, i.e. KOREAN_FONT for Hangul."""
+    return SCRIPT_FONTS[detect_script(text)]
+
+
+@lru_cache(maxsize=4096)
+def split_font_runs(text: str) -> Tuple[Tuple[str, str], ...]:
+    """Split the text into (segment, font) runs, so that each segment is drawn with a font that has its glyphs."""
+    runs: List[Tuple[str, str]] = []
+    start = 0
+    font = ""
+    for i, ch in enumerate(text):
+        script = script_of(ch)
+        if script == Script.COMMON:
+            continue
+        ch_font = SCRIPT_FONTS[script]
+        if not font:
+            font = ch_font
+        elif ch_font != font:
+            runs.append((text[start:i], font))
+            start, font = i, ch_font
+    if start < len(text):
+        runs.append((text[start:], font or LATIN_FONT))
+
+    return tuple(runs)
+
+
+def font_runs(text: str, font: str) -> Tuple[Tuple[str, str], ...]:
+    """Return the (segment, font) runs to draw the text with the font, split by script if the font is AUTO_FONT."""
+    if font == AUTO_FONT:
+        return split_font_runs(text)
+    return ((text, font),)
@@ -1,30 +1,17 @@
-from enum import IntEnum
+from collections import Counter
+from io import BytesIO
 import logging
-from typing import Callable, Tuple
-
-from reportlab.pdfgen import canvas  # type:ignore
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from command.base_pdf_cmd import BasePDFCmd
+from command.font_select import KOREAN_FONT  # noqa: F401  kept for the callers that import it from here
+from command.text_layout import TextAlign, contents_key, layout_text, page_contents_params, write_text
+from pdf_reader_pool import replacing_file
 
 
 logger = logging.getLogger(__name__)
 
 
-# https://docs.reportlab.com/reportlab/userguide/ch3_fonts/#asian-font-support
-KOREAN_FONT = "HYSMyeongJo-Medium"
-
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-
-pdfmetrics.registerFont(UnicodeCIDFont(KOREAN_FONT))
-
-
-class TextAlign(IntEnum):
-    LEFT = 0
-    CENTER = 1
-    RIGHT = 2
-
-
 class HeaderFooterPDFCmd(BasePDFCmd):
     def __init__(self, output_filename: str, num_pages: int, page_size: Tuple[int, int], content_function: Callable):
         super().__init__(output_filename)
@@ -38,20 +25,46 @@ class HeaderFooterPDFCmd(BasePDFCmd):
 
         self.create_pdf_text_pages()
 
+    def cache_params(self) -> Optional[object]:
+        return {"page_size": self.page_size, "contents": page_contents_params(self.content_function, self.num_pages)}
+
     def create_pdf_text_pages(self):
-        c = canvas.Canvas(self.output_file)
+        from reportlab.pdfgen import canvas  # type:ignore
+
+        stream = BytesIO()
+        c = canvas.Canvas(stream)
         # logger.info(f"getAvailableFonts: {c.getAvailableFonts()}")
-        for page_no in range(self.num_pages):
+        contents = [self.content_function(page_no) for page_no in range(self.num_pages)]
+        keys = [contents_key(content_list) for content_list in contents]
+        # The contents repeated on more than one page are drawn once as a form and reused.
+        repeated = {key for key, count in Counter(keys).items() if key is not None and count > 1}
+        forms: Dict[str, str] = {}
+        for content_list, key in zip(contents, keys):
             c.setPageSize(self.page_size)
-            content_list = self.content_function(page_no)
-            if isinstance(content_list, list) and len(content_list) > 0:
-                for content in content_list:
-                    c.setFont(content.name, content.font_size)  # choose your font name and font size
-                    if content.align == TextAlign.CENTER:
-                        c.drawCentredString(content.x, content.y, content.text)
-                    elif content.align == TextAlign.RIGHT:
-                        c.drawRightString(content.x, content.y, content.text)
-                    else:
-                        c.drawString(content.x, content.y, content.text)
+            if key in repeated:
+                form_name = forms.get(key)
+                if form_name is None:
+                    form_name = forms[key] = f"hf{len(forms)}"
+                    c.beginForm(form_name)
+                    self.draw_contents(c, content_list)
+                    c.endForm()
+                c.doForm(form_name)
+            elif key is not None:
+                self.draw_contents(c, content_list)
             c.showPage()
         c.save()
+
+        if self.in_memory:
+            from PyPDF2 import PdfReader
+
+            self.publish(PdfReader(stream, strict=False))
+        else:
+            with replacing_file(self.output_file) as tmp_filename, open(tmp_filename, "wb") as f:
+                f.write(stream.getvalue())
+
+    @staticmethod
+    def draw_contents(c: Any, content_list: list) -> None:
+        # one text object with the texts placed by text_layout.
+        text = c.beginText()
+        write_text(text, [placed for content in content_list for placed in layout_text(content)])
+        c.drawText(text)
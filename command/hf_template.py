@@ -0,0 +1,233 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from command.page_plan import parse_page_specs
+from command.text_layout import Overflow, TextAlign
+
+
+logger = logging.getLogger(__name__)
+
+
+_ALIGNS = {"left": TextAlign.LEFT, "center": TextAlign.CENTER, "right": TextAlign.RIGHT}
+_OVERFLOWS = {"truncate": Overflow.TRUNCATE, "wrap": Overflow.WRAP, "fit": Overflow.FIT}
+_STYLE_KEYS = ("font", "size", "x", "y", "align", "max_width", "overflow")
+
+
+class TextItem(NamedTuple):
+    """A text of a page, with the attributes of the Namespace contents of HeaderFooterPDFCmd."""
+
+    name: str
+    font_size: float
+    x: float
+    y: float
+    align: TextAlign
+    text: str
+    max_width: Optional[float] = None
+    overflow: Overflow = Overflow.TRUNCATE
+
+
+class OverlayPlan:
+    """The text items of every page, compiled from a template. Pages with the same items share one overlay.
+
+    The plan is immutable and picklable. It is a content_function: plan(page_no) returns the items of the page.
+    """
+
+    def __init__(self, overlays: Sequence[Tuple[TextItem, ...]], page_overlays: Sequence[int]) -> None:
+        self.overlays: Tuple[Tuple[TextItem, ...], ...] = tuple(overlays)
+        # page_no -> index of overlays
+        self.page_overlays: Tuple[int, ...] = tuple(page_overlays)
+
+    @property
+    def num_pages(self) -> int:
+        return len(self.page_overlays)
+
+    def __call__(self, page_no: int) -> List[TextItem]:
+        return list(self.overlays[self.page_overlays[page_no]])
+
+    def shard(self, num_shards: int) -> List[Tuple[int, int]]:
+        """Split the pages into at most num_shards (start, end) ranges with about the same number of text items."""
+        weights = [max(1, len(self.overlays[i])) for i in self.page_overlays]
+        target = sum(weights) / max(1, num_shards)
+        ranges = []
+        start = 0
+        total = 0.0
+        for page_no, weight in enumerate(weights):
+            total += weight
+            if total >= target * (len(ranges) + 1) and len(ranges) < num_shards - 1:
+                ranges.append((start, page_no + 1))
+                start = page_no + 1
+        if start < self.num_pages:
+            ranges.append((start, self.num_pages))
+        return ranges
+
+    def subplan(self, start: int, end: int) -> "OverlayPlan":
+        return OverlayPlan(self.overlays, self.page_overlays[start:end])
+
+
+class HeaderFooterTemplate:
+    """A declarative header/footer spec, i.e.
+
+    {
+        "page_size": [396, 612],
+        "page_offset": 1,
+        "skip": "0:2",
+        "sections": {"32": "사역자", "40": "KM"},
+        "elements": [
+            {"text": "{page}", "font": "Helvetica", "size": 10, "x": 198, "y": 16, "align": "center", "pages": "2:29,32:"},
+            {"text": "{section}", "font": "auto", "size": 14, "y": 588, "when": "section",
+             "odd": {"x": 32, "align": "left"}, "even": {"x": 364, "align": "right"}}
+        ]
+    }
+
+    text is formatted with page (page_no + page_offset), page_no (0-based), num_pages and section, the title of
+    the last section that starts at or before the page. pages and skip use the page ranges of merge_pdf_cmd.
+    when "section" draws the element only on the first page of a section. odd and even override the style on the
+    pages with an odd or even 0-based page_no. max_width with overflow "truncate", "wrap" or "fit" limits the text.
+    """
+
+    def __init__(self, spec: Dict[str, Any]) -> None:
+        self.spec = spec
+        self.page_offset = int(spec.get("page_offset", 1))
+        self.skip = spec.get("skip", "")
+        self.sections = {int(page_no): str(title) for page_no, title in spec.get("sections", {}).items()}
+        self.elements = list(spec.get("elements", []))
+        page_size = spec.get("page_size")
+        self.page_size: Optional[Tuple[float, float]] = (float(page_size[0]), float(page_size[1])) if page_size else None
+
+        for element in self.elements:
+            if "text" not in element:
+                raise ValueError(f"A header/footer element needs 'text': {element}")
+            for style in (element, element.get("odd", {}), element.get("even", {})):
+                if "align" in style and style["align"] not in _ALIGNS:
+                    raise ValueError(f"Unknown align '{style['align']}'. Choose one of {', '.join(_ALIGNS)}.")
+                if "overflow" in style and style["overflow"] not in _OVERFLOWS:
+                    raise ValueError(f"Unknown overflow '{style['overflow']}'. Choose one of {', '.join(_OVERFLOWS)}.")
+
+    @classmethod
+    def load(cls, filename: str) -> "HeaderFooterTemplate":
+        """Load a JSON or TOML template."""
+        if filename.lower().endswith(".toml"):
+            try:
+                import tomllib  # type: ignore
+            except ImportError:  # Python < 3.11
+                import tomli as tomllib  # type: ignore
+
+            with open(filename, "rb") as f:
+                return cls(tomllib.load(f))
+
+        with open(filename, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _pages(spec: str, num_pages: int) -> Set[int]:
+        return {index for page_spec in parse_page_specs(spec) for index in page_spec.indices(num_pages)}
+
+    def _item(self, element: Dict[str, Any], page_no: int, fields: Dict[str, Any]) -> Optional[TextItem]:
+        style = {key: element[key] for key in _STYLE_KEYS if key in element}
+        style.update(element.get("odd" if page_no % 2 == 1 else "even", {}))
+        text = element["text"].format(**fields)
+        if not text:
+            return None
+
+        return TextItem(
+            name=style.get("font", "Helvetica"),
+            font_size=float(style.get("size", 10)),
+            x=float(style.get("x", 0)),
+            y=float(style.get("y", 0)),
+            align=_ALIGNS[style.get("align", "left")],
+            text=text,
+            max_width=float(style["max_width"]) if style.get("max_width") else None,
+            overflow=_OVERFLOWS[style.get("overflow", "truncate")],
+        )
+
+    def compile(self, num_pages: int) -> OverlayPlan:
+        """Resolve the template for a document of num_pages pages."""
+        skip = self._pages(self.skip, num_pages) if self.skip else set()
+        element_pages = [self._pages(e["pages"], num_pages) if e.get("pages") else None for e in self.elements]
+
+        overlay_indices: Dict[Tuple[TextItem, ...], int] = {}
+        page_overlays = []
+        section = ""
+        for page_no in range(num_pages):
+            section = self.sections.get(page_no, section)
+            items: List[TextItem] = []
+            if page_no not in skip:
+                fields = {"page": page_no + self.page_offset, "page_no": page_no, "num_pages": num_pages, "section": section}
+                for element, pages in zip(self.elements, element_pages):
+                    if pages is not None and page_no not in pages:
+                        continue
+                    if element.get("when") == "section" and page_no not in self.sections:
+                        continue
+                    item = self._item(element, page_no, fields)
+                    if item is not None:
+                        items.append(item)
+            page_overlays.append(overlay_indices.setdefault(tuple(items), len(overlay_indices)))
+
+        return OverlayPlan(list(overlay_indices), page_overlays)
+
+
+def _render_shard(plan: OverlayPlan, page_size: Tuple[float, float], filename: str) -> str:
+    from command.hf_pdf_cmd import HeaderFooterPDFCmd
+
+    HeaderFooterPDFCmd(filename, plan.num_pages, page_size, plan).execute()
+    return filename
+
+
+def render_overlay_pdf(output_filename: str, plan: OverlayPlan, page_size: Tuple[float, float], workers: int = 1) -> None:
+    """Write the header/footer PDF of the plan, rendering the shards of the plan in worker processes."""
+    if workers <= 1:
+        _render_shard(plan, page_size, output_filename)
+        return
+
+    from pdf_backend import get_backend
+
+    backend = get_backend()
+    doc = backend.new_document()
+    with tempfile.TemporaryDirectory() as tmp_dir, ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(_render_shard, plan.subplan(start, end), page_size, os.path.join(tmp_dir, f"part{i}.pdf"))
+            for i, (start, end) in enumerate(plan.shard(workers))
+        ]
+        for future in futures:
+            with backend.open_document(future.result()) as part:
+                backend.insert_pages(doc, part, range(backend.page_count(part)))
+    backend.save(doc, output_filename)
+
+
+def _construct_argparse():
+    parser = argparse.ArgumentParser(description="Draw page numbers and titles from a JSON or TOML header/footer template.")
+    parser.add_argument("template", help="Template filename.")
+    parser.add_argument("-o", "--output", required=True, help="Output filename.")
+    parser.add_argument("-i", "--input", help="Stamp the text onto the pages of this PDF instead of writing an overlay PDF.")
+    parser.add_argument("--num-pages", type=int, help="Number of pages of the overlay PDF.")
+    parser.add_argument("--page-size", help="Page size of the overlay PDF in points, i.e. 396,612. Overrides the template.")
+    parser.add_argument("--workers", type=int, default=1, help="Render the overlay PDF in this many processes.")
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = _construct_argparse()
+    args = parser.parse_args(argv)
+    template = HeaderFooterTemplate.load(args.template)
+
+    if args.input:
+        from command.stamp_pdf_cmd import StampPDFCmd
+        from pdf_info import get_num_pages
+
+        StampPDFCmd(args.output, args.input, template.compile(get_num_pages(args.input))).execute()
+        return
+
+    page_size = tuple(float(v) for v in args.page_size.split(",")) if args.page_size else template.page_size
+    if not args.num_pages or page_size is None:
+        parser.error("--num-pages and a page size are required without --input.")
+    render_overlay_pdf(args.output, template.compile(args.num_pages), page_size, args.workers)  # type: ignore
+
+
+if __name__ == "__main__":
+    main()
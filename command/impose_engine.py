@@ -0,0 +1,837 @@
+from concurrent.futures import ProcessPoolExecutor
+from enum import IntEnum
+import logging
+import math
+import os
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from command.merge_pdf_cmd import PagesInput, resolve_pages
+from command.page_plan import BLANK_PAGE
+
+
+logger = logging.getLogger(__name__)
+
+
+# The layout follows pdfimpose 2.x (saddle and perfect schemas), so the output is the same page for page.
+# https://framagit.org/spalax/pdfimpose
+
+BIND_ANGLES = {"left": 0, "top": 90, "right": 180, "bottom": 270}
+
+# left, right, top, bottom
+MarginsLike = Union[float, Tuple[float, float, float, float]]
+
+
+class ImposeSchema(IntEnum):
+    SADDLE = 0  # the sheets are inserted into each other, like in magazines
+    PERFECT = 1  # the folded sheets are stacked, like in books
+
+
+class Margins(NamedTuple):
+    left: float = 0
+    right: float = 0
+    top: float = 0
+    bottom: float = 0
+
+    @classmethod
+    def of(cls, margins: MarginsLike) -> "Margins":
+        if isinstance(margins, (int, float)):
+            return cls(margins, margins, margins, margins)
+        return cls(*margins)
+
+
+class Slot:
+    """A source page on an output page: the page index, the rotation and the margins around it."""
+
+    __slots__ = ("number", "rotate", "left", "right", "top", "bottom")
+
+    def __init__(self, number: int, rotate: int = 0, left: float = 0, right: float = 0, top: float = 0, bottom: float = 0) -> None:
+        self.number = number
+        self.rotate = rotate
+        self.left = left
+        self.right = right
+        self.top = top
+        self.bottom = bottom
+
+    def copy(self, number: Optional[int] = None) -> "Slot":
+        return Slot(self.number if number is None else number, self.rotate, self.left, self.right, self.top, self.bottom)
+
+
+class SheetSide:
+    """The slots of one output page by column x and row y."""
+
+    def __init__(self, slots: List[List[Slot]]) -> None:
+        self.slots = slots
+
+    @property
+    def width(self) -> int:
+        return len(self.slots)
+
+    @property
+    def height(self) -> int:
+        return len(self.slots[0])
+
+    def coordinates(self) -> Iterator[Tuple[int, int]]:
+        for x in range(self.width):
+            for y in range(self.height):
+                yield x, y
+
+    def __getitem__(self, coord: Tuple[int, int]) -> Slot:
+        return self.slots[coord[0]][coord[1]]
+
+    def copy(self, offset: int = 0) -> "SheetSide":
+        return SheetSide([[slot.copy(slot.number + offset) for slot in column] for column in self.slots])
+
+    def topleft(self, coord: Tuple[int, int], size: Tuple[float, float]) -> Tuple[float, float]:
+        """Return the top-left corner of the slot on the output page, from the top-left corner of the page."""
+        x, y = coord
+        width, height = size
+        left = 0.0
+        for i in range(x):
+            slot = self.slots[i][y]
+            left += slot.left + slot.right + (height if slot.rotate in (90, 270) else width)
+        left += self.slots[x][y].left
+
+        top = 0.0
+        for j in range(y):
+            slot = self.slots[x][j]
+            top += slot.top + slot.bottom + (width if slot.rotate in (90, 270) else height)
+        top += self.slots[x][y].top
+
+        return left, top
+
+    def page_size(self, size: Tuple[float, float]) -> Tuple[float, float]:
+        """Return the size of the output page for source pages of the size."""
+        lines = []
+        for y in range(self.height):
+            line = 0.0
+            for x in range(self.width):
+                slot = self.slots[x][y]
+                line += slot.left + slot.right + (size[1] if slot.rotate in (90, 270) else size[0])
+            lines.append(line)
+
+        rows = []
+        for x in range(self.width):
+            row = 0.0
+            for y in range(self.height):
+                slot = self.slots[x][y]
+                row += slot.top + slot.bottom + (size[0] if slot.rotate in (90, 270) else size[1])
+            rows.append(row)
+
+        return max(lines), max(rows)
+
+
+def _other_of_pair(number: int) -> int:
+    # 12 <-> 13, the other page of the same leaf.
+    return number + 1 if number % 2 == 0 else number - 1
+
+
+class BaseImpositor:
+    """Base class of the impositions: the source pages on each output page, with blank pages added to fill the sheets.
+
+    The last pages of the source stay at the end after the added blank pages.
+    """
+
+    def __init__(self, last: int = 0) -> None:
+        if last < 0:
+            raise ValueError("last can't be negative.")
+        self.last = last
+
+    def sheet_pages(self, num_pages: int) -> int:
+        """Return the number of source pages the output is made of a multiple of."""
+        raise NotImplementedError
+
+    def blank_pages(self, num_pages: int) -> int:
+        """Return the number of blank pages added before the last pages to fill the sheets."""
+        per_sheet = self.sheet_pages(num_pages)
+        return (per_sheet - num_pages % per_sheet) % per_sheet
+
+    def source_index(self, number: int, num_pages: int) -> Optional[int]:
+        """Return the source page of a slot number, or None for an added blank page."""
+        blank_pages = self.blank_pages(num_pages)
+        position = num_pages - self.last
+        if position <= number < position + blank_pages:
+            return None
+        return number - blank_pages if number >= position + blank_pages else number
+
+    def sides(self, num_pages: int) -> Iterator[SheetSide]:
+        """Yield the output pages for num_pages source pages, without the blank pages added."""
+        raise NotImplementedError
+
+    def cache_params(self) -> Optional[Dict[str, Any]]:
+        """Return the JSON serializable parameters of the imposition, or None if it can't be cached."""
+        return None
+
+
+class Impositor(BaseImpositor):
+    """Computes the output pages of a saddle stitch or perfect binding imposition.
+
+    folds is a sequence of "h" (horizontal) and "v" (vertical) folds. group sheets are folded together into one
+    signature (0 for all the sheets in one signature). creep is the space added between two facing pages per
+    inner sheet of a saddle signature.
+    """
+
+    def __init__(
+        self,
+        folds: str,
+        schema: ImposeSchema = ImposeSchema.SADDLE,
+        imargin: float = 0,
+        omargin: MarginsLike = 0,
+        creep: Union[float, Callable[[int], float]] = 0,
+        group: int = 1,
+        last: int = 0,
+        bind: str = "left",
+    ) -> None:
+        if not folds or set(folds) - {"h", "v"}:
+            raise ValueError(f"Invalid folds '{folds}'. Use a sequence of h and v.")
+        if bind not in BIND_ANGLES:
+            raise ValueError(f"Unknown bind '{bind}'. Choose one of {', '.join(BIND_ANGLES)}.")
+        if group < 0:
+            raise ValueError("group can't be negative.")
+        super().__init__(last)
+
+        self.folds = folds
+        self.schema = schema
+        self.imargin = imargin
+        self.omargin = Margins.of(omargin)
+        self._creep = creep
+        self.creep: Callable[[int], float] = creep if callable(creep) else (lambda sheets, slope=float(creep): slope * sheets)
+        self.group = group
+        self.bind = bind
+        self.signature = (2 ** folds.count("h"), 2 ** folds.count("v"))
+
+    @property
+    def pages_per_sheet(self) -> int:
+        """Source pages on both sides of a sheet."""
+        return 2 * self.signature[0] * self.signature[1]
+
+    def group_size(self, num_pages: int) -> int:
+        if self.group == 0:
+            return math.ceil(num_pages / self.pages_per_sheet)
+        return self.group
+
+    def sheet_pages(self, num_pages: int) -> int:
+        # the pages of one signature
+        return self.pages_per_sheet * self.group_size(num_pages)
+
+    def cache_params(self) -> Optional[Dict[str, Any]]:
+        if callable(self._creep):
+            return None
+        return {
+            "folds": self.folds,
+            "schema": self.schema.name,
+            "imargin": self.imargin,
+            "omargin": self.omargin,
+            "creep": self._creep,
+            "group": self.group,
+            "last": self.last,
+            "bind": self.bind,
+        }
+
+    def _margins(self, x: int, y: int) -> Margins:
+        left = 0 if x % 2 == 1 else self.imargin / 2
+        right = 0 if x % 2 == 0 else self.imargin / 2
+        if x == 0:
+            left = self.omargin.left
+        if x == self.signature[0] - 1:
+            right = self.omargin.right
+        top = self.omargin.top if y == 0 else self.imargin / 2
+        bottom = self.omargin.bottom if y == self.signature[1] - 1 else self.imargin / 2
+        return Margins(left, right, top, bottom)
+
+    def _folded_sheet(self) -> List[SheetSide]:
+        """Return the recto and the verso of one folded sheet."""
+        recto = [[0]]
+        total = 2
+        for fold in self.folds:
+            total *= 2
+            if fold == "h":
+                recto = recto[: len(recto) // 2] + [[-1] * len(column) for column in recto] + recto[len(recto) // 2 :]
+                for x in range(len(recto)):
+                    for y in range(len(recto[x])):
+                        if recto[x][y] < 0:
+                            recto[x][y] = total - recto[_other_of_pair(x)][y] - 1
+            else:
+                recto = [column[: len(column) // 2] + [-1] * len(column) + column[len(column) // 2 :] for column in recto]
+                for x in range(len(recto)):
+                    for y in range(len(recto[x])):
+                        if recto[x][y] < 0:
+                            recto[x][y] = total - recto[x][_other_of_pair(y)] - 1
+
+        def rotate(y: int) -> int:
+            angle = ([0, 180] if self.signature[1] == 1 else [180, 0])[y % 2]
+            return (angle + BIND_ANGLES[self.bind]) % 360
+
+        def side(number: Callable[[int, int], int]) -> SheetSide:
+            return SheetSide(
+                [[Slot(number(x, y), rotate(y), *self._margins(x, y)) for y in range(len(recto[x]))] for x in range(len(recto))]
+            )
+
+        return [side(lambda x, y: recto[x][y]), side(lambda x, y: _other_of_pair(recto[len(recto) - x - 1][y]))]
+
+    def _group_sides(self, num_pages: int) -> List[SheetSide]:
+        """Return the sides of the sheets of one group, the outer sheet first."""
+        group = self.group_size(num_pages)
+        sides = []
+        for g in range(group):
+            for side in self._folded_sheet():
+                grouped = side.copy()
+                for x, y in side.coordinates():
+                    number = side[x, y].number
+                    outer = number + (number + 2) // 4 * 4 * (group - 1)
+                    if g == 0:
+                        grouped[x, y].number = outer
+                    elif number % 4 <= 1:
+                        grouped[x, y].number = outer + 2 * g
+                    else:
+                        grouped[x, y].number = outer - 2 * g
+                sides.append(grouped)
+        return sides
+
+    def sides(self, num_pages: int) -> Iterator[SheetSide]:
+        """Yield the output pages for num_pages source pages, without the blank pages added."""
+        total = num_pages + self.blank_pages(num_pages)
+        group_sides = self._group_sides(total)
+        if self.schema == ImposeSchema.PERFECT:
+            step = self.pages_per_sheet * self.group_size(total)
+            for i in range(total // step):
+                for side in group_sides:
+                    yield side.copy(i * step)
+            return
+
+        # saddle: the sheets are inserted into each other, so each sheet takes pages from both ends.
+        per_group = self.group_size(total) * self.signature[0] * self.signature[1]
+        for sheet in range(total // (2 * per_group)):
+            creep = self.creep(sheet) / 2
+            for side in group_sides:
+                side = side.copy()
+                for x, y in side.coordinates():
+                    slot = side[x, y]
+                    if x % 2 == 0:
+                        slot.right = creep
+                    else:
+                        slot.left = creep
+                    if slot.number < per_group:
+                        slot.number += per_group * sheet
+                    else:
+                        slot.number = total - (sheet + 2) * per_group + slot.number
+                yield side
+
+
+class GridImpositor(BaseImpositor):
+    """Places columns x rows source pages on each output page, unfolded.
+
+    By default the pages are in reading order, for n-up copies printed on one side. With stack, the cells of each
+    output page are numbered as stacks: the printed sheets are cut into cells and the stacks of cells are put on each
+    other. duplex prints the next page of each cell on its back, like the pdfimpose wire schema.
+    """
+
+    def __init__(
+        self,
+        columns: int,
+        rows: int,
+        stack: bool = False,
+        duplex: bool = False,
+        imargin: float = 0,
+        omargin: MarginsLike = 0,
+        last: int = 0,
+    ) -> None:
+        if columns < 1 or rows < 1:
+            raise ValueError(f"Invalid grid {columns}x{rows}. Use at least one column and one row.")
+        super().__init__(last)
+
+        self.columns = columns
+        self.rows = rows
+        self.stack = stack
+        # the back of a cell only matters when the cells are cut.
+        self.duplex = duplex and stack
+        self.imargin = imargin
+        self.omargin = Margins.of(omargin)
+
+    def sheet_pages(self, num_pages: int) -> int:
+        return self.columns * self.rows * (2 if self.duplex else 1)
+
+    def _margins(self, x: int, y: int) -> Margins:
+        return Margins(
+            self.omargin.left if x == 0 else self.imargin / 2,
+            self.omargin.right if x == self.columns - 1 else self.imargin / 2,
+            self.omargin.top if y == 0 else self.imargin / 2,
+            self.omargin.bottom if y == self.rows - 1 else self.imargin / 2,
+        )
+
+    def _side(self, number: Callable[[int, int], int]) -> SheetSide:
+        return SheetSide([[Slot(number(x, y), 0, *self._margins(x, y)) for y in range(self.rows)] for x in range(self.columns)])
+
+    def sides(self, num_pages: int) -> Iterator[SheetSide]:
+        total = num_pages + self.blank_pages(num_pages)
+        cells = self.columns * self.rows
+        if not self.stack:
+            for page in range(total // cells):
+                yield self._side(lambda x, y: page * cells + y * self.columns + x)
+            return
+
+        # the cells are stacked column by column, like in pdfimpose.
+        sheets = total // self.sheet_pages(num_pages)
+        for sheet in range(sheets):
+            if self.duplex:
+                yield self._side(lambda x, y: 2 * ((x * self.rows + y) * sheets + sheet))
+                # the verso is the recto flipped around the vertical axis.
+                yield self._side(lambda x, y: 2 * (((self.columns - x - 1) * self.rows + y) * sheets + sheet) + 1)
+            else:
+                yield self._side(lambda x, y: (x * self.rows + y) * sheets + sheet)
+
+    def cache_params(self) -> Optional[Dict[str, Any]]:
+        return {
+            "columns": self.columns,
+            "rows": self.rows,
+            "stack": self.stack,
+            "duplex": self.duplex,
+            "imargin": self.imargin,
+            "omargin": self.omargin,
+            "last": self.last,
+        }
+
+
+class Placement(NamedTuple):
+    """A source page placed on an output page, topleft from the top-left corner of the output page."""
+
+    source: int
+    topleft: Tuple[float, float]
+    rotate: int
+
+
+class OutputPage(NamedTuple):
+    width: float
+    height: float
+    placements: List[Placement]
+
+
+def layout(impositor: BaseImpositor, num_pages: int, page_size: Tuple[float, float]) -> Iterator[OutputPage]:
+    """Yield the output pages with the source pages placed on them, blank pages left out."""
+    for side in impositor.sides(num_pages):
+        placements = []
+        for x, y in side.coordinates():
+            source = impositor.source_index(side[x, y].number, num_pages)
+            if source is not None:
+                placements.append(Placement(source, side.topleft((x, y), page_size), side[x, y].rotate))
+        yield OutputPage(*side.page_size(page_size), placements)
+
+
+def _box(doc: Any, xref: int, key: str) -> Optional[Tuple[float, float, float, float]]:
+    kind, value = doc.xref_get_key(xref, key)
+    if kind != "array":
+        return None
+    left, bottom, right, top = (float(v) for v in value.strip("[]").split())
+    return min(left, right), min(bottom, top), max(left, right), max(bottom, top)
+
+
+class _FormPages:
+    """Form XObjects of the source pages copied into the output document, made once and drawn by reference."""
+
+    def __init__(self, doc: Any, page_xrefs: List[int]) -> None:
+        self.doc = doc
+        # the xrefs of the source pages, looked up at once while the page tree is unchanged.
+        self.page_xrefs = page_xrefs
+        # source page index -> (xref of the form, the box drawn in the slot in PDF coordinates)
+        self.forms: List[Optional[Tuple[int, Tuple[float, float, float, float]]]] = [None] * len(page_xrefs)
+
+    def form(self, index: int) -> Tuple[int, Tuple[float, float, float, float]]:
+        form = self.forms[index]
+        if form is None:
+            form = self.forms[index] = self._new_form(index)
+        return form
+
+    def _new_form(self, index: int) -> Tuple[int, Tuple[float, float, float, float]]:
+        doc = self.doc
+        page_xref = self.page_xrefs[index]
+        box = _box(doc, page_xref, "CropBox") or _box(doc, page_xref, "MediaBox")
+        contents_kind, contents = doc.xref_get_key(page_xref, "Contents")
+        kind, value = doc.xref_get_key(page_xref, "Rotate")
+        rotate = int(float(value)) if kind in ("int", "float") else 0
+        if box is None:
+            # inherited boxes are left to PyMuPDF.
+            page = doc[index]
+            rect = page.cropbox * ~page.transformation_matrix
+            box, rotate = (rect.x0, rect.y0, rect.x1, rect.y1), page.rotation
+        box, size = _shown_box(box, rotate)
+        matrix, drawn_box = _fitted_form(box, size)
+
+        kind, resources = doc.xref_get_key(page_xref, "Resources")
+        if kind == "null":
+            resources = "<<>>"
+        xref = doc.get_new_xref()
+        doc.update_object(xref, f"<</Type/XObject/Subtype/Form/BBox[{' '.join(map(_number, box))}]/Resources {resources}>>")
+        if matrix is not None:
+            # the scale is multiplied by the whole page, so it needs more digits than the positions.
+            doc.xref_set_key(xref, "Matrix", f"[{' '.join(_number(v, 8) for v in matrix)}]")
+        contents_xref = int(contents.split()[0]) if contents_kind == "xref" else 0
+        if contents_xref and doc.xref_is_stream(contents_xref):
+            # a single content stream is copied as is, without decompressing it.
+            doc.update_stream(xref, doc.xref_stream_raw(contents_xref), compress=0)
+            kind, value = doc.xref_get_key(contents_xref, "Filter")
+            if kind != "null":
+                doc.xref_set_key(xref, "Filter", value)
+                kind, value = doc.xref_get_key(contents_xref, "DecodeParms")
+                if kind != "null":
+                    doc.xref_set_key(xref, "DecodeParms", value)
+        else:
+            # an array of streams, direct or by reference, is joined.
+            doc.update_stream(xref, doc[index].read_contents())
+        return xref, drawn_box
+
+    def draw(self, page_xref: int, height: float, placements: List[Placement]) -> None:
+        """Draw the source pages in their slots of the output page of the height, as PyMuPDF show_pdf_page does."""
+        doc = self.doc
+        commands = []
+        xobjects = []
+        for n, placement in enumerate(placements):
+            xref, box = self.form(placement.source)
+            commands.append(_draw_command(n, box, placement, height))
+            xobjects.append(f"/P{n} {xref} 0 R")
+
+        doc.xref_set_key(page_xref, "Resources", f"<</XObject<<{''.join(xobjects)}>>>>")
+        contents = doc.get_new_xref()
+        doc.update_object(contents, "<<>>")
+        doc.update_stream(contents, "\n".join(commands).encode())
+        doc.xref_set_key(page_xref, "Contents", f"{contents} 0 R")
+
+
+_ROTATIONS = {0: (1, 0), 90: (0, 1), 180: (-1, 0), 270: (0, -1)}
+
+
+def _number(value: float, digits: int = 4) -> str:
+    text = f"{value:.{digits}f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _shown_box(box: Tuple[float, float, float, float], rotate: int) -> Tuple[Tuple[float, float, float, float], Tuple[float, float]]:
+    """Return the box of the source page that pdfimpose draws and the size of its slot, from the cropbox and /Rotate.
+
+    PyMuPDF show_pdf_page takes the page rect, which is rotated, back to PDF coordinates without the rotation.
+    So a rotated page is drawn unrotated, clipped to that box and fitted to the slot of its unrotated cropbox.
+    """
+    width, height = box[2] - box[0], box[3] - box[1]
+    if rotate % 360 == 0:
+        return box, (width, height)
+    rect_width, rect_height = (height, width) if rotate % 180 else (width, height)
+    return (0, height - rect_height, rect_width, height), (width, height)
+
+
+def _fitted_form(
+    box: Tuple[float, float, float, float], size: Tuple[float, float]
+) -> Tuple[Optional[Tuple[float, float, float, float, float, float]], Tuple[float, float, float, float]]:
+    """Return the /Matrix of the form of the box that fits it in the size keeping its proportions, None if it fits
+    already, and the box of the size at the same center that is drawn in the slot."""
+    width, height = box[2] - box[0], box[3] - box[1]
+    cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    scale = min(size[0] / width, size[1] / height)
+    drawn_box = (cx - size[0] / 2, cy - size[1] / 2, cx + size[0] / 2, cy + size[1] / 2)
+    if abs(scale - 1) < 1e-9:
+        return None, drawn_box
+    # scaled about the center of the box
+    return (scale, 0, 0, scale, cx * (1 - scale), cy * (1 - scale)), drawn_box
+
+
+def _draw_command(n: int, box: Tuple[float, float, float, float], placement: Placement, page_height: float) -> str:
+    """The content operators that draw the form /P{n} of the source box in its slot."""
+    m = _fit_matrix(box, placement.topleft, page_height, placement.rotate)
+    return f"q {' '.join(map(_number, m))} cm /P{n} Do Q"
+
+
+def _fit_matrix(
+    box: Tuple[float, float, float, float], topleft: Tuple[float, float], page_height: float, rotate: int
+) -> Tuple[float, float, float, float, float, float]:
+    """The matrix of PyMuPDF show_pdf_page: center the source box on the origin, rotate it and move it to the center
+    of the slot at topleft. The slot has the size of the rotated box, like in pdfimpose, so there is no scaling."""
+    width, height = box[2] - box[0], box[3] - box[1]
+    if rotate in (90, 270):
+        width, height = height, width
+    # the center of the slot in PDF coordinates of the output page, y up.
+    tx, ty = topleft[0] + width / 2, page_height - topleft[1] - height / 2
+
+    cos, sin = _ROTATIONS[rotate]
+    cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    return cos, sin, -sin, cos, tx - (cx * cos - cy * sin), ty - (cx * sin + cy * cos)
+
+
+def _pypdf2_form(page: Any) -> Tuple[Any, Tuple[float, float, float, float]]:
+    """Return a Form XObject of the PyPDF2 page, referring to the resources of the page, and the box drawn in the slot."""
+    from PyPDF2.generic import ArrayObject, DecodedStreamObject, EncodedStreamObject, FloatObject, NameObject
+
+    cropbox = page.cropbox
+    box = (
+        float(min(cropbox.left, cropbox.right)),
+        float(min(cropbox.bottom, cropbox.top)),
+        float(max(cropbox.left, cropbox.right)),
+        float(max(cropbox.bottom, cropbox.top)),
+    )
+    box, size = _shown_box(box, page.rotation)
+    matrix, drawn_box = _fitted_form(box, size)
+    contents = page.get("/Contents")
+    contents = contents.get_object() if contents is not None else None
+    form: Any
+    if isinstance(contents, EncodedStreamObject):
+        # a single content stream is copied as is, without decompressing it.
+        form = EncodedStreamObject()
+        form._data = contents._data
+        for key in ("/Filter", "/DecodeParms"):
+            if key in contents:
+                form[NameObject(key)] = contents[key]
+    else:
+        form = DecodedStreamObject()
+        streams = [] if contents is None else contents if isinstance(contents, list) else [contents]
+        form.set_data(b"\n".join(s.get_object().get_data() for s in streams))
+
+    form[NameObject("/Type")] = NameObject("/XObject")
+    form[NameObject("/Subtype")] = NameObject("/Form")
+    form[NameObject("/BBox")] = ArrayObject([FloatObject(v) for v in box])
+    if matrix is not None:
+        form[NameObject("/Matrix")] = ArrayObject([FloatObject(v) for v in matrix])
+    if "/Resources" in page:
+        form[NameObject("/Resources")] = page.raw_get("/Resources")
+    return form, drawn_box
+
+
+# the page attributes inherited from the /Pages nodes
+_INHERITABLE = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+def _page_refs(reader: Any) -> List[Tuple[Any, Dict[str, Any]]]:
+    """Return the reference and the inherited attributes of each page of the PyPDF2 reader.
+
+    reader.pages keeps every parsed page, so the page tree is walked here and the pages are parsed again when drawn.
+    """
+    from command.stream_pdf_writer import RELEASE_INTERVAL
+
+    refs = []
+    stack = [(reader.trailer["/Root"].raw_get("/Pages"), {})]
+    while stack:
+        ref, inherited = stack.pop()
+        node = ref.get_object()
+        if "/Kids" in node:
+            inherited = {**inherited, **{key: node.raw_get(key) for key in _INHERITABLE if key in node}}
+            stack.extend((kid, inherited) for kid in reversed(node["/Kids"]))
+        else:
+            refs.append((ref, inherited))
+            if len(refs) % RELEASE_INTERVAL == 0:
+                # the parsed pages are dropped, like StreamingPdfWriter does while writing.
+                reader.resolved_objects.clear()
+    reader.resolved_objects.clear()
+    return refs
+
+
+def _pypdf2_page(ref: Any, inherited: Dict[str, Any]) -> Any:
+    from PyPDF2 import PageObject
+    from PyPDF2.generic import NameObject
+
+    page = PageObject(ref.pdf, ref)
+    page.update(ref.get_object())
+    for key, value in inherited.items():
+        if key not in page:
+            page[NameObject(key)] = value
+    return page
+
+
+def _page_size(pages: List[Tuple[Any, int]], impositor: BaseImpositor, page_box: Callable[[Any, int], Any]) -> Tuple[float, float]:
+    """pdfimpose takes the size of the first page, or of the last one if the first is a blank page of the imposition.
+    An inserted blank page of the inputs has the size of the first page of its document."""
+    doc, index = pages[0] if impositor.source_index(0, len(pages)) is not None else pages[-1]
+    return page_box(doc, 0 if index == BLANK_PAGE else index)
+
+
+def impose_streaming(inputs: Sequence[PagesInput], impositor: BaseImpositor, filename: str) -> int:
+    """Impose the pages of the inputs to the file, writing each output page as soon as it is drawn.
+
+    Every output page depends only on the source pages of its signature, so the source pages are parsed from
+    the lazily opened PyPDF2 readers when their output page is drawn and the memory doesn't grow with the document.
+    Return the number of output pages.
+    """
+    from PyPDF2 import PageObject
+    from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, NameObject, NumberObject
+
+    from command.stream_pdf_writer import StreamingPdfWriter
+    from pdf_info import ReaderPool
+
+    with ReaderPool(stream_files=True) as pool, StreamingPdfWriter(filename) as writer:
+        # id(reader) -> the page references of the reader
+        page_refs: Dict[int, List[Tuple[Any, Dict[str, Any]]]] = {}
+
+        def page_count(reader: Any) -> int:
+            # len(reader.pages) would parse and keep every page of the reader.
+            if id(reader) not in page_refs:
+                page_refs[id(reader)] = _page_refs(reader)
+            return len(page_refs[id(reader)])
+
+        pages = resolve_pages(inputs, pool, page_count)
+        if not pages:
+            raise ValueError("The input files have no page.")
+
+        def page_box(reader: Any, index: int) -> Tuple[float, float]:
+            cropbox = _pypdf2_page(*page_refs[id(reader)][index]).cropbox
+            return float(cropbox.width), float(cropbox.height)
+
+        for output_page in layout(impositor, len(pages), _page_size(pages, impositor, page_box)):
+            commands = []
+            xobjects = DictionaryObject()
+            for n, placement in enumerate(output_page.placements):
+                reader, index = pages[placement.source]
+                if index == BLANK_PAGE:
+                    continue
+                form, box = _pypdf2_form(_pypdf2_page(*page_refs[id(reader)][index]))
+                commands.append(_draw_command(n, box, placement, output_page.height))
+                xobjects[NameObject(f"/P{n}")] = form
+
+            contents = DecodedStreamObject()
+            contents.set_data("\n".join(commands).encode())
+            page = PageObject()
+            page[NameObject("/Type")] = NameObject("/Page")
+            page[NameObject("/MediaBox")] = ArrayObject(
+                [NumberObject(0), NumberObject(0), FloatObject(output_page.width), FloatObject(output_page.height)]
+            )
+            page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): xobjects})
+            page[NameObject("/Contents")] = contents
+            writer.add_page(page)
+
+        return writer.num_pages
+
+
+class _FormDocument(NamedTuple):
+    """A PyMuPDF document holding the forms of the source pages and one blank page, the base of the imposed documents.
+
+    Documents opened from its bytes have the forms at the same xrefs.
+    """
+
+    doc: Any
+    # page index of the copy -> (xref of the form, the box drawn in the slot in PDF coordinates)
+    forms: List[Optional[Tuple[int, Tuple[float, float, float, float]]]]
+    # the output pages of each imposition, placing the copies of the source pages.
+    layouts: List[List[OutputPage]]
+    metadata: Dict[str, str]
+
+
+def _form_document(inputs: Sequence[PagesInput], impositors: Sequence[BaseImpositor]) -> _FormDocument:
+    from pdf_backend import get_backend
+    from pdf_info import ReaderPool
+
+    backend = get_backend("pymupdf")
+    with ReaderPool(backend=backend) as pool:
+        pages = resolve_pages(inputs, pool)
+        if not pages:
+            raise ValueError("The input files have no page.")
+
+        def page_box(src: Any, index: int) -> Tuple[float, float]:
+            cropbox = src[index].cropbox
+            return cropbox.width, cropbox.height
+
+        # each document is copied once, from its first to its last used page, because every insert_pdf() copies
+        # the fonts and images again. id(src) -> [src, first, last, page index of the copy of first]
+        spans: Dict[int, List[Any]] = {}
+        for src, index in pages:
+            if index != BLANK_PAGE:
+                span = spans.setdefault(id(src), [src, index, index, 0])
+                span[1], span[2] = min(span[1], index), max(span[2], index)
+        num_copies = 0
+        for span in spans.values():
+            span[3] = num_copies
+            num_copies += span[2] - span[1] + 1
+        # the page of the copy of each page of the inputs, None for a blank page.
+        copy_of = [None if index == BLANK_PAGE else spans[id(src)][3] + index - spans[id(src)][1] for src, index in pages]
+
+        layouts = []
+        for impositor in impositors:
+            output_pages = []
+            for output_page in layout(impositor, len(pages), _page_size(pages, impositor, page_box)):
+                placements = [p._replace(source=copy_of[p.source]) for p in output_page.placements if copy_of[p.source] is not None]
+                output_pages.append(output_page._replace(placements=placements))
+            layouts.append(output_pages)
+
+        # MuPDF adds and removes pages at the start of a long page tree much faster than at its end, so the source
+        # pages are copied in front of the blank page that is left once they are deleted, and the output pages
+        # are added after it.
+        doc = backend.new_document()
+        doc.new_page()
+        for src, first, last, _copy in reversed(list(spans.values())):
+            doc.insert_pdf(src, from_page=first, to_page=last, start_at=0)
+
+        sources = [span[0] for span in spans.values()]
+        metadata = {key: ", ".join(src.metadata.get(key) or "" for src in sources) for key in ("title", "author", "subject", "keywords")}
+
+    forms = _FormPages(doc, [doc.page_xref(i) for i in range(num_copies)])
+    for copy in copy_of:
+        if copy is not None:
+            forms.form(copy)
+    # the source pages are only needed to make the forms.
+    if num_copies:
+        doc.delete_pages(0, num_copies - 1)
+    return _FormDocument(doc, forms.forms, layouts, metadata)
+
+
+def _impose_layout(doc: Any, form_document: _FormDocument, output_pages: List[OutputPage]) -> Any:
+    """Draw the output pages with the forms in doc, the form document or a copy of it, and remove its blank page."""
+    for output_page in output_pages:
+        doc.new_page(-1, width=output_page.width, height=output_page.height)
+
+    forms = _FormPages(doc, [])
+    forms.forms = form_document.forms
+    page_xrefs = [doc.page_xref(i) for i in range(1, doc.page_count)]
+    for output_page, page_xref in zip(output_pages, page_xrefs):
+        forms.draw(page_xref, output_page.height, output_page.placements)
+
+    doc.delete_pages(0, 0)
+    doc.set_metadata(form_document.metadata)
+    return doc
+
+
+def _impose_file(form_filename: str, form_document: _FormDocument, output_pages: List[OutputPage], filename: str) -> str:
+    """Impose one layout from the saved form document to filename in a worker process."""
+    from pdf_backend import get_backend
+
+    backend = get_backend("pymupdf")
+    doc = _impose_layout(backend.open(form_filename), form_document, output_pages)
+    backend.save(doc, filename)
+    backend.close(doc)
+    return filename
+
+
+def impose(inputs: Sequence[PagesInput], impositor: BaseImpositor) -> Any:
+    """Impose the pages of the inputs, read one after another as one document, and return the PyMuPDF document."""
+    form_document = _form_document(inputs, [impositor])
+    return _impose_layout(form_document.doc, form_document, form_document.layouts[0])
+
+
+def impose_files(inputs: Sequence[PagesInput], impositors: Sequence[BaseImpositor], filenames: Sequence[str], workers: int = 1) -> None:
+    """Impose the pages of the inputs in each imposition to the file of the same index.
+
+    The inputs are parsed and the source pages made into forms once for all the impositions. Each imposition
+    is drawn on a copy of the form document and written, in one of the worker processes if workers > 1.
+    """
+    from pdf_backend import get_backend
+
+    backend = get_backend("pymupdf")
+    form_document = _form_document(inputs, impositors)
+    if workers <= 1 or len(impositors) <= 1:
+        data = form_document.doc.tobytes() if len(impositors) > 1 else b""
+        for i, (output_pages, filename) in enumerate(zip(form_document.layouts, filenames)):
+            # the last imposition is drawn on the form document itself.
+            doc = form_document.doc if i == len(impositors) - 1 else backend.fitz.open("pdf", data)
+            backend.save(_impose_layout(doc, form_document, output_pages), filename)
+            backend.close(doc)
+        return
+
+    fd, form_filename = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        # saved without garbage collection, so that the forms keep their xrefs.
+        form_document.doc.save(form_filename)
+        form_document.doc.close()
+        # only the forms and the output pages are sent to the workers.
+        shared = form_document._replace(doc=None, layouts=[])
+        with ProcessPoolExecutor(max_workers=min(workers, len(impositors))) as executor:
+            futures = [
+                executor.submit(_impose_file, form_filename, shared, output_pages, filename)
+                for output_pages, filename in zip(form_document.layouts, filenames)
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        os.remove(form_filename)
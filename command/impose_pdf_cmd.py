@@ -1,35 +1,148 @@
 import logging
-from typing import List
+from typing import List, Optional
 
-# Use pdfimpose for imposition: pip install pdfimpose
-# https://pdfimpose.readthedocs.io/en/latest/lib/saddle/
-from pdfimpose.schema import saddle
-
-from command.base_pdf_cmd import BasePDFCmd
+from command.base_pdf_cmd import BaseMultiPDFCmd, BasePDFCmd
+from command.impose_engine import BaseImpositor, Impositor, ImposeSchema, Margins, MarginsLike, impose, impose_files, impose_streaming
+from command.merge_pdf_cmd import FilenamePages, MergePDFCmd, PagesInput, input_sources
+from pdf_info import PDFSource, source_filename
 
 
 logger = logging.getLogger(__name__)
 
-# https://docs.reportlab.com/reportlab/userguide/ch3_fonts/#asian-font-support
-KOREAN_FONT = "HYSMyeongJo-Medium"
-
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.cidfonts import UnicodeCIDFont
 
-pdfmetrics.registerFont(UnicodeCIDFont(KOREAN_FONT))
+ENGINES = ("native", "pdfimpose")
 
 
 class ImposePDFCmd(BasePDFCmd):
-    def __init__(self, output_filename: str, input_files: List[str], folds: str):
+    """Impose the pages of the input files for saddle stitch or perfect binding.
+
+    The native engine lays the pages out like pdfimpose and draws each source page as one Form XObject reused
+    by reference. engine "pdfimpose" runs pdfimpose itself. creep is the space added between two facing pages
+    per inner sheet of a saddle signature.
+
+    The input files are read one after another as one document. An input can be FilenamePages, to impose page
+    ranges and inserted blank pages of the files without merging them first.
+    """
+
+    def __init__(
+        self,
+        output_filename: str,
+        input_files: List[PagesInput],
+        folds: str,
+        engine: str = "native",
+        schema: ImposeSchema = ImposeSchema.SADDLE,
+        imargin: float = 0,
+        omargin: MarginsLike = 0,
+        creep: float = 0,
+        group: int = 1,
+        last: int = 0,
+        bind: str = "left",
+        streaming: bool = False,
+    ):
         super().__init__(output_filename)
 
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown imposition engine '{engine}'. Choose one of {', '.join(ENGINES)}.")
+
         self.input_files = input_files
         self.folds = folds
+        self.engine = engine
+        self.schema = schema
+        self.imargin = imargin
+        self.omargin = omargin
+        self.creep = creep
+        self.group = group
+        self.last = last
+        self.bind = bind
+        # Write each imposed page to the output file as it is drawn, keeping the memory flat for very large documents.
+        # Streaming always uses the native layout with PyPDF2.
+        self.streaming = streaming
 
     def _execute(self) -> None:
         logger.info(f"Creating imposed pdf file: {self.output_file}.")
 
-        self._impose()
+        if self.streaming:
+            impose_streaming(self.input_files, self.impositor(), self.save_output())
+        elif self.engine == "pdfimpose":
+            self._impose_pdfimpose()
+        else:
+            self._impose()
+
+    def impositor(self) -> Impositor:
+        return Impositor(self.folds, self.schema, self.imargin, self.omargin, self.creep, self.group, self.last, self.bind)
 
     def _impose(self):
-        saddle.impose(self.input_files, self.output_file, folds=self.folds)
+        self.publish(impose(self.input_files, self.impositor()))
+
+    def _impose_pdfimpose(self):
+        # Use pdfimpose for imposition: pip install pdfimpose
+        # https://pdfimpose.readthedocs.io/en/latest/lib/saddle/
+        from pdfimpose.schema import perfect, saddle
+
+        # pdfimpose reads files, so in-memory inputs are written here and page ranges are merged first.
+        if any(isinstance(f, FilenamePages) for f in self.input_files):
+            merge = MergePDFCmd("", [f if isinstance(f, FilenamePages) else FilenamePages(f, None) for f in self.input_files])
+            merge.execute()
+            input_files = [merge.output_file]
+        else:
+            input_files = [source_filename(f) for f in self.input_files]
+        omargin = saddle.Margins(*Margins.of(self.omargin))
+        options = dict(folds=self.folds, imargin=self.imargin, omargin=omargin, group=self.group, last=self.last, bind=self.bind)
+        if self.schema == ImposeSchema.PERFECT:
+            perfect.impose(input_files, self.output_file, **options)
+        else:
+            saddle.impose(input_files, self.output_file, creep=self.impositor().creep, **options)
+
+    def cache_params(self) -> Optional[object]:
+        return {
+            "pages": [f.cache_params() if isinstance(f, FilenamePages) else None for f in self.input_files],
+            "folds": self.folds,
+            "engine": self.engine,
+            "streaming": self.streaming,
+            "schema": self.schema.name,
+            "imargin": self.imargin,
+            "omargin": self.omargin,
+            "creep": self.creep,
+            "group": self.group,
+            "last": self.last,
+            "bind": self.bind,
+        }
+
+    def input_filenames(self) -> List[PDFSource]:
+        return input_sources(self.input_files)
+
+
+class MultiImposePDFCmd(BaseMultiPDFCmd):
+    """Impose the pages of the input files in several layouts, i.e. saddle stitch proofs, n-up copies and cut and stack,
+    writing each layout to the output file of the same index.
+
+    The inputs are parsed and their pages made into Form XObjects once for all the layouts, with the native engine.
+    workers > 1 draws and writes the outputs in that many processes.
+    """
+
+    def __init__(self, output_files: List[str], input_files: List[PagesInput], layouts: List[BaseImpositor], workers: int = 1):
+        super().__init__(output_files)
+
+        if len(output_files) != len(layouts):
+            raise ValueError(f"{len(layouts)} layouts need as many output files, not {len(output_files)}.")
+
+        self.input_files = input_files
+        self.layouts = layouts
+        self.workers = workers
+
+    def _execute(self) -> None:
+        logger.info(f"Creating imposed pdf files: {', '.join(self.output_files)}.")
+
+        impose_files(self.input_files, self.layouts, self.output_files, self.workers)
+
+    def cache_params(self) -> Optional[object]:
+        layouts = [layout.cache_params() for layout in self.layouts]
+        if any(params is None for params in layouts):
+            return None
+        return {
+            "pages": [f.cache_params() if isinstance(f, FilenamePages) else None for f in self.input_files],
+            "layouts": [{"type": type(layout).__name__, **params} for layout, params in zip(self.layouts, layouts)],
+        }
+
+    def input_filenames(self) -> List[PDFSource]:
+        return input_sources(self.input_files)
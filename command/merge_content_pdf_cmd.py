@@ -1,46 +1,140 @@
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import ExitStack
 import logging
-from typing import List
-
-from PyPDF2 import PdfWriter
+import os
+import tempfile
+from typing import Iterable, List, Optional
 
 from command.base_pdf_cmd import BasePDFCmd
-from pdf_info import open_pdfreader
+from command.stream_pdf_writer import StreamingPdfWriter
+from pdf_backend import PDFBackend, get_backend
+from pdf_info import PDFSource, ReaderPool, source_filename
+from pdf_overlay import OverlayStamper
 
 
 logger = logging.getLogger(__name__)
 
 
+# Smaller chunks are not worth starting a worker and parsing the inputs again.
+MIN_CHUNK_PAGES = 50
+
+
+def overlay_pages(backend: PDFBackend, doc: object, input_files: List[PDFSource], page_numbers: Iterable[int]) -> None:
+    """Append the pages of the first input to doc with the same pages of the other inputs drawn on top."""
+    with ExitStack() as stack:
+        # Each input is opened on its own, so that the same file can be the base and an overlay.
+        docs = [stack.enter_context(backend.open_document(filename)) for filename in input_files]
+        for page_no in page_numbers:
+            backend.insert_overlaid_page(doc, docs[0], page_no, docs[1:])
+
+
+def _overlay_chunk(input_files: List[str], backend_name: Optional[str], start: int, end: int, filename: str) -> str:
+    """Overlay the pages from start to end - 1 in a worker process and write them to filename."""
+    backend = get_backend(backend_name)
+    doc = backend.new_document()
+    overlay_pages(backend, doc, input_files, range(start, end))
+    backend.save(doc, filename)
+    backend.close(doc)
+    return filename
+
+
 class MergeContentPDFCmd(BasePDFCmd):
-    def __init__(self, output_filename: str, input_files: List[str]):
+    def __init__(
+        self,
+        output_filename: str,
+        input_files: List[PDFSource],
+        streaming: bool = False,
+        backend: Optional[str] = None,
+        dedup: bool = False,
+        workers: int = 1,
+    ):
         super().__init__(output_filename)
 
         self.input_files = input_files
+        # Write each page to the output file as it is merged, keeping the memory flat for very large documents.
+        # Streaming always uses PyPDF2.
+        self.streaming = streaming
+        # PDF engine name, or None for the default backend.
+        self.backend = backend
+        # Store identical fonts, images and content streams once. Not applied in streaming.
+        self.dedup = dedup
+        # Overlay chunks of pages in this many processes and stitch the parts in page order. Not applied in streaming.
+        self.workers = workers
 
     def _execute(self) -> None:
         logger.info(f"Merging contents to pdf file: {self.output_file}.")
 
-        self.merge_pdf_content()
+        if self.streaming:
+            self.merge_pdf_content_streaming()
+        elif self.workers > 1:
+            self.merge_pdf_content_parallel()
+        else:
+            self.merge_pdf_content()
 
-    def merge_pdf_content(self):
-        writer = PdfWriter()
+    def merge_pdf_content_streaming(self):
+        with StreamingPdfWriter(self.save_output()) as writer, ReaderPool(stream_files=True) as pool:
+            readers = [pool.open(filename) for filename in self.input_files]
+            num_pages = len(readers[0].pages)
+            stamper = OverlayStamper(writer.add_object)
+
+            for page_no in range(num_pages):
+                # the stamped page is a shallow copy, so that the overlays are not kept by the reader.
+                writer.add_page(stamper.stamp(readers[0].pages[page_no], [r.pages[page_no] for r in readers[1:]]))
 
-        with ExitStack() as stack:
-            readers = [stack.enter_context(open_pdfreader(filename)) for filename in self.input_files]
-            readers0 = readers[0]
-            readers1_ = readers[1:]
-            num_pages = len(readers0.pages)
+    def merge_pdf_content(self):
+        backend = get_backend(self.backend)
+        doc = backend.new_document()
 
+        with backend.open_document(self.input_files[0]) as base:
+            num_pages = backend.page_count(base)
             # iterarte pages
-            for page_no in range(num_pages):
-                main_page = readers0.pages[page_no]
+            overlay_pages(backend, doc, self.input_files, range(num_pages))
+            backend.copy_navigation(doc, base)
+
+        self._publish_result(backend, doc)
+
+    def merge_pdf_content_parallel(self):
+        backend = get_backend(self.backend)
+        # the workers open the inputs by filename. In-memory outputs of commands are written first.
+        input_files = [source_filename(filename) for filename in self.input_files]
+        if not all(isinstance(filename, str) for filename in input_files):
+            logger.warning("In-memory input documents can't be sent to worker processes. Merging in one process.")
+            self.merge_pdf_content()
+            return
+
+        with backend.open_document(input_files[0]) as base:
+            num_pages = backend.page_count(base)
+        chunk_size = max(MIN_CHUNK_PAGES, -(-num_pages // self.workers))
+        chunks = [(start, min(start + chunk_size, num_pages)) for start in range(0, num_pages, chunk_size)]
 
-                # merge content in content_page to the main_page
-                for r in readers1_:
-                    content_page = r.pages[page_no]
-                    main_page.merge_page(content_page)
-                writer.add_page(main_page)
+        doc = backend.new_document()
+        # the workers get the name, so that they use the backend of this process even if the default is changed.
+        with tempfile.TemporaryDirectory() as tmp_dir, ProcessPoolExecutor(min(self.workers, len(chunks) or 1)) as executor:
+            futures = [
+                executor.submit(_overlay_chunk, input_files, backend.name, start, end, os.path.join(tmp_dir, f"part{i}.pdf"))
+                for i, (start, end) in enumerate(chunks)
+            ]
+            # stitch the parts in page order.
+            for future in futures:
+                with backend.open_document(future.result()) as part:
+                    backend.insert_pages(doc, part, range(backend.page_count(part)))
+
+            with backend.open_document(input_files[0]) as base:
+                backend.copy_navigation(doc, base)
+
+        # each part has its own copy of the fonts and the images, so the stitched document is always deduplicated.
+        self._publish_result(backend, doc, dedup=True)
+
+    def _publish_result(self, backend: PDFBackend, doc: object, dedup: bool = False) -> None:
+        if self.dedup or dedup:
+            doc = backend.deduplicate(doc)
 
         # write result
-        if len(writer.pages):
-            writer.write(self.output_file)
+        if backend.page_count(doc):
+            self.publish(doc)
+
+    def cache_params(self) -> Optional[object]:
+        return {"dedup": self.dedup, "backend": get_backend(self.backend).name}
+
+    def input_filenames(self) -> List[PDFSource]:
+        return list(self.input_files)
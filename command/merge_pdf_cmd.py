@@ -1,13 +1,14 @@
 import argparse
+from contextlib import ExitStack
 from enum import IntEnum
+import json
 import logging
 import os
-from typing import List, Tuple, Union
-
-from PyPDF2 import PdfWriter
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
 
 from command.base_pdf_cmd import BasePDFCmd
-from pdf_info import open_pdfreader
+from command.page_plan import BLANK_PAGE, PagePlan, PageRanges, PageSpec, compile_page_specs, parse_page_specs
+from pdf_info import PDFSource, ReaderPool
 
 
 logger = logging.getLogger(__name__)
@@ -23,98 +24,256 @@ class FrontBackCover(IntEnum):
 class FilenamePages:
     def __init__(
         self,
-        filename: str,
-        ranges: Union[None, List[Tuple[int, int]]],
+        filename: Union[PDFSource, List[PDFSource]],
+        ranges: PageRanges,
         front_cover: FrontBackCover = FrontBackCover.PrintBoth,
         back_cover: FrontBackCover = FrontBackCover.PrintBoth,
     ) -> None:
-        self.filename: str = filename
-        self.ranges: Union[None, List[Tuple[int, int]]] = ranges
+        self.filename: Union[PDFSource, List[PDFSource]] = filename
+        # None for all pages, [(start, end)], a list of PageSpec or the text form of page_plan.PageSpec.
+        self.ranges: PageRanges = ranges
         self.front_cover = front_cover
         self.back_cover = back_cover
 
+    def filenames(self) -> List[PDFSource]:
+        return list(self.filename) if isinstance(self.filename, list) else [self.filename]
+
+    def cache_params(self) -> List[Any]:
+        specs = compile_page_specs(self.ranges)
+        ranges = [str(spec) for spec in specs] if specs is not None else None
+        return [len(self.filenames()), ranges, int(self.front_cover), int(self.back_cover)]
+
+
+# An input of the commands that read a virtual document: a source for all its pages or FilenamePages.
+PagesInput = Union[PDFSource, FilenamePages]
+
+
+def page_plan(inputs: Sequence[PagesInput]) -> PagePlan:
+    """Return the plan of the inputs read one after another as one document."""
+    plan = PagePlan()
+    for r in inputs:
+        if isinstance(r, FilenamePages):
+            for f in r.filenames():
+                plan.add(f, r.ranges)
+        else:
+            plan.add(r)
+
+    return plan
+
+
+def input_sources(inputs: Sequence[PagesInput]) -> List[PDFSource]:
+    return [f for r in inputs for f in (r.filenames() if isinstance(r, FilenamePages) else [r])]
+
+
+def resolve_pages(
+    inputs: Sequence[PagesInput], pool: ReaderPool, count_pages: Optional[Callable[[Any], int]] = None
+) -> List[Tuple[Any, int]]:
+    """Return (document, page index) of each page of the virtual document of the inputs, without merging them.
+
+    The documents are opened once from the pool and only their page counts are read, with count_pages(document)
+    if given. BLANK_PAGE is an inserted blank page, which has the size of the first page of its document like in
+    MergePDFCmd.
+    """
+    count = count_pages or pool.backend.page_count
+
+    def page_count(source: PDFSource) -> int:
+        return count(pool.open(source))
+
+    return [(pool.open(source), index) for source, index in page_plan(inputs).resolve(page_count)]
+
 
 class MergePDFCmd(BasePDFCmd):
-    def __init__(self, output_filename: str, filename_pages_list: List[FilenamePages]):
+    def __init__(
+        self,
+        output_filename: str,
+        filename_pages_list: List[FilenamePages],
+        reader_pool: Optional[ReaderPool] = None,
+        streaming: bool = False,
+        backend: Optional[str] = None,
+        dedup: bool = False,
+    ):
         super().__init__(output_filename)
 
         self.filename_pages_list = filename_pages_list
+        # A pool shared with other commands, so that their common inputs are parsed once.
+        # It must open the documents with the same backend.
+        self.reader_pool = reader_pool
+        # Write each page to the output file as it is added, keeping the memory flat for very large merges.
+        # Streaming always uses PyPDF2.
+        self.streaming = streaming
+        # PDF engine name, or None for the default backend.
+        self.backend = backend
+        # Store identical fonts, images and content streams of the inputs once. Not applied in streaming.
+        self.dedup = dedup
 
     def _execute(self) -> None:
         logger.info(f"Combining pdf files to {self.output_file}.")
 
-        writer = PdfWriter()
-
-        def insert_page_range(writer: PdfWriter, insert_at: int, filename: str, ranges: Union[None, List[Tuple[int, int]]]):
-            with open_pdfreader(filename) as pdf:
-                num_pages = len(pdf.pages)
-                if insert_at == -1:
-                    insert_at = len(writer.pages)
-                if ranges is None:
-                    for i in range(num_pages):
-                        writer.insert_page(pdf.pages[i], insert_at)
-                        insert_at += 1
-                elif isinstance(ranges, list):
-                    for rng in ranges:
-                        mx = rng[1]
-                        if mx <= 0:
-                            mx = num_pages + mx
-                        for i in range(rng[0], mx):
-                            writer.insert_page(pdf.pages[i], insert_at)
-                            insert_at += 1
-
-            return insert_at
-
-        insert_at = 0
-        for r in self.filename_pages_list:
-            if isinstance(r.filename, list):
-                for f in r.filename:
-                    insert_at = insert_page_range(writer, insert_at, f, r.ranges)
-            else:
-                insert_at = insert_page_range(writer, insert_at, r.filename, r.ranges)
+        if self.streaming:
+            from command.stream_pdf_writer import StreamingPdfWriter
+
+            with StreamingPdfWriter(self.save_output()) as stream_writer:
+
+                def insert_stream_pages(pdf: Any, page_numbers: List[int]):
+                    for i in page_numbers:
+                        stream_writer.add_page(pdf.pages[i])
+
+                self.append_pages(insert_stream_pages, stream_writer.add_blank_page, ReaderPool(stream_files=True))
+            return
+
+        # the PDF libraries are imported on first use, so that the CLI starts fast.
+        from pdf_backend import get_backend
+
+        backend = get_backend(self.backend)
+        doc = backend.new_document()
+
+        def insert_pages(pdf: Any, page_numbers: List[int]):
+            backend.insert_pages(doc, pdf, page_numbers)
+
+        def insert_blank_page(width: float, height: float):
+            backend.insert_blank_page(doc, width, height)
+
+        self.append_pages(insert_pages, insert_blank_page, ReaderPool(backend=backend))
+        if self.dedup:
+            doc = backend.deduplicate(doc)
 
         # write result
-        if len(writer.pages):
-            writer.write(self.output_file)
+        if backend.page_count(doc):
+            self.publish(doc)
+
+    def page_plan(self) -> PagePlan:
+        return page_plan(self.filename_pages_list)
+
+    def append_pages(
+        self,
+        insert_pages: Callable[[Any, List[int]], None],
+        insert_blank_page: Callable[[float, float], None],
+        default_pool: ReaderPool,
+    ) -> None:
+        # Each distinct input is opened once even if it appears several times in the list.
+        with ExitStack() as stack:
+            pool = self.reader_pool if self.reader_pool is not None else stack.enter_context(default_pool)
+            backend = pool.backend
+
+            def page_count(source: PDFSource) -> int:
+                return backend.page_count(pool.open(source))
+
+            plan = self.page_plan()
+            # check all the ranges before writing anything.
+            plan.validate(page_count)
+
+            for source, indices in plan.iter_runs(page_count):
+                pdf = pool.open(source)
+                run: List[int] = []
+                for index in indices:
+                    if index != BLANK_PAGE:
+                        run.append(index)
+                        continue
+                    if run:
+                        insert_pages(pdf, run)
+                        run = []
+                    # a blank page has the size of the first page of the file.
+                    left, bottom, right, top = backend.page_box(pdf, 0)
+                    insert_blank_page(right - left, top - bottom)
+                if run:
+                    insert_pages(pdf, run)
+
+    def cache_params(self) -> Optional[object]:
+        from pdf_backend import get_backend
+
+        # the backends and the streaming writer write different files.
+        return {
+            "pages": [r.cache_params() for r in self.filename_pages_list],
+            "dedup": self.dedup,
+            "streaming": self.streaming,
+            "backend": get_backend(self.backend).name,
+        }
+
+    def input_filenames(self) -> List[PDFSource]:
+        return input_sources(self.filename_pages_list)
 
 
 def _construct_argparse():
     parser = argparse.ArgumentParser()
-    parser.add_argument("-o", "--output", required=True, help="Output filename.")
-    parser.add_argument("input_files", nargs="+", help="list of input files with optional page range. i.e. <filename>:1-3")
+    parser.add_argument("-o", "--output", help="Output filename.")
+    parser.add_argument(
+        "input_files",
+        nargs="*",
+        help="list of input files with optional 0-based page ranges. i.e. <filename>:1-3,5:,::-1,blank*2,0*3",
+    )
+    parser.add_argument("--manifest", help="JSON or TOML file with the list of merge jobs to run in one process.")
+    parser.add_argument("--streaming", action="store_true", help="Write pages as they are added with flat memory use.")
+    parser.add_argument("--dedup", action="store_true", help="Store identical objects in the output once.")
+    parser.add_argument("--backend", default=None, help="PDF backend: pypdf2 or pymupdf.")
 
     return parser
 
 
-def parse_page_range(str_ranges: str) -> List[Tuple[int, int]]:
-    ranges = []
-    for str_range in str_ranges.split(","):
-        numbers = str_range.split("-")
-        mn = mx = int(numbers[0])
-        if len(numbers) > 1:
-            mx = int(numbers[1])
-        else:
-            mx = mn + 1
+def parse_page_range(str_ranges: str) -> List[PageSpec]:
+    return parse_page_specs(str_ranges)
+
+
+def parse_input_file(filename: str) -> FilenamePages:
+    """Split <filename>:<ranges> into FilenamePages. Only the base name is split, so a drive letter is kept."""
+    d, fn = os.path.split(filename)
+    fn_ranges = fn.split(":", maxsplit=1)
+    filename_pages = FilenamePages(os.path.join(d, fn_ranges[0]), None)
+    if len(fn_ranges) > 1:
+        filename_pages.ranges = parse_page_range(fn_ranges[1])
+
+    return filename_pages
+
+
+def load_manifest(filename: str) -> List[dict]:
+    """Load the merge jobs. i.e. {"jobs": [{"output": "a.pdf", "inputs": ["b.pdf:0-4", "c.pdf"], "dedup": false}]}"""
+    if filename.lower().endswith(".toml"):
+        try:
+            import tomllib  # type: ignore
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib  # type: ignore
+
+        with open(filename, "rb") as f:
+            manifest = tomllib.load(f)
+    else:
+        with open(filename, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    jobs = manifest.get("jobs", [])
+    for job in jobs:
+        if "output" not in job or not job.get("inputs"):
+            raise ValueError(f"A job in {filename} needs 'output' and 'inputs'.")
+
+    return jobs
+
 
-        ranges.append((mn, mx))
+def run_manifest(jobs: List[dict], streaming: bool = False, dedup: bool = False, backend: Optional[str] = None) -> None:
+    """Run the merge jobs in order, sharing the parsed inputs between the jobs."""
+    from pdf_backend import get_backend
 
-    return ranges
+    with ReaderPool(backend=get_backend(backend)) as pool:
+        for job in jobs:
+            filename_pages_list = [parse_input_file(filename) for filename in job["inputs"]]
+            cmd = MergePDFCmd(
+                job["output"],
+                filename_pages_list,
+                reader_pool=None if job.get("streaming", streaming) else pool,
+                streaming=job.get("streaming", streaming),
+                backend=backend,
+                dedup=job.get("dedup", dedup),
+            )
+            cmd.execute()
+            # a later job may read the output of this job.
+            pool.discard(job["output"])
 
 
 if __name__ == "__main__":
     parser = _construct_argparse()
     args = parser.parse_args()
-    if args.output:
-        filename_pages_list = []
-        for filename in args.input_files:
-            d, fn = os.path.split(filename)
-            filename_pages = FilenamePages(filename, None)
-            fn_ranges = fn.split(":", maxsplit=1)
-            fn = fn_ranges[0]
-            if len(fn_ranges) > 1:
-                ranges = parse_page_range(fn_ranges[1])
-                filename_pages.ranges = ranges
-            filename_pages_list.append(filename_pages)
-
-        cmd = MergePDFCmd(args.output, filename_pages_list)
+    if args.manifest:
+        run_manifest(load_manifest(args.manifest), args.streaming, args.dedup, args.backend)
+    elif args.output and args.input_files:
+        filename_pages_list = [parse_input_file(filename) for filename in args.input_files]
+        cmd = MergePDFCmd(args.output, filename_pages_list, streaming=args.streaming, backend=args.backend, dedup=args.dedup)
         cmd.execute()
+    else:
+        parser.error("Either --manifest or --output with input files is required.")
@@ -0,0 +1,472 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 47111
+
+# Seconds a job may take from its arrival to its result when the request has no timeout.
+DEFAULT_TIMEOUT = 600.0
+
+
+class OfficeWorkerError(RuntimeError):
+    """The office worker refused or failed a job, or can't be reached."""
+
+
+def job_outputs(job: Dict[str, Any]) -> List[str]:
+    """Return the files written by an export job: the output of a document or the output of each report."""
+    if "reports" in job:
+        return [report["output_filename"] for report in job["reports"]]
+    return [job["output"]]
+
+
+class OfficeApp:
+    """An Office application kept open by the worker between the jobs.
+
+    The application is created and called on one thread of the worker only, as COM objects must be.
+    """
+
+    name = ""
+
+    def export(self, job: Dict[str, Any]) -> List[str]:
+        """Export the document of the job to its outputs and return them."""
+        raise NotImplementedError
+
+    def quit(self) -> None:
+        pass
+
+
+class WordOfficeApp(OfficeApp):
+    """Word with the exported documents kept open until they are modified."""
+
+    name = "word"
+
+    def __init__(self) -> None:
+        from thirdparty.word_win32 import App
+
+        # the worker quits Word to restart it after a failed job, so it doesn't attach to the Word of the user.
+        self.app = App(False, dedicated=True)
+        # pathname -> (modified time, Document)
+        self.documents: Dict[str, Tuple[float, Any]] = {}
+
+    def _document(self, pathname: str) -> Any:
+        from thirdparty.word_win32 import Document
+
+        pathname = os.path.abspath(pathname)
+        mtime = os.path.getmtime(pathname)
+        opened = self.documents.pop(pathname, None)
+        if opened is not None:
+            if opened[0] == mtime:
+                self.documents[pathname] = opened
+                return opened[1]
+            opened[1].close()
+
+        # App.open() reuses any open document of the same file name, and Word opens one document per file name,
+        # so a document of the same name in another folder is closed and the file is opened by its full path.
+        name = os.path.normcase(os.path.basename(pathname))
+        for other in [p for p in self.documents if os.path.normcase(os.path.basename(p)) == name]:
+            self.documents.pop(other)[1].close()
+        self.app.word.DisplayAlerts = False
+        try:
+            doc = Document(self.app, self.app.word.Documents.Open(pathname))
+        finally:
+            self.app.word.DisplayAlerts = True
+
+        self.documents[pathname] = (mtime, doc)
+        return doc
+
+    def export(self, job: Dict[str, Any]) -> List[str]:
+        self._document(job["source"]).print_as(job["output"])
+        return job_outputs(job)
+
+    def quit(self) -> None:
+        for _mtime, doc in self.documents.values():
+            doc.close()
+        self.documents.clear()
+        self.app.quit(force=True)
+
+
+class AccessOfficeApp(OfficeApp):
+    """Access with the database of the last job kept open."""
+
+    name = "access"
+
+    def __init__(self) -> None:
+        from thirdparty.access_win32 import App
+
+        self.app = App(False)
+
+    def export(self, job: Dict[str, Any]) -> List[str]:
+        from command.access_pdf_cmd import PrintConfig, print_reports
+
+        # the database is opened only when it is not the current one.
+        self.app.open(job["source"])
+        return print_reports(self.app, [PrintConfig(**report) for report in job["reports"]])
+
+    def quit(self) -> None:
+        self.app.quit()
+
+
+class FakeOfficeApp(OfficeApp):
+    """An in-process stand-in for an Office application, to run the worker without Office.
+
+    It takes startup seconds to start and delay seconds per job, and writes a blank page PDF to each output.
+    Like COM, it fails when called from another thread than the one that created it.
+    """
+
+    def __init__(self, name: str = "fake", startup: float = 0.0, delay: float = 0.0) -> None:
+        time.sleep(startup)
+        self.name = name
+        self.delay = delay
+        self.thread_id = threading.get_ident()
+        # the sources opened once and kept open
+        self.opened: Set[str] = set()
+        self.jobs = 0
+
+    def export(self, job: Dict[str, Any]) -> List[str]:
+        from PyPDF2 import PdfWriter
+
+        if threading.get_ident() != self.thread_id:
+            raise RuntimeError(f"{self.name} is called from another thread than the one that created it.")
+        if not os.path.isfile(job["source"]):
+            raise FileNotFoundError(f"No such file: '{job['source']}'.")
+
+        self.opened.add(job["source"])
+        time.sleep(self.delay)
+        outputs = job_outputs(job)
+        for output in outputs:
+            writer = PdfWriter()
+            writer.add_blank_page(612, 792)
+            writer.write(output)
+        self.jobs += 1
+        return outputs
+
+
+class _Job:
+    def __init__(self, request: Dict[str, Any], deadline: float) -> None:
+        self.request = request
+        # time.monotonic() after which the result is not waited for.
+        self.deadline = deadline
+        self.done = threading.Event()
+        self.outputs: List[str] = []
+        self.error = ""
+
+    def expired(self) -> bool:
+        return time.monotonic() > self.deadline
+
+    def finish(self, outputs: Optional[List[str]] = None, error: str = "") -> None:
+        self.outputs = outputs if outputs is not None else []
+        self.error = error
+        self.done.set()
+
+
+class _AppThread:
+    """The thread that owns one Office application and runs its jobs one at a time, in the order they came."""
+
+    def __init__(self, name: str, factory: Callable[[], OfficeApp], max_pending: int) -> None:
+        self.name = name
+        self.factory = factory
+        self.app: Optional[OfficeApp] = None
+        self.jobs: "queue.Queue[Optional[_Job]]" = queue.Queue(max_pending)
+        self.done_jobs = 0
+        self.thread = threading.Thread(target=self._run, name=f"office-{name}", daemon=True)
+
+    def submit(self, job: _Job) -> None:
+        """Queue the job. Raise queue.Full when max_pending jobs are already waiting."""
+        self.jobs.put_nowait(job)
+
+    def stop(self) -> None:
+        # the jobs queued before are run first.
+        self.jobs.put(None)
+
+    def _run(self) -> None:
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            if job.expired():
+                job.finish(error="The deadline passed before the job started.")
+                continue
+
+            start = time.monotonic()
+            try:
+                if self.app is None:
+                    logger.info(f"Starting {self.name}.")
+                    self.app = self.factory()
+                job.finish(self.app.export(job.request))
+            except Exception as e:
+                logger.exception(f"{self.name} job failed.")
+                job.finish(error=f"{type(e).__name__}: {e}")
+                # the application may be left in a dialog or a broken state, so the next job starts a new one.
+                self._quit_app()
+            else:
+                if job.expired():
+                    logger.warning(f"{self.name} took {time.monotonic() - start:.1f}s, past the deadline. Restarting it.")
+                    self._quit_app()
+            self.done_jobs += 1
+
+        self._quit_app()
+
+    def _quit_app(self) -> None:
+        if self.app is None:
+            return
+        app, self.app = self.app, None
+        try:
+            app.quit()
+        except Exception:
+            logger.exception(f"Failed to quit {self.name}.")
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Read one JSON request per line and write one JSON response per line."""
+
+    server: "_Server"
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("The request is not an object.")
+            except ValueError as e:
+                response: Dict[str, Any] = {"ok": False, "error": f"Invalid request: {e}"}
+            else:
+                response = self.server.worker.handle(request)
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], worker: "OfficeWorker") -> None:
+        self.worker = worker
+        super().__init__(address, _RequestHandler)
+
+
+class OfficeWorker:
+    """A long-lived process that keeps the Office applications and their documents open between export jobs.
+
+    Each application has its own thread that creates it on the first job and runs its jobs one at a time. Jobs
+    for different applications run side by side. apps maps the application names of the jobs to the factories
+    of the applications. Up to max_pending jobs wait for each application, and more are refused as busy.
+
+    The protocol is one JSON object per line over a TCP connection to host:port, answered by one JSON object per
+    line with "ok" and the "id" of the request:
+        {"action": "export", "app": "word", "source": docx, "output": pdf, "timeout": seconds}
+        {"action": "export", "app": "access", "source": mdb, "reports": [PrintConfig arguments], "timeout": seconds}
+            -> {"ok": true, "outputs": [...], "seconds": ...} or {"ok": false, "error": "..."}
+        {"action": "ping"} -> {"ok": true, "apps": {name: {"running", "pending", "done"}}}
+        {"action": "shutdown"} -> {"ok": true}, after the queued jobs are run.
+    A job not finished by its timeout is answered with an error. A running COM call can't be interrupted, so its
+    application is restarted when it returns.
+    """
+
+    def __init__(
+        self,
+        apps: Dict[str, Callable[[], OfficeApp]],
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        max_pending: int = 8,
+        default_timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.threads = {name: _AppThread(name, factory, max_pending) for name, factory in apps.items()}
+        self.default_timeout = default_timeout
+        self.server = _Server((host, port), self)
+        self._serving: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """The host and the port the worker listens to, i.e. the port picked by the system for port 0."""
+        host, port = self.server.server_address[:2]
+        return str(host), int(port)
+
+    def start(self) -> "OfficeWorker":
+        """Start the application threads and serve the requests on a thread."""
+        for app_thread in self.threads.values():
+            app_thread.thread.start()
+        self._serving = threading.Thread(target=self.server.serve_forever, name="office-worker", daemon=True)
+        self._serving.start()
+        logger.info(f"Office worker listening on {self.address[0]}:{self.address[1]} for {', '.join(self.threads)}.")
+        return self
+
+    def wait(self) -> None:
+        """Wait until the worker is closed, i.e. by a shutdown request."""
+        # a wait without timeout can't be interrupted by Ctrl+C on Windows.
+        while not self._closed.wait(1):
+            pass
+
+    def close(self) -> None:
+        """Stop serving, run the queued jobs and quit the applications."""
+        if self._closed.is_set():
+            return
+        if self._serving is not None:
+            self.server.shutdown()
+        self.server.server_close()
+        for app_thread in self.threads.values():
+            if app_thread.thread.is_alive():
+                app_thread.stop()
+                app_thread.thread.join()
+        self._closed.set()
+        logger.info("Office worker closed.")
+
+    def __enter__(self) -> "OfficeWorker":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the request and return the response."""
+        action = request.get("action", "export")
+        if action == "ping":
+            response: Dict[str, Any] = {"ok": True, "apps": self.status()}
+        elif action == "shutdown":
+            # close() waits for the request handlers, so it's called from another thread.
+            threading.Thread(target=self.close, name="office-worker-close").start()
+            response = {"ok": True}
+        elif action == "export":
+            response = self._export(request)
+        else:
+            response = {"ok": False, "error": f"Unknown action '{action}'."}
+
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {"running": app_thread.app is not None, "pending": app_thread.jobs.qsize(), "done": app_thread.done_jobs}
+            for name, app_thread in self.threads.items()
+        }
+
+    def _export(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        app_thread = self.threads.get(request.get("app", ""))
+        if app_thread is None:
+            return {"ok": False, "error": f"Unknown app '{request.get('app')}'. Choose one of {', '.join(self.threads)}."}
+        if not request.get("source") or not ("output" in request or "reports" in request):
+            return {"ok": False, "error": "An export needs 'source' and 'output' or 'reports'."}
+
+        start = time.monotonic()
+        job = _Job(request, start + float(request.get("timeout") or self.default_timeout))
+        try:
+            app_thread.submit(job)
+        except queue.Full:
+            return {"ok": False, "error": f"{app_thread.name} is busy with {app_thread.jobs.qsize()} pending jobs."}
+
+        if not job.done.wait(max(0.0, job.deadline - time.monotonic())):
+            return {"ok": False, "error": f"The job did not finish in {job.deadline - start:.1f}s."}
+        if job.error:
+            return {"ok": False, "error": job.error}
+        return {"ok": True, "outputs": job.outputs, "seconds": time.monotonic() - start}
+
+
+class OfficeWorkerClient:
+    """Send the export jobs of the commands to a running office worker."""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float = DEFAULT_TIMEOUT) -> None:
+        self.host = host
+        self.port = port
+        # seconds a job may take, sent with each job.
+        self.timeout = timeout
+
+    def request(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send the request and return the response. Raise OfficeWorkerError if it's not ok."""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            # the worker answers at the deadline at the latest, so the socket waits a little longer.
+            with socket.create_connection((self.host, self.port), timeout=timeout + 10) as sock:
+                sock.sendall(json.dumps(request).encode() + b"\n")
+                with sock.makefile("rb") as f:
+                    line = f.readline()
+        except OSError as e:
+            raise OfficeWorkerError(f"Can't reach the office worker at {self.host}:{self.port}: {e}") from e
+
+        if not line:
+            raise OfficeWorkerError(f"The office worker at {self.host}:{self.port} closed the connection.")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise OfficeWorkerError(response.get("error", "Unknown error."))
+        return response
+
+    def is_running(self) -> bool:
+        try:
+            self.ping()
+        except OfficeWorkerError:
+            return False
+        return True
+
+    def ping(self) -> Dict[str, Any]:
+        return self.request({"action": "ping"}, timeout=5)
+
+    def shutdown(self) -> None:
+        self.request({"action": "shutdown"}, timeout=5)
+
+    def export(self, app: str, source: str, timeout: Optional[float] = None, **params: Any) -> List[str]:
+        """Export the source with the application and return the output files."""
+        timeout = self.timeout if timeout is None else timeout
+        # the worker may run in another directory.
+        request = {"action": "export", "app": app, "source": os.path.abspath(source), "timeout": timeout, **params}
+        return self.request(request, timeout)["outputs"]
+
+    def export_word(self, docx_filename: str, output_file: str, timeout: Optional[float] = None) -> List[str]:
+        return self.export("word", docx_filename, timeout, output=os.path.abspath(output_file))
+
+    def export_access(self, mdb_filename: str, printout_configs: List[Any], timeout: Optional[float] = None) -> List[str]:
+        """Print the reports of the PrintConfigs from the database."""
+        reports = [
+            {"report": c.report, "query": c.query, "order_by": c.order_by, "output_filename": os.path.abspath(c.output_filename)}
+            for c in printout_configs
+        ]
+        return self.export("access", mdb_filename, timeout, reports=reports)
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """Parse "host:port", "port" or "host" to the host and the port."""
+    host, _sep, port = address.rpartition(":") if ":" in address else ("", "", address)
+    if not port.isdigit():
+        host, port = address, str(DEFAULT_PORT)
+    return host or DEFAULT_HOST, int(port)
+
+
+def _construct_argparse() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the office worker that keeps Word and Access open for the export jobs.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Increase output verbosity")
+    parser.add_argument("--address", default=f"{DEFAULT_HOST}:{DEFAULT_PORT}", help="host:port to listen to.")
+    parser.add_argument("--max-pending", type=int, default=8, help="Maximum number of jobs waiting for each application.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds a job may take when its request has no timeout.")
+    parser.add_argument("--fake", action="store_true", help="Use in-process fake applications instead of Office.")
+    return parser
+
+
+if __name__ == "__main__":
+    from init_log import init_log
+
+    args = _construct_argparse().parse_args()
+    init_log(args.verbose)
+
+    apps: Dict[str, Callable[[], OfficeApp]]
+    if args.fake:
+        apps = {"word": lambda: FakeOfficeApp("word"), "access": lambda: FakeOfficeApp("access")}
+    else:
+        apps = {"word": WordOfficeApp, "access": AccessOfficeApp}
+
+    host, port = parse_address(args.address)
+    worker = OfficeWorker(apps, host, port, args.max_pending, args.timeout).start()
+    try:
+        worker.wait()
+    except KeyboardInterrupt:
+        worker.close()
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Dict, List, Tuple
+
+from pdf_reader_pool import default_reader_pool, replacing_file
+
+
+logger = logging.getLogger(__name__)
+
+
+_file_digests: Dict[str, Tuple[int, int, str]] = {}
+_file_digests_lock = threading.Lock()
+
+
+def file_digest(filename: str) -> str:
+    """Return sha256 of the file content. The digest is remembered while the file size and mtime do not change."""
+    st = os.stat(filename)
+    key = os.path.abspath(filename)
+    with _file_digests_lock:
+        cached = _file_digests.get(key)
+    if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    with _file_digests_lock:
+        _file_digests[key] = (st.st_size, st.st_mtime_ns, digest)
+
+    return digest
+
+
+def fingerprint(name: str, params: object, input_files: List[str]) -> str:
+    """Return a key from the command name, its parameters and the content of the input files."""
+    h = hashlib.sha256()
+    h.update(name.encode())
+    h.update(json.dumps(params, sort_keys=True, default=repr).encode())
+    for filename in input_files:
+        h.update(file_digest(filename).encode())
+
+    return h.hexdigest()
+
+
+class OutputCache:
+    """On-disk cache of command outputs keyed by fingerprint.
+
+    Each entry is a directory holding the output files in order.
+    The entries used least recently are evicted when the total size exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1 << 30) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, key: str, output_files: List[str]) -> bool:
+        """Copy the cached outputs to output_files and return True if the key is in the cache."""
+        entry_dir = self._entry_dir(key)
+        cached_files = [os.path.join(entry_dir, f"{i}.pdf") for i in range(len(output_files))]
+        with self._lock:
+            if not all(os.path.isfile(fn) for fn in cached_files):
+                self.misses += 1
+                return False
+
+            for cached_file, output_file in zip(cached_files, output_files):
+                # the output may be mapped by a reader of the pool, so it is replaced instead of written in place.
+                default_reader_pool().discard(output_file)
+                with replacing_file(output_file) as tmp_filename:
+                    shutil.copyfile(cached_file, tmp_filename)
+            # mark the entry as recently used
+            os.utime(entry_dir)
+            self.hits += 1
+
+        logger.info(f"Restored {', '.join(output_files)} from cache.")
+        return True
+
+    def store(self, key: str, output_files: List[str]) -> None:
+        """Store the output_files under the key and evict old entries if the cache is too big."""
+        if not all(os.path.isfile(fn) for fn in output_files):
+            return
+
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir + ".tmp"
+        with self._lock:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            for i, output_file in enumerate(output_files):
+                shutil.copyfile(output_file, os.path.join(tmp_dir, f"{i}.pdf"))
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(name)
+            if not os.path.isdir(entry_dir) or name.endswith(".tmp"):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, fn)) for fn in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            total += size
+
+        entries.sort()
+        for _mtime, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            logger.debug(f"Evicting cache entry {entry_dir}.")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                shutil.rmtree(self._entry_dir(name), ignore_errors=True)
+            self.hits = 0
+            self.misses = 0
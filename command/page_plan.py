@@ -0,0 +1,175 @@
+import re
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+
+# A page index that stands for an inserted blank page.
+BLANK_PAGE = -1
+
+_SINGLE = re.compile(r"^(-?\d+)$")
+_LEGACY = re.compile(r"^(\d+)-(-?\d+)$")
+_SLICE = re.compile(r"^(-?\d+)?:(-?\d+)?(?::(-?\d+))?$")
+_REPEAT = re.compile(r"^(.*)\*(\d+)$")
+
+
+class PageSpec:
+    """One item of a page range. All the page numbers are 0-based.
+
+    The text form of the items, separated by commas:
+      N          page N, negative N counts from the end (-1 is the last page)
+      A-B        pages A to B-1, B <= 0 counts from the end (0 is up to the last page)
+      A:B:S      python slice, every part is optional (i.e. 5:, :10, ::2, ::-1 for reversed)
+      blank      a blank page
+      item*K     the item repeated K times
+    """
+
+    def __init__(
+        self,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        step: Optional[int] = None,
+        repeat: int = 1,
+        single: bool = False,
+        legacy: bool = False,
+        blank: bool = False,
+    ) -> None:
+        if step == 0:
+            raise ValueError("Page range step can't be zero.")
+        if repeat < 1:
+            raise ValueError("Page range repeat must be positive.")
+
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.repeat = repeat
+        self.single = single
+        self.legacy = legacy
+        self.blank = blank
+
+    @classmethod
+    def from_tuple(cls, rng: Tuple[int, int]) -> "PageSpec":
+        """Convert (start, end) used by FilenamePages, where end <= 0 counts from the end."""
+        return cls(rng[0], rng[1], legacy=True)
+
+    @classmethod
+    def parse(cls, text: str) -> "PageSpec":
+        text = text.strip()
+        repeat = 1
+        m = _REPEAT.match(text)
+        if m:
+            text, repeat = m.group(1).strip(), int(m.group(2))
+
+        if text in ("b", "blank"):
+            return cls(repeat=repeat, blank=True)
+        m = _SINGLE.match(text)
+        if m:
+            return cls(int(m.group(1)), repeat=repeat, single=True)
+        m = _LEGACY.match(text)
+        if m:
+            return cls(int(m.group(1)), int(m.group(2)), repeat=repeat, legacy=True)
+        m = _SLICE.match(text)
+        if m:
+            start, stop, step = (int(g) if g is not None else None for g in m.groups())
+            return cls(start, stop, step, repeat=repeat)
+
+        raise ValueError(f"Invalid page range '{text}'.")
+
+    def indices(self, num_pages: int) -> List[int]:
+        """Return the page indices for a document of num_pages pages. Raise ValueError if out of range."""
+        if self.blank:
+            indices = [BLANK_PAGE]
+        elif self.single:
+            assert self.start is not None
+            index = self.start + num_pages if self.start < 0 else self.start
+            if not 0 <= index < num_pages:
+                raise ValueError(f"Page {self.start} is out of range of {num_pages} pages.")
+            indices = [index]
+        elif self.legacy:
+            assert self.start is not None and self.stop is not None
+            stop = self.stop + num_pages if self.stop <= 0 else self.stop
+            if not (0 <= self.start <= stop <= num_pages):
+                raise ValueError(f"Page range {self.start}-{self.stop} is out of range of {num_pages} pages.")
+            indices = list(range(self.start, stop))
+        else:
+            for bound in (self.start, self.stop):
+                if bound is not None and not -num_pages <= bound <= num_pages:
+                    raise ValueError(f"Page range {self} is out of range of {num_pages} pages.")
+            indices = list(range(num_pages))[self.start : self.stop : self.step]
+
+        return indices * self.repeat
+
+    def __str__(self) -> str:
+        if self.blank:
+            text = "blank"
+        elif self.single:
+            text = str(self.start)
+        elif self.legacy:
+            text = f"{self.start}-{self.stop}"
+        else:
+            text = f"{'' if self.start is None else self.start}:{'' if self.stop is None else self.stop}"
+            if self.step is not None:
+                text += f":{self.step}"
+        return text if self.repeat == 1 else f"{text}*{self.repeat}"
+
+    def __repr__(self) -> str:
+        return f"PageSpec('{self}')"
+
+
+PageRanges = Union[None, str, Sequence[Union[Tuple[int, int], PageSpec]]]
+
+
+def parse_page_specs(str_ranges: str) -> List[PageSpec]:
+    return [PageSpec.parse(item) for item in str_ranges.split(",") if item.strip()]
+
+
+def compile_page_specs(ranges: PageRanges) -> Optional[List[PageSpec]]:
+    """Convert the ranges of FilenamePages to PageSpecs. None means all the pages."""
+    if ranges is None:
+        return None
+    if isinstance(ranges, str):
+        return parse_page_specs(ranges)
+
+    return [r if isinstance(r, PageSpec) else PageSpec.from_tuple(r) for r in ranges]
+
+
+class PagePlan:
+    """An ordered list of (source, page ranges) resolved to page indices only when the page counts are known.
+
+    Nothing is read while the plan is built. resolve() asks page_count for each source and validates the ranges
+    without loading the page contents.
+    """
+
+    def __init__(self) -> None:
+        self.entries: List[Tuple[Any, Optional[List[PageSpec]]]] = []
+
+    def add(self, source: Any, ranges: PageRanges = None) -> "PagePlan":
+        self.entries.append((source, compile_page_specs(ranges)))
+        return self
+
+    def sources(self) -> List[Any]:
+        return [source for source, _specs in self.entries]
+
+    def iter_runs(self, page_count: Callable[[Any], int]) -> Iterator[Tuple[Any, List[int]]]:
+        """Yield (source, page indices) for each entry. BLANK_PAGE in indices is an inserted blank page."""
+        for source, specs in self.entries:
+            num_pages = page_count(source)
+            if specs is None:
+                yield source, list(range(num_pages))
+                continue
+            indices: List[int] = []
+            for spec in specs:
+                try:
+                    indices += spec.indices(num_pages)
+                except ValueError as e:
+                    raise ValueError(f"{source}: {e}") from e
+            if num_pages == 0 and BLANK_PAGE in indices:
+                # a blank page has the size of the first page of the file.
+                raise ValueError(f"{source}: A blank page needs a page size but the file has no pages.")
+            yield source, indices
+
+    def resolve(self, page_count: Callable[[Any], int]) -> List[Tuple[Any, int]]:
+        """Return the list of (source, page index) of the output pages."""
+        return [(source, index) for source, indices in self.iter_runs(page_count) for index in indices]
+
+    def validate(self, page_count: Callable[[Any], int]) -> int:
+        """Raise ValueError if a range is out of the page count and return the number of output pages."""
+        return sum(len(indices) for _source, indices in self.iter_runs(page_count))
@@ -0,0 +1,150 @@
+from contextlib import contextmanager
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, List
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None  # type: ignore
+
+
+logger = logging.getLogger(__name__)
+
+
+def _max_rss() -> int:
+    """Return the peak resident set size of the process in bytes, or 0 if it is unknown."""
+    if resource is None:
+        return 0
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _file_size(filename: Any) -> int:
+    if isinstance(filename, str) and os.path.isfile(filename):
+        return os.path.getsize(filename)
+    return 0
+
+
+class CommandProfile:
+    """Measurements of a single command execution."""
+
+    def __init__(self, name: str, start: float, thread_id: int) -> None:
+        self.name = name
+        self.start = start
+        self.thread_id = thread_id
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        # tracemalloc peak and delta are recorded only when tracemalloc is tracing.
+        self.memory_peak = 0
+        self.memory_delta = 0
+        self.max_rss = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.pages = 0
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class ProfileCollector:
+    """Collects CommandProfile of the commands and dumps them as a Chrome trace or a summary table."""
+
+    def __init__(self) -> None:
+        self.profiles: List[CommandProfile] = []
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, profile: CommandProfile) -> None:
+        with self._lock:
+            self.profiles.append(profile)
+
+    def chrome_trace(self) -> dict:
+        """Return the profiles in Chrome trace_event format, viewable in chrome://tracing or Perfetto."""
+        pid = os.getpid()
+        events = []
+        for p in self.profiles:
+            args = p.to_dict()
+            for key in ("name", "start", "thread_id"):
+                del args[key]
+            events.append(
+                {
+                    "name": p.name,
+                    "cat": "command",
+                    "ph": "X",
+                    "ts": (p.start - self.origin) * 1e6,
+                    "dur": p.wall_time * 1e6,
+                    "pid": pid,
+                    "tid": p.thread_id,
+                    "args": args,
+                }
+            )
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, filename: str) -> None:
+        with open(filename, "w") as f:
+            json.dump(self.chrome_trace(), f, indent=1)
+
+    def summary(self) -> str:
+        MB = 1024 * 1024
+        header = (
+            f"{'Command':<24} {'Wall(s)':>9} {'CPU(s)':>9} {'Peak(MB)':>9} {'RSS(MB)':>9} "
+            f"{'Read(MB)':>9} {'Write(MB)':>9} {'Pages':>6} {'Pages/s':>9}"
+        )
+        lines = [header, "-" * len(header)]
+        for p in self.profiles:
+            pages_per_sec = p.pages / p.wall_time if p.wall_time > 0 else 0.0
+            lines.append(
+                f"{p.name:<24} {p.wall_time:>9.3f} {p.cpu_time:>9.3f} {p.memory_peak / MB:>9.1f} {p.max_rss / MB:>9.1f} "
+                f"{p.bytes_read / MB:>9.2f} {p.bytes_written / MB:>9.2f} {p.pages:>6} {pages_per_sec:>9.1f}"
+            )
+        total_wall = sum(p.wall_time for p in self.profiles)
+        total_cpu = sum(p.cpu_time for p in self.profiles)
+        lines.append("-" * len(header))
+        lines.append(f"{'Total':<24} {total_wall:>9.3f} {total_cpu:>9.3f}")
+
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile_command(cmd: Any, collector: ProfileCollector):
+    """Measure the execution of the cmd and add the profile to the collector."""
+    from pdf_info import get_num_pages
+
+    profile = CommandProfile(type(cmd).__name__, time.perf_counter(), threading.get_ident())
+    profile.bytes_read = sum(_file_size(fn) for fn in cmd.input_filenames())
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # the peak is process wide, so it includes the commands running at the same time.
+        tracemalloc.reset_peak()
+        mem_start = tracemalloc.get_traced_memory()[0]
+    cpu_start = time.thread_time()
+
+    try:
+        yield profile
+    finally:
+        profile.cpu_time = time.thread_time() - cpu_start
+        profile.wall_time = time.perf_counter() - profile.start
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            profile.memory_delta = current - mem_start
+            profile.memory_peak = peak - mem_start
+        profile.max_rss = _max_rss()
+
+        output_files = cmd.output_filenames()
+        profile.bytes_written = sum(_file_size(fn) for fn in output_files)
+        try:
+            if cmd.output_document is not None:
+                profile.pages = get_num_pages(cmd)
+            else:
+                profile.pages = sum(get_num_pages(fn) for fn in output_files if _file_size(fn))
+        except Exception as e:
+            logger.debug(f"Failed to count pages of {profile.name}: {e}")
+
+        collector.add(profile)
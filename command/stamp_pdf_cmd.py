@@ -0,0 +1,101 @@
+from io import BytesIO
+import logging
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from command.base_pdf_cmd import BasePDFCmd
+from command.merge_pdf_cmd import FilenamePages, PagesInput, input_sources, page_plan, resolve_pages
+from command.page_plan import BLANK_PAGE
+from command.text_layout import contents_key, layout_text, page_contents_params, write_text
+from pdf_info import PDFSource, ReaderPool, get_num_pages
+
+
+logger = logging.getLogger(__name__)
+
+
+# The fonts of the stamp are renamed, so that they do not replace the fonts of the pages, i.e. /F1 of reportlab.
+STAMP_FONT_PREFIX = "/Stamp"
+
+_FONT_NAME = re.compile(rb"/(F\d+(?:\+\d+)?)(?=\s+[\d.]+\s+Tf)")
+
+
+class StampPDFCmd(BasePDFCmd):
+    """Draw the text that content_function returns for each page straight onto the pages of the input.
+
+    It does the job of HeaderFooterPDFCmd and MergeContentPDFCmd without the overlay PDF. The text operators are
+    appended to the page contents and all the pages share one set of fonts. Pages without content are not changed.
+    input_file can also be FilenamePages or a list of them, read one after another as one document without
+    merging them first.
+    """
+
+    def __init__(self, output_filename: str, input_file: Union[PagesInput, List[PagesInput]], content_function: Callable):
+        super().__init__(output_filename)
+
+        self.input_file = input_file
+        self.content_function = content_function
+
+    @property
+    def inputs(self) -> List[PagesInput]:
+        return list(self.input_file) if isinstance(self.input_file, list) else [self.input_file]
+
+    def _execute(self) -> None:
+        logger.info(f"Stamping page numbers and titles to pdf file: {self.output_file}.")
+        from PyPDF2 import PageObject, PdfWriter
+
+        from pdf_overlay import OverlayStamper
+
+        writer = PdfWriter()
+        stamper = OverlayStamper(writer._add_object)
+        with ReaderPool() as pool:
+            pages = resolve_pages(self.inputs, pool)
+            operators, fonts = self.text_operators(len(pages))
+            for (reader, index), content in zip(pages, operators):
+                if index == BLANK_PAGE:
+                    # a blank page has the size of the first page of the file, like in MergePDFCmd.
+                    mediabox = reader.pages[0].mediabox
+                    page = PageObject.create_blank_page(width=mediabox.width, height=mediabox.height)
+                else:
+                    page = reader.pages[index]
+                writer.add_page(stamper.stamp_content(page, content, fonts))
+
+        if len(writer.pages):
+            self.publish(writer)
+
+    def text_operators(self, num_pages: int) -> Tuple[List[bytes], Dict[str, object]]:
+        """Return the content stream of the text of each page and the fonts it uses."""
+        from PyPDF2 import PdfReader
+        from reportlab.pdfgen import canvas  # type:ignore
+
+        # reportlab encodes the text and makes the font resources; its own output is thrown away.
+        stream = BytesIO()
+        c = canvas.Canvas(stream)
+        operators = []
+        # The pages with the same contents get the same operators, and OverlayStamper shares their content stream.
+        rendered: Dict[str, bytes] = {}
+        for page_no in range(num_pages):
+            content_list = self.content_function(page_no)
+            key = contents_key(content_list)
+            if key is None:
+                operators.append(b"")
+                continue
+
+            data = rendered.get(key)
+            if data is None:
+                text = c.beginText()
+                write_text(text, [placed for content in content_list for placed in layout_text(content)])
+                data = rendered[key] = _FONT_NAME.sub(STAMP_FONT_PREFIX.encode() + rb"\1", text.getCode().encode("latin-1"))
+            operators.append(data)
+        c.showPage()
+        c.save()
+
+        page = PdfReader(stream, strict=False).pages[0]
+        fonts = page["/Resources"]["/Font"].get_object()
+        return operators, {STAMP_FONT_PREFIX + name[1:]: ref for name, ref in fonts.items()}
+
+    def cache_params(self) -> Optional[object]:
+        contents = page_contents_params(self.content_function, page_plan(self.inputs).validate(get_num_pages))
+        pages = [r.cache_params() if isinstance(r, FilenamePages) else None for r in self.inputs]
+        return {"pages": pages, "contents": contents}
+
+    def input_filenames(self) -> List[PDFSource]:
+        return input_sources(self.inputs)
@@ -0,0 +1,211 @@
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+from PyPDF2 import PageObject
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    FloatObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    NumberObject,
+    StreamObject,
+)
+
+from pdf_reader_pool import default_reader_pool
+
+
+logger = logging.getLogger(__name__)
+
+
+CATALOG_ID = 1
+PAGES_ID = 2
+
+# Drop the parsed objects cached by the source readers every this many pages.
+# Not every page, because objects in object streams would be decompressed again for each page.
+RELEASE_INTERVAL = 64
+
+
+class StreamingPdfWriter:
+    """A PDF writer that serializes each page and the objects it uses to the file as soon as the page is added.
+
+    Only the xref offsets, the page ids and the object id mapping of the sources are kept in memory,
+    so the memory does not grow with the size of the output. The file is written to a temporary file next to
+    the output and moved to the output filename on close(), so the output can be one of the inputs.
+    References to pages that are not added (i.e. link annotations to another page) are written as null.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        fd, self._tmp_filename = tempfile.mkstemp(suffix=".pdf", dir=os.path.dirname(os.path.abspath(filename)))
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+        # object id -> file offset. 0 is the free list head, CATALOG_ID and PAGES_ID are written on close().
+        self._offsets: List[int] = [0, 0, 0]
+        self._kids: List[int] = []
+        # id(source pdf) -> (idnum, generation) -> object id in this file
+        self._id_maps: Dict[int, Dict[Tuple[int, int], int]] = {}
+        # keep the source documents alive while their id() is used as a key
+        self._sources: Dict[int, Any] = {}
+
+    @property
+    def num_pages(self) -> int:
+        return len(self._kids)
+
+    def _alloc(self) -> int:
+        self._offsets.append(0)
+        return len(self._offsets) - 1
+
+    def _write_object(self, obj_id: int, obj: Any) -> None:
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f"{obj_id} 0 obj\n".encode())
+        obj.write_to_stream(self._file, None)
+        self._file.write(b"\nendobj\n")
+
+    def _id_map(self, pdf: Any) -> Dict[Tuple[int, int], int]:
+        id_map = self._id_maps.get(id(pdf))
+        if id_map is None:
+            id_map = self._id_maps[id(pdf)] = {}
+            self._sources[id(pdf)] = pdf
+        return id_map
+
+    def add_object(self, obj: Any) -> IndirectObject:
+        """Write an object made by the caller, i.e. a stream shared by many pages, and return the reference to it."""
+        obj_id = self._alloc()
+        self._write_object(obj_id, obj)
+        return IndirectObject(obj_id, 0, None)  # type: ignore
+
+    def add_page(self, page: PageObject) -> None:
+        """Write the page and all the objects it refers to that are not written yet."""
+        page_id = self._alloc()
+        if page.indirect_reference is not None:
+            self._id_map(page.pdf)[(page.indirect_reference.idnum, page.indirect_reference.generation)] = page_id
+
+        pending: List[Tuple[int, IndirectObject]] = []
+
+        def translate(obj: Any) -> Any:
+            if isinstance(obj, IndirectObject):
+                if obj.pdf is None:
+                    # already in this file, see add_object().
+                    return obj
+                # an overlaid page refers to the objects of more than one source.
+                id_map = self._id_map(obj.pdf)
+                key = (obj.idnum, obj.generation)
+                obj_id = id_map.get(key)
+                if obj_id is None:
+                    obj_id = self._alloc()
+                    id_map[key] = obj_id
+                    pending.append((obj_id, obj))
+                return IndirectObject(obj_id, 0, None)  # type: ignore
+            if isinstance(obj, StreamObject):
+                # streams can't be direct objects; a merged page may hold one.
+                obj_id = self._alloc()
+                self._write_object(obj_id, copy_stream(obj))
+                return IndirectObject(obj_id, 0, None)  # type: ignore
+            if isinstance(obj, DictionaryObject):
+                return DictionaryObject({k: translate(v) for k, v in obj.items()})
+            if isinstance(obj, ArrayObject):
+                return ArrayObject([translate(v) for v in obj])
+            return obj
+
+        def copy_stream(obj: StreamObject) -> StreamObject:
+            new_obj: StreamObject
+            if isinstance(obj, EncodedStreamObject):
+                new_obj = EncodedStreamObject()
+                new_obj._data = obj._data
+            else:
+                new_obj = DecodedStreamObject()
+                new_obj._data = obj.get_data()
+            for k, v in obj.items():
+                if k != "/Length":
+                    new_obj[k] = translate(v)
+            return new_obj
+
+        new_page = DictionaryObject({k: translate(v) for k, v in page.items() if k not in ("/Parent", "/StructParents")})
+        new_page[NameObject("/Parent")] = IndirectObject(PAGES_ID, 0, None)  # type: ignore
+        self._write_object(page_id, new_page)
+        self._kids.append(page_id)
+
+        while pending:
+            obj_id, ref = pending.pop()
+            obj = ref.get_object()
+            if isinstance(obj, DictionaryObject) and obj.get("/Type") in ("/Page", "/Pages"):
+                # do not pull in the pages of the source that are not added.
+                self._write_object(obj_id, NullObject())
+            elif isinstance(obj, StreamObject):
+                self._write_object(obj_id, copy_stream(obj))
+            else:
+                self._write_object(obj_id, translate(obj))
+
+        if len(self._kids) % RELEASE_INTERVAL == 0:
+            self._release_sources()
+
+    def add_blank_page(self, width: float, height: float) -> None:
+        page_id = self._alloc()
+        page = DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Page"),
+                NameObject("/Parent"): IndirectObject(PAGES_ID, 0, None),  # type: ignore
+                NameObject("/MediaBox"): ArrayObject([NumberObject(0), NumberObject(0), FloatObject(width), FloatObject(height)]),
+                NameObject("/Resources"): DictionaryObject(),
+            }
+        )
+        self._write_object(page_id, page)
+        self._kids.append(page_id)
+
+    def _release_sources(self) -> None:
+        for pdf in self._sources.values():
+            resolved_objects = getattr(pdf, "resolved_objects", None)
+            if resolved_objects is not None:
+                resolved_objects.clear()
+
+    def close(self) -> None:
+        """Write the page tree, the catalog, the xref table and move the file to the output filename."""
+        if self._file.closed:
+            return
+
+        kids = ArrayObject([IndirectObject(kid, 0, None) for kid in self._kids])  # type: ignore
+        pages = DictionaryObject(
+            {NameObject("/Type"): NameObject("/Pages"), NameObject("/Kids"): kids, NameObject("/Count"): NumberObject(len(self._kids))}
+        )
+        self._write_object(PAGES_ID, pages)
+        catalog = DictionaryObject(
+            {NameObject("/Type"): NameObject("/Catalog"), NameObject("/Pages"): IndirectObject(PAGES_ID, 0, None)}  # type: ignore
+        )
+        self._write_object(CATALOG_ID, catalog)
+
+        xref_offset = self._file.tell()
+        self._file.write(f"xref\n0 {len(self._offsets)}\n".encode())
+        self._file.write(b"0000000000 65535 f \n")
+        for offset in self._offsets[1:]:
+            if offset:
+                self._file.write(f"{offset:010d} 00000 n \n".encode())
+            else:
+                self._file.write(b"0000000000 00000 f \n")
+        self._file.write(f"trailer\n<< /Size {len(self._offsets)} /Root {CATALOG_ID} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+        self._file.close()
+        self._id_maps.clear()
+        self._sources.clear()
+
+        if self._kids:
+            # the readers of the old file in the pool are closed before it's replaced.
+            default_reader_pool().discard(self.filename)
+            os.replace(self._tmp_filename, self.filename)
+        else:
+            os.remove(self._tmp_filename)
+
+    def __enter__(self) -> "StreamingPdfWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_filename)
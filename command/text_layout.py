@@ -0,0 +1,206 @@
+from array import array
+from enum import IntEnum
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from command.font_registry import ensure_font
+from command.font_select import font_runs
+
+
+ELLIPSIS = "…"
+MIN_FONT_SIZE = 4.0
+LEADING_RATIO = 1.2
+
+_LATIN1 = 256
+
+
+class TextAlign(IntEnum):
+    LEFT = 0
+    CENTER = 1
+    RIGHT = 2
+
+
+class Overflow(IntEnum):
+    """What to do with a text wider than content.max_width."""
+
+    TRUNCATE = 0  # cut it and add ELLIPSIS
+    WRAP = 1  # break it into lines going down from content.y
+    FIT = 2  # make the font smaller, down to MIN_FONT_SIZE
+
+
+class PlacedText(NamedTuple):
+    text: str
+    font: str
+    size: float
+    x: float
+    y: float
+
+
+class FontMetrics:
+    """Glyph widths of a font at size 1. The widths of the other sizes are scaled, as reportlab does."""
+
+    def __init__(self, font_name: str) -> None:
+        from reportlab.pdfbase import pdfmetrics  # type:ignore
+
+        self.font_name = ensure_font(font_name)
+        self._string_width = pdfmetrics.stringWidth
+        # Latin-1 in an array, the rest in a dict. -1 is not measured yet.
+        self.latin1 = array("d", [-1.0]) * _LATIN1
+        self.others: Dict[str, float] = {}
+
+    def _measure(self, ch: str) -> float:
+        return self._string_width(ch, self.font_name, 1)
+
+    def text_width(self, text: str) -> float:
+        latin1 = self.latin1
+        others = self.others
+        width = 0.0
+        for ch in text:
+            code = ord(ch)
+            if code < _LATIN1:
+                w = latin1[code]
+                if w < 0:
+                    w = latin1[code] = self._measure(ch)
+            else:
+                w = others.get(ch, -1.0)
+                if w < 0:
+                    w = others[ch] = self._measure(ch)
+            width += w
+        return width
+
+
+@lru_cache(maxsize=None)
+def font_metrics(font_name: str) -> FontMetrics:
+    return FontMetrics(font_name)
+
+
+@lru_cache(maxsize=8192)
+def _unit_width(text: str, font: str) -> float:
+    return sum(font_metrics(run_font).text_width(segment) for segment, run_font in font_runs(text, font))
+
+
+def measure(text: str, font: str, size: float) -> float:
+    """Return the width of the text. font can be AUTO_FONT."""
+    return _unit_width(text, font) * size
+
+
+def measure_batch(texts: Sequence[str], font: str, size: float) -> List[float]:
+    return [_unit_width(text, font) * size for text in texts]
+
+
+def _fit_length(text: str, fits: Callable[[str], bool]) -> int:
+    """Return the longest k for which fits(text[:k]) is True. fits must be True for shorter prefixes."""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(text[:mid]):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def truncate(text: str, font: str, size: float, max_width: float, ellipsis: str = ELLIPSIS) -> str:
+    """Return the text, cut and ended with the ellipsis if it is wider than max_width."""
+    if measure(text, font, size) <= max_width:
+        return text
+    length = _fit_length(text, lambda prefix: measure(prefix.rstrip() + ellipsis, font, size) <= max_width)
+    return text[:length].rstrip() + ellipsis
+
+
+def wrap(text: str, font: str, size: float, max_width: float) -> List[str]:
+    """Break the text into lines no wider than max_width at spaces, or inside a word longer than a line."""
+    lines = []
+    line = ""
+    for word in text.split():
+        candidate = f"{line} {word}" if line else word
+        if measure(candidate, font, size) <= max_width:
+            line = candidate
+            continue
+        if line:
+            lines.append(line)
+        while len(word) > 1 and measure(word, font, size) > max_width:
+            cut = max(1, _fit_length(word, lambda prefix: measure(prefix, font, size) <= max_width))
+            lines.append(word[:cut])
+            word = word[cut:]
+        line = word
+    if line or not lines:
+        lines.append(line)
+
+    return lines
+
+
+def fit_size(text: str, font: str, size: float, max_width: float, min_size: float = MIN_FONT_SIZE) -> float:
+    """Return the font size, made smaller if needed, for the text to be no wider than max_width."""
+    width = _unit_width(text, font)
+    if width * size <= max_width:
+        return size
+    return max(min_size, max_width / width)
+
+
+def layout_text(content: Any) -> List[PlacedText]:
+    """Place the text of a header/footer content. Each placed text has one font and starts at its own x, y.
+
+    content has name, font_size, x, y, align and text, and optionally max_width, overflow and leading.
+    """
+    font, size = content.name, content.font_size
+    lines = [content.text]
+    max_width = getattr(content, "max_width", None)
+    if max_width:
+        overflow = getattr(content, "overflow", Overflow.TRUNCATE)
+        if overflow == Overflow.WRAP:
+            lines = wrap(content.text, font, size, max_width)
+        elif overflow == Overflow.FIT:
+            size = fit_size(content.text, font, size, max_width)
+        else:
+            lines = [truncate(content.text, font, size, max_width)]
+    leading = getattr(content, "leading", None) or size * LEADING_RATIO
+
+    placed = []
+    for i, line in enumerate(lines):
+        runs = font_runs(line, font)
+        widths = [measure(segment, run_font, size) for segment, run_font in runs]
+        x = content.x
+        if content.align == TextAlign.CENTER:
+            x -= sum(widths) / 2
+        elif content.align == TextAlign.RIGHT:
+            x -= sum(widths)
+        y = content.y - i * leading
+        for (segment, run_font), width in zip(runs, widths):
+            placed.append(PlacedText(segment, run_font, size, x, y))
+            x += width
+
+    return placed
+
+
+def write_text(text_object: Any, placed: Iterable[PlacedText]) -> None:
+    """Add the placed texts to a reportlab text object, setting the font only when it changes."""
+    current = None
+    for p in placed:
+        if (p.font, p.size) != current:
+            text_object.setFont(p.font, p.size)
+            current = (p.font, p.size)
+        text_object.setTextOrigin(p.x, p.y)
+        text_object.textOut(p.text)
+
+
+def content_params(content: Any) -> dict:
+    """Return the attributes of a content, a Namespace or a TextItem of hf_template."""
+    return content._asdict() if hasattr(content, "_asdict") else dict(vars(content))
+
+
+def page_contents_params(content_function: Callable[[int], Any], num_pages: int) -> List[List[dict]]:
+    """Return the attributes of the contents of each page, for the cache parameters of the commands that draw the
+    contents of a content_function. The callback can't be hashed, but the content it returns for each page can."""
+    contents = []
+    for page_no in range(num_pages):
+        content_list = content_function(page_no)
+        contents.append([content_params(content) for content in content_list] if isinstance(content_list, list) else [])
+    return contents
+
+
+def contents_key(content_list: Any) -> Optional[str]:
+    """Return a key of the contents of a page, or None if the page has no content. Pages with the same key look the same."""
+    if not isinstance(content_list, list) or len(content_list) == 0:
+        return None
+    return repr([sorted(content_params(content).items()) for content in content_list])
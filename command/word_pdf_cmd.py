@@ -1,7 +1,8 @@
 import logging
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 from command.base_pdf_cmd import BasePDFCmd
+from command.office_worker import OfficeWorkerClient
 from thirdparty.word_win32 import (
     App as WordApp,
     LineSpacingRule,
@@ -18,21 +19,33 @@ logger = logging.getLogger(__name__)
 
 
 class WordPDFCmd(BasePDFCmd):
-    def __init__(self, docx_filename: str, output_file: str):
+    def __init__(self, docx_filename: str, output_file: str, worker: Optional[OfficeWorkerClient] = None):
         super().__init__([output_file])
 
         self.docx_filename = docx_filename
         self.output_file = output_file
+        # Export on the Word kept open by the office worker instead of starting Word.
+        self.worker = worker
 
     def _execute(self):
         logger.info(f"Generating master booklet file '{self.output_file}'.")
 
+        if self.worker is not None:
+            self.worker.export_word(self.docx_filename, self.output_file)
+            return
+
         app = WordApp(False)
         with app.open(self.docx_filename) as doc:
             doc.print_as(self.output_file)
 
         app.quit()
 
+    def cache_params(self) -> Optional[object]:
+        return {}
+
+    def input_filenames(self) -> List[str]:
+        return [self.docx_filename]
+
 
 class CreateNumberingPDFCmd(BasePDFCmd):
     def __init__(self, output_file: str, num_pages: int, page_size: Tuple[int, int], group_title: dict):
@@ -91,3 +104,6 @@ class CreateNumberingPDFCmd(BasePDFCmd):
             doc.print_as(self.output_file)
 
         app.quit()
+
+    def cache_params(self) -> Optional[object]:
+        return {"num_pages": self.num_pages, "page_size": self.page_size, "group_title": self.group_title}
@@ -1,20 +1,21 @@
-from argparse import Namespace
 import argparse
 import logging
 import os
 from pathlib import Path
 import sys
-from typing import List
+import tracemalloc
+from typing import Dict, List, Optional
 
-from langdetect import detect  # type: ignore
-
-from command.base_pdf_cmd import InchesToPoint  # type: ignore
-from command.access_pdf_cmd import AccessPDFCmd, PrintConfig
-from command.hf_pdf_cmd import KOREAN_FONT, HeaderFooterPDFCmd, TextAlign
+from command.base_pdf_cmd import BasePDFCmd, InchesToPoint  # type: ignore
+from command.command_executor import CommandExecutor
+from command.font_select import AUTO_FONT
+from command.hf_template import HeaderFooterTemplate
 from command.impose_pdf_cmd import ImposePDFCmd
-from command.merge_content_pdf_cmd import MergeContentPDFCmd
-from command.merge_pdf_cmd import MergePDFCmd, FilenamePages
-from command.word_pdf_cmd import WordPDFCmd
+from command.merge_pdf_cmd import FilenamePages, page_plan
+from command.office_worker import OfficeWorkerClient, parse_address
+from command.output_cache import OutputCache
+from command.profiler import ProfileCollector
+from command.stamp_pdf_cmd import StampPDFCmd
 
 from init_log import init_log
 from pdf_info import get_num_pages
@@ -23,7 +24,45 @@ from pdf_info import get_num_pages
 logger = logging.getLogger(__name__)
 
 
-def create_emc_booklet(mdb_filename: str, docx_filename: str):
+def booklet_template(group_title: Dict[int, str], address_book_start_page_no: int) -> HeaderFooterTemplate:
+    """The page numbers and the group titles of the booklet pages, group_title by 0-based page_no."""
+    statement_x = InchesToPoint(5.5)
+    statement_y = InchesToPoint(8.5)
+
+    # page numbers except on the cover and the inserted pages, and the group titles on the first page of each group.
+    return HeaderFooterTemplate(
+        {
+            "sections": group_title,
+            "elements": [
+                {
+                    "text": "{page}",
+                    "pages": f"2:{address_book_start_page_no},{address_book_start_page_no + 3}:",
+                    "font": "Helvetica",
+                    "size": 10,
+                    "x": statement_x // 2,
+                    "y": 16,
+                    "align": "center",
+                },
+                {
+                    # Helvetica or KOREAN_FONT by the script of each part of the title.
+                    "text": "{section}",
+                    "when": "section",
+                    "font": AUTO_FONT,
+                    "size": 14,
+                    "y": statement_y - 24,
+                    "odd": {"x": 32, "align": "left"},
+                    "even": {"x": statement_x - 32, "align": "right"},
+                },
+            ],
+        }
+    )
+
+
+def create_emc_booklet(mdb_filename: str, docx_filename: str, worker: Optional[OfficeWorkerClient] = None):
+    # Office automation loads COM, so it is imported only when the booklet is built, not for --help.
+    from command.access_pdf_cmd import AccessPDFCmd, PrintConfig
+    from command.word_pdf_cmd import WordPDFCmd
+
     output_dir = Path(os.path.dirname(__file__))
 
     # Generate family/personal contact pdfs from address.mdb
@@ -36,15 +75,16 @@ def create_emc_booklet(mdb_filename: str, docx_filename: str):
         PrintConfig(output_filename=str(output_dir / "3EM-Single.pdf"), report="Single", query="EM-SINGLE", order_by="P.NAME"),
         PrintConfig(output_filename=str(output_dir / "4YG-Single.pdf"), report="Single", query="YG", order_by="P.NAME"),
     ]
-    accesscmd = AccessPDFCmd(mdb_filename, printout_configs)
-    accesscmd.execute()
-    contact_pdf_files = accesscmd.output_files
+    accesscmd = AccessPDFCmd(mdb_filename, printout_configs, worker)
 
     # Generate pdf from master word file.
     master_basename = str(Path(docx_filename).stem)
     master_pdf_file = str(output_dir / (master_basename + ".pdf"))
-    wordcmd = WordPDFCmd(docx_filename, master_pdf_file)
-    wordcmd.execute()
+    wordcmd = WordPDFCmd(docx_filename, master_pdf_file, worker)
+
+    # Access and Word exports do not depend on each other, so run them side by side.
+    CommandExecutor([accesscmd, wordcmd]).execute()
+    contact_pdf_files = list(accesscmd.output_files)
 
     # Combine master and contact pdfs.
     address_book_start_page_no = 29
@@ -55,8 +95,8 @@ def create_emc_booklet(mdb_filename: str, docx_filename: str):
     pdf_ranges.append(FilenamePages(master_pdf_file, [(0, address_book_start_page_no)]))
     pdf_ranges.append(FilenamePages(contact_pdf_files, None))
     pdf_ranges.append(FilenamePages(master_pdf_file, [(address_book_start_page_no + 2, 0)]))
-    mergecmd = MergePDFCmd(master_pdf_file, pdf_ranges)
-    mergecmd.execute()
+    # the ranges are stamped and imposed as one document, without writing the merged pdf.
+    num_pages = page_plan(pdf_ranges).validate(get_num_pages)
 
     # Create numbering and header/footer pdf files.
     pastor_page_no = address_book_start_page_no + 3
@@ -65,47 +105,21 @@ def create_emc_booklet(mdb_filename: str, docx_filename: str):
     yg_page_no = em_page_no + get_num_pages(contact_pdf_files[5]) + get_num_pages(contact_pdf_files[6])
     group_title = {pastor_page_no: "사역자", km_page_no: "KM", em_page_no: "English Ministry", yg_page_no: "Youth Group"}
 
-    statement_x = InchesToPoint(5.5)
-    statement_y = InchesToPoint(8.5)
+    template = booklet_template(group_title, address_book_start_page_no)
+    content_function = template.compile(num_pages)
 
-    # callback function that returns content for each page_no in pdf.
-    def content_function(page_no: int):
-        nonlocal group_title
-        content_list = []
-        # insert and blank page
-        if page_no >= 2 and not (address_book_start_page_no <= page_no and page_no <= address_book_start_page_no + 2):
-            content = Namespace(name="Helvetica", font_size=10, x=statement_x // 2, y=16, align=TextAlign.CENTER, text=str(page_no + 1))
-            content_list.append(content)
-        if page_no in group_title:
-            text = group_title[page_no]
-            if page_no % 2 == 1:
-                x = 32
-                align = TextAlign.LEFT
-            else:
-                x = statement_x - 32
-                align = TextAlign.RIGHT
-            content = Namespace(name="Helvetica", font_size=14, x=x, y=statement_y - 24, align=align, text=text)
-            if detect(text) == "ko":
-                content.name = KOREAN_FONT
-            content_list.append(content)
-
-        return content_list
-
-    num_pages = get_num_pages(master_pdf_file)
-    page_size = (statement_x, statement_y)
-    hfcmd = HeaderFooterPDFCmd("", num_pages, page_size, content_function)
-    hfcmd.execute()
     # numberingcmd = CreateNumberingPDFCmd("", num_pages, page_size, group_title)
     # numberingcmd.execute()
 
-    # merge content of master and header/foot pdf files.
-    contentcmd = MergeContentPDFCmd("", [master_pdf_file, hfcmd.output_file])
+    # draw page numbers and titles on the master pages.
+    contentcmd = StampPDFCmd("", pdf_ranges, content_function)
+    contentcmd.in_memory = True
     contentcmd.execute()
 
     # Do saddle stitch imposition for final pdf.
     output_imposed_filename = str(output_dir / (master_basename + "-imp.pdf"))
     folds = "h"  # fold horz one time to produce 1x2 saddle
-    imposecmd = ImposePDFCmd(output_imposed_filename, [contentcmd.output_file], folds)
+    imposecmd = ImposePDFCmd(output_imposed_filename, [contentcmd], folds)
     imposecmd.execute()
 
 
@@ -120,6 +134,14 @@ def construct_parser() -> argparse.ArgumentParser:
 
     docx_filename = str(Path.home() / r"Dropbox/EMC/일반행정/2024/2024 신앙생활요람.docx")
     parser.add_argument("--booklet-filename", default=docx_filename, help="A filename to load bank transactions.")
+    parser.add_argument("--cache-dir", default="", help="A directory to cache the outputs of unchanged steps.")
+    parser.add_argument(
+        "--profile", nargs="?", const="emc_booklet-trace.json", default="", help="Profile the commands and write a Chrome trace file."
+    )
+    parser.add_argument("--cache-size", type=int, default=1024, help="Maximum size of the cache in MB.")
+    parser.add_argument(
+        "--office-worker", default="", help="host:port of a running office worker (python -m command.office_worker) to export with."
+    )
 
     return parser
 
@@ -134,4 +156,25 @@ if __name__ == "__main__":
     args = parser.parse_args()
     init_log(args.verbose)
 
-    create_emc_booklet(args.mdb_filename, args.booklet_filename)
+    if args.profile:
+        tracemalloc.start()
+        BasePDFCmd.collector = ProfileCollector()
+
+    if args.cache_dir:
+        BasePDFCmd.cache = OutputCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    worker = None
+    if args.office_worker:
+        worker = OfficeWorkerClient(*parse_address(args.office_worker))
+        if not worker.is_running():
+            logger.warning(f"No office worker at {args.office_worker}, starting Word and Access for this run.")
+            worker = None
+
+    create_emc_booklet(args.mdb_filename, args.booklet_filename, worker)
+
+    if BasePDFCmd.cache is not None:
+        logger.info(f"Cache hits: {BasePDFCmd.cache.hits}, misses: {BasePDFCmd.cache.misses}.")
+
+    if BasePDFCmd.collector is not None:
+        BasePDFCmd.collector.write_chrome_trace(args.profile)
+        logger.info(f"Profile of the commands (trace: {args.profile}):\n{BasePDFCmd.collector.summary()}")
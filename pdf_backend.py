@@ -0,0 +1,322 @@
+from contextlib import contextmanager
+from io import BytesIO
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import NameObject
+
+from pdf_info import PDFSource, is_command
+from pdf_overlay import OverlayStamper, is_blank_content
+from pdf_reader_pool import replacing_file
+
+
+logger = logging.getLogger(__name__)
+
+
+class PDFBackend:
+    """Base class of the PDF engines that do the page operations of the commands.
+
+    A document is whatever the engine uses: PdfReader/PdfWriter for PyPDF2 and fitz.Document for PyMuPDF.
+    """
+
+    name = ""
+
+    def open(self, source: PDFSource) -> Any:
+        """Open a filename, an in-memory document or the output of a command."""
+        raise NotImplementedError
+
+    def close(self, doc: Any) -> None:
+        pass
+
+    def new_document(self) -> Any:
+        raise NotImplementedError
+
+    def page_count(self, doc: Any) -> int:
+        raise NotImplementedError
+
+    def page_box(self, doc: Any, page_no: int) -> Tuple[float, float, float, float]:
+        """Return the media box (left, bottom, right, top) of the page in PDF coordinates."""
+        raise NotImplementedError
+
+    def page_text(self, doc: Any, page_no: int) -> str:
+        raise NotImplementedError
+
+    def insert_pages(self, dst: Any, src: Any, page_numbers: Iterable[int]) -> None:
+        """Append the pages of src to dst."""
+        raise NotImplementedError
+
+    def insert_blank_page(self, dst: Any, width: float, height: float) -> None:
+        raise NotImplementedError
+
+    def insert_overlaid_page(self, dst: Any, base: Any, page_no: int, overlays: List[Any]) -> None:
+        """Append the page_no page of base to dst with the same page of each overlay drawn on top of it."""
+        raise NotImplementedError
+
+    def deduplicate(self, doc: Any) -> Any:
+        """Return the new document made by doc with the identical objects stored once."""
+        raise NotImplementedError
+
+    def copy_navigation(self, dst: Any, src: Any) -> None:
+        """Copy the outline and the page labels of src to dst that has the pages of src in the same order."""
+        raise NotImplementedError
+
+    def save(self, doc: Any, filename: str) -> None:
+        raise NotImplementedError
+
+    def to_bytes(self, doc: Any) -> bytes:
+        raise NotImplementedError
+
+    def owns(self, doc: Any) -> bool:
+        """Return True if the doc is a document of this engine."""
+        raise NotImplementedError
+
+    @contextmanager
+    def open_document(self, source: PDFSource):
+        """Open the source and close it on exit unless it is an in-memory document of the caller."""
+        if is_command(source) and source.output_document is not None:
+            source = source.output_document
+        doc = self.open(source)
+        try:
+            yield doc
+        finally:
+            if doc is not source:
+                self.close(doc)
+
+    def _source_of(self, source: PDFSource) -> Any:
+        """Return the filename or the document of the source, converted to this engine if needed."""
+        if is_command(source):
+            source = source.output_document if source.output_document is not None else source.output_file
+        if isinstance(source, str) or self.owns(source):
+            return source
+
+        return BytesIO(document_to_bytes(source))
+
+
+class PyPDF2Backend(PDFBackend):
+    name = "pypdf2"
+
+    def __init__(self) -> None:
+        # the stamper of each output document shares its small content streams between the pages.
+        self._stampers: "WeakKeyDictionary[PdfWriter, OverlayStamper]" = WeakKeyDictionary()
+
+    def open(self, source: PDFSource) -> Any:
+        source = self._source_of(source)
+        if isinstance(source, (PdfReader, PdfWriter)):
+            return source
+        return PdfReader(source, strict=False)
+
+    def new_document(self) -> Any:
+        return PdfWriter()
+
+    def page_count(self, doc: Any) -> int:
+        return len(doc.pages)
+
+    def page_box(self, doc: Any, page_no: int) -> Tuple[float, float, float, float]:
+        box = doc.pages[page_no].mediabox
+        return (float(box.left), float(box.bottom), float(box.right), float(box.top))
+
+    def page_text(self, doc: Any, page_no: int) -> str:
+        return doc.pages[page_no].extract_text()
+
+    def insert_pages(self, dst: Any, src: Any, page_numbers: Iterable[int]) -> None:
+        pages = src.pages
+        for i in page_numbers:
+            dst.add_page(pages[i])
+
+    def insert_blank_page(self, dst: Any, width: float, height: float) -> None:
+        dst.add_blank_page(width, height)
+
+    def insert_overlaid_page(self, dst: Any, base: Any, page_no: int, overlays: List[Any]) -> None:
+        # Each overlay page is drawn as a Form XObject, so the content streams are not rewritten
+        # and the fonts of the overlays are copied to dst once. Empty overlay pages are skipped.
+        stamper = self._stampers.get(dst)
+        if stamper is None:
+            stamper = self._stampers[dst] = OverlayStamper(dst._add_object)
+        dst.add_page(stamper.stamp(base.pages[page_no], [overlay.pages[page_no] for overlay in overlays]))
+
+    def deduplicate(self, doc: Any) -> Any:
+        from command.dedup_pdf_cmd import deduplicate_objects
+
+        deduplicate_objects(doc)
+        return doc
+
+    def copy_navigation(self, dst: Any, src: Any) -> None:
+        if not isinstance(src, PdfReader):
+            return
+        root = src.trailer["/Root"]
+        if "/PageLabels" in root:
+            dst._root_object[NameObject("/PageLabels")] = root["/PageLabels"].get_object().clone(dst)
+
+        num_pages = len(dst.pages)
+
+        def add_items(items: List[Any], parent: Any) -> None:
+            item_ref = None
+            for item in items:
+                # a nested list holds the children of the item before it.
+                if isinstance(item, list):
+                    add_items(item, item_ref)
+                    continue
+                page_no = src.get_destination_page_number(item)
+                item_ref = dst.add_outline_item(item.title, page_no if 0 <= page_no < num_pages else None, parent)
+
+        add_items(src.outline, None)
+
+    def save(self, doc: Any, filename: str) -> None:
+        with replacing_file(filename) as tmp_filename:
+            if isinstance(doc, PdfWriter):
+                doc.write(tmp_filename)
+            else:
+                with open(tmp_filename, "wb") as f:
+                    f.write(self.to_bytes(doc))
+
+    def to_bytes(self, doc: Any) -> bytes:
+        if isinstance(doc, PdfWriter):
+            stream = BytesIO()
+            doc.write(stream)
+            return stream.getvalue()
+
+        # PdfReader keeps the whole file in its stream.
+        doc.stream.seek(0)
+        return doc.stream.read()
+
+    def owns(self, doc: Any) -> bool:
+        return isinstance(doc, (PdfReader, PdfWriter))
+
+
+class PyMuPDFBackend(PDFBackend):
+    name = "pymupdf"
+
+    def __init__(self) -> None:
+        import fitz  # type: ignore
+
+        self.fitz = fitz
+
+    def open(self, source: PDFSource) -> Any:
+        source = self._source_of(source)
+        if isinstance(source, self.fitz.Document):
+            return source
+        if isinstance(source, BytesIO):
+            return self.fitz.open("pdf", source.getvalue())
+        return self.fitz.open(source)
+
+    def close(self, doc: Any) -> None:
+        doc.close()
+
+    def new_document(self) -> Any:
+        return self.fitz.open()
+
+    def page_count(self, doc: Any) -> int:
+        return doc.page_count
+
+    def page_box(self, doc: Any, page_no: int) -> Tuple[float, float, float, float]:
+        # fitz flips the y axis, so read the box from the PDF object.
+        box = doc.xref_get_key(doc.page_xref(page_no), "MediaBox")
+        if box[0] == "array":
+            left, bottom, right, top = (float(v) for v in box[1].strip("[]").split())
+            return (left, bottom, right, top)
+        rect = doc[page_no].mediabox
+        return (rect.x0, rect.y0, rect.x1, rect.y1)
+
+    def page_text(self, doc: Any, page_no: int) -> str:
+        return doc[page_no].get_text()
+
+    def insert_pages(self, dst: Any, src: Any, page_numbers: Iterable[int]) -> None:
+        # insert_pdf copies ranges in one call, so group consecutive pages.
+        start = end = -1
+        for i in page_numbers:
+            if i == end + 1 and start != -1:
+                end = i
+                continue
+            if start != -1:
+                dst.insert_pdf(src, from_page=start, to_page=end)
+            start = end = i
+        if start != -1:
+            dst.insert_pdf(src, from_page=start, to_page=end)
+
+    def insert_blank_page(self, dst: Any, width: float, height: float) -> None:
+        dst.new_page(width=width, height=height)
+
+    def insert_overlaid_page(self, dst: Any, base: Any, page_no: int, overlays: List[Any]) -> None:
+        dst.insert_pdf(base, from_page=page_no, to_page=page_no)
+        page = dst[-1]
+        height = page.rect.height
+        for overlay in overlays:
+            if is_blank_content(overlay[page_no].read_contents()):
+                continue
+            # Place the overlay at the bottom-left corner without scaling like PyPDF2 merge_page.
+            rect = overlay[page_no].rect
+            page.show_pdf_page(self.fitz.Rect(0, height - rect.height, rect.width, height), overlay, page_no, overlay=True)
+
+    def deduplicate(self, doc: Any) -> Any:
+        # garbage=4 makes MuPDF merge the identical objects including streams.
+        data = doc.tobytes(garbage=4, deflate=True)
+        doc.close()
+        return self.fitz.open("pdf", data)
+
+    def copy_navigation(self, dst: Any, src: Any) -> None:
+        toc = src.get_toc()
+        if toc:
+            dst.set_toc(toc)
+        labels = src.get_page_labels()
+        if labels:
+            dst.set_page_labels(labels)
+
+    def save(self, doc: Any, filename: str) -> None:
+        with replacing_file(filename) as tmp_filename:
+            doc.save(tmp_filename, garbage=1, deflate=True)
+
+    def to_bytes(self, doc: Any) -> bytes:
+        return doc.tobytes(garbage=1, deflate=True)
+
+    def owns(self, doc: Any) -> bool:
+        return isinstance(doc, self.fitz.Document)
+
+
+BACKENDS = {
+    PyPDF2Backend.name: PyPDF2Backend,
+    PyMuPDFBackend.name: PyMuPDFBackend,
+}
+
+_backends: Dict[str, PDFBackend] = {}
+_default_backend = PyPDF2Backend.name
+
+
+def set_default_backend(name: str) -> None:
+    """Select the backend used by the commands that do not choose one."""
+    global _default_backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{name}'. Choose one of {', '.join(BACKENDS)}.")
+    _default_backend = name
+
+
+def get_backend(name: Optional[str] = None) -> PDFBackend:
+    name = name or _default_backend
+    backend = _backends.get(name)
+    if backend is None:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown PDF backend '{name}'. Choose one of {', '.join(BACKENDS)}.")
+        backend = BACKENDS[name]()
+        _backends[name] = backend
+
+    return backend
+
+
+def document_to_bytes(doc: Any) -> bytes:
+    for name in BACKENDS:
+        backend = get_backend(name)
+        if backend.owns(doc):
+            return backend.to_bytes(doc)
+
+    raise TypeError(f"Unknown PDF document type {type(doc).__name__}.")
+
+
+def save_document(doc: Any, filename: str) -> None:
+    for name in BACKENDS:
+        backend = get_backend(name)
+        if backend.owns(doc):
+            backend.save(doc, filename)
+            return
+
+    raise TypeError(f"Unknown PDF document type {type(doc).__name__}.")
@@ -1,22 +1,381 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import contextmanager
+from functools import lru_cache
+import hashlib
+from io import BytesIO
+import json
 import logging
+import os
+import sys
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Union
 
-from PyPDF2 import PdfReader
+from pdf_reader_pool import default_reader_pool
+
+if TYPE_CHECKING:
+    from PyPDF2 import PdfReader, PdfWriter
 
 
 logger = logging.getLogger(__name__)
 
 
+# A PDF source is a filename, an in-memory document or a command whose output is consumed.
+PDFSource = Union[str, "PdfReader", "PdfWriter", Any]
+
+
+def is_command(source: PDFSource) -> bool:
+    return hasattr(source, "output_document") and hasattr(source, "save_output")
+
+
 @contextmanager
-def open_pdfreader(filename: str):
-    reader = PdfReader(filename, strict=False)
-    yield reader
-    # reader.
+def open_pdfreader(source: PDFSource):
+    """Open the source for reading. In-memory documents are used as they are without parsing."""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    if is_command(source):
+        source = source.output_document if source.output_document is not None else source.output_file
+
+    if isinstance(source, (PdfReader, PdfWriter)):
+        yield source
+        return
+
+    if not isinstance(source, str):
+        # a document of another PDF backend
+        from pdf_backend import document_to_bytes
+
+        yield PdfReader(BytesIO(document_to_bytes(source)), strict=False)
+        return
+
+    # the readers of the files are shared with the other commands of the process.
+    with default_reader_pool().reader(source) as reader:
+        yield reader
+
+
+class ReaderPool:
+    """Opens each source once and shares the reader while the pool is open.
+
+    The PyPDF2 readers of files are leased from default_reader_pool(), so they read from memory-mapped files and
+    are reused by the later commands. stream_files is kept for the callers; the readers never load the whole file.
+    With a backend other than PyPDF2, the documents of that backend are opened instead of PdfReader.
+    """
+
+    def __init__(self, stream_files: bool = False, backend: Any = None) -> None:
+        if backend is None:
+            from pdf_backend import get_backend
+
+            backend = get_backend("pypdf2")
+        self.backend = backend
+        self.stream_files = stream_files
+        self._opened: List[Any] = []
+        self._readers: Dict[str, Any] = {}
+        self._leased: List[Any] = []
+
+    def open(self, source: PDFSource):
+        if is_command(source):
+            if source.output_document is None:
+                source = source.output_file
+            elif self.backend.owns(source.output_document):
+                return source.output_document
+
+        if not isinstance(source, str):
+            return self.backend.open(source)
+
+        key = os.path.normcase(os.path.abspath(source))
+        reader = self._readers.get(key)
+        if reader is None:
+            if self.backend.name != "pypdf2":
+                reader = self.backend.open(source)
+                self._opened.append(reader)
+            else:
+                reader = default_reader_pool().acquire(source)
+                self._leased.append(reader)
+            self._readers[key] = reader
+
+        return reader
 
+    def discard(self, source: PDFSource) -> None:
+        """Forget the reader of the file, i.e. after the file is written."""
+        if isinstance(source, str):
+            reader = self._readers.pop(os.path.normcase(os.path.abspath(source)), None)
+            if reader is not None and reader in self._opened:
+                self._opened.remove(reader)
+                self.backend.close(reader)
+            elif reader is not None and reader in self._leased:
+                self._leased.remove(reader)
+                default_reader_pool().release(reader)
+
+    def close(self) -> None:
+        self._readers.clear()
+        for doc in self._opened:
+            self.backend.close(doc)
+        self._opened.clear()
+        for reader in self._leased:
+            default_reader_pool().release(reader)
+        self._leased.clear()
+
+    def __enter__(self) -> "ReaderPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def source_filename(source: PDFSource) -> str:
+    """Return a filename of the source, writing in-memory output of the command to a file if needed."""
+    if is_command(source):
+        return source.save_output()
+
+    return source
+
+
+@lru_cache(maxsize=1024)
+def _file_num_pages(filename: str, size: int, mtime_ns: int) -> int:
+    """The page count of the file of the size and the modified time. A rewritten file has another key."""
+    from pdf_xref import read_page_count
+
+    num_pages = read_page_count(filename)
+    if num_pages is None:
+        logger.debug(f"Parsing {filename} to count the pages.")
+        with open_pdfreader(filename) as reader:
+            num_pages = len(reader.pages)
+
+    return num_pages
+
+
+def get_num_pages(source: PDFSource) -> int:
+    """Return the number of pages. A file is counted from its trailer and xref without parsing the whole file."""
+    if is_command(source) and source.output_document is None:
+        source = source.output_file
+
+    if isinstance(source, str):
+        stat = os.stat(source)
+        return _file_num_pages(os.path.normcase(os.path.abspath(source)), stat.st_size, stat.st_mtime_ns)
 
-def get_num_pages(filename: str) -> int:
     num_pages = 0
-    with open_pdfreader(filename) as reader:
+    with open_pdfreader(source) as reader:
         num_pages = len(reader.pages)
 
     return num_pages
+
+
+def _roman(number: int) -> str:
+    numerals = [(1000, "m"), (900, "cm"), (500, "d"), (400, "cd"), (100, "c"), (90, "xc")]
+    numerals += [(50, "l"), (40, "xl"), (10, "x"), (9, "ix"), (5, "v"), (4, "iv"), (1, "i")]
+    text = ""
+    for value, numeral in numerals:
+        count, number = divmod(number, value)
+        text += numeral * count
+    return text
+
+
+def _letters(number: int) -> str:
+    # a to z, then aa to zz, ...
+    return chr(ord("a") + (number - 1) % 26) * ((number - 1) // 26 + 1)
+
+
+def _label_ranges(node: Any) -> List[tuple]:
+    """Return (first page index, label dictionary) of the /PageLabels number tree."""
+    node = node.get_object()
+    ranges = []
+    nums = node.get("/Nums")
+    if nums is not None:
+        nums = nums.get_object()
+        ranges += [(int(nums[i]), nums[i + 1].get_object()) for i in range(0, len(nums) - 1, 2)]
+    for kid in node.get("/Kids", []):
+        ranges += _label_ranges(kid)
+    return sorted(ranges, key=lambda r: r[0])
+
+
+def page_labels(reader: "PdfReader") -> Optional[List[str]]:
+    """Return the label of each page, or None if the document has no /PageLabels."""
+    root = reader.trailer["/Root"].get_object()
+    if "/PageLabels" not in root:
+        return None
+
+    num_pages = len(reader.pages)
+    labels = [str(i + 1) for i in range(num_pages)]
+    ranges = _label_ranges(root["/PageLabels"])
+    for n, (first, label) in enumerate(ranges):
+        last = ranges[n + 1][0] if n + 1 < len(ranges) else num_pages
+        style = label.get("/S")
+        prefix = str(label.get("/P", ""))
+        start = int(label.get("/St", 1))
+        for i in range(first, min(last, num_pages)):
+            number = start + i - first
+            if style == "/D":
+                text = str(number)
+            elif style in ("/R", "/r"):
+                text = _roman(number)
+            elif style in ("/A", "/a"):
+                text = _letters(number)
+            else:
+                text = ""
+            labels[i] = prefix + (text.upper() if style in ("/R", "/A") else text)
+
+    return labels
+
+
+def _font_info(font: Any) -> dict:
+    font = font.get_object()
+    descriptor_font = font
+    if font.get("/Subtype") == "/Type0" and font.get("/DescendantFonts"):
+        descriptor_font = font["/DescendantFonts"].get_object()[0].get_object()
+    descriptor = descriptor_font.get("/FontDescriptor")
+    descriptor = descriptor.get_object() if descriptor is not None else {}
+    embedded = any(key in descriptor for key in ("/FontFile", "/FontFile2", "/FontFile3"))
+
+    return {"name": str(font.get("/BaseFont", "")).lstrip("/"), "subtype": str(font.get("/Subtype", "")).lstrip("/"), "embedded": embedded}
+
+
+def _image_info(image: Any) -> dict:
+    filters = image.get("/Filter", [])
+    filters = filters.get_object() if hasattr(filters, "get_object") else filters
+    filters = filters if isinstance(filters, list) else [filters]
+
+    return {
+        "width": int(image.get("/Width", 0)),
+        "height": int(image.get("/Height", 0)),
+        "bits": int(image.get("/BitsPerComponent", 0) or 0),
+        "filter": [str(f).lstrip("/") for f in filters],
+        "bytes": len(image._data),
+    }
+
+
+def _ref_key(obj: Any) -> Any:
+    # the raw values of a dictionary are the indirect references, shared by the pages.
+    return (obj.idnum, obj.generation) if hasattr(obj, "idnum") else id(obj)
+
+
+def _walk_resources(resources: Any, fonts: Dict[Any, dict], images: Dict[Any, dict], seen: set) -> int:
+    """Collect the fonts and the images of the resources and of their forms. Return the number of images."""
+    if resources is None:
+        return 0
+    resources = resources.get_object()
+    font_dict = resources.get("/Font")
+    if font_dict is not None:
+        for font in font_dict.get_object().values():
+            key = _ref_key(font)
+            if key not in fonts:
+                fonts[key] = _font_info(font)
+
+    num_images = 0
+    xobject_dict = resources.get("/XObject")
+    if xobject_dict is None:
+        return 0
+    for xobject_ref in xobject_dict.get_object().values():
+        key = _ref_key(xobject_ref)
+        xobject = xobject_ref.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            num_images += 1
+            if key not in images:
+                images[key] = _image_info(xobject)
+        elif subtype == "/Form" and key not in seen:
+            seen.add(key)
+            num_images += _walk_resources(xobject.get("/Resources"), fonts, images, seen)
+    return num_images
+
+
+def _content_hash(page: Any) -> str:
+    """Return the SHA-1 of the content streams of the page as they are stored, without decoding them."""
+    digest = hashlib.sha1()
+    contents = page.get("/Contents")
+    if contents is not None:
+        contents = contents.get_object()
+        for stream in contents if isinstance(contents, list) else [contents]:
+            digest.update(stream.get_object()._data)
+    return digest.hexdigest()
+
+
+def inspect_pdf(filename: str, page_details: bool = True) -> dict:
+    """Return the page count, the fonts, the images and the page labels of the file, and the boxes and the
+    content hash of each page with page_details. A file that can't be read has an "error" instead."""
+    from PyPDF2 import PdfReader
+
+    info: Dict[str, Any] = {"file": filename}
+    try:
+        info["size"] = os.path.getsize(filename)
+        reader = PdfReader(filename, strict=False)
+        fonts: Dict[Any, dict] = {}
+        images: Dict[Any, dict] = {}
+        pages = []
+        for page in reader.pages:
+            num_images = _walk_resources(page.get("/Resources"), fonts, images, set())
+            if page_details:
+                media_box = [float(v) for v in page.mediabox]
+                crop_box = [float(v) for v in page.cropbox]
+                pages.append({"mediabox": media_box, "cropbox": crop_box, "images": num_images, "hash": _content_hash(page)})
+
+        info["pages"] = len(reader.pages)
+        info["encrypted"] = reader.is_encrypted
+        info["fonts"] = sorted(fonts.values(), key=lambda f: (f["name"], f["subtype"]))
+        info["images"] = list(images.values())
+        labels = page_labels(reader)
+        if page_details:
+            for page_info, label in zip(pages, labels or []):
+                page_info["label"] = label
+            info["page_info"] = pages
+        info["page_labels"] = labels is not None
+    except Exception as e:
+        logger.debug(f"Can't inspect {filename}: {e}")
+        info["error"] = f"{type(e).__name__}: {e}"
+
+    return info
+
+
+def find_pdf_files(paths: Sequence[str]) -> Iterator[str]:
+    """Yield the files and the PDF files in the directories, recursively and sorted."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.lower().endswith(".pdf"):
+                    yield os.path.join(dirpath, filename)
+
+
+def _inspect_pdf_task(args: tuple) -> dict:
+    return inspect_pdf(*args)
+
+
+def inspect_pdfs(paths: Sequence[str], workers: int = 1, page_details: bool = True) -> Iterator[dict]:
+    """Inspect the files in worker processes and yield the results in the order of the files."""
+    tasks = [(filename, page_details) for filename in find_pdf_files(paths)]
+    if workers <= 1 or len(tasks) <= 1:
+        yield from map(_inspect_pdf_task, tasks)
+        return
+
+    with ProcessPoolExecutor(min(workers, len(tasks))) as executor:
+        yield from executor.map(_inspect_pdf_task, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+
+
+def _construct_argparse():
+    parser = argparse.ArgumentParser(description="Inspect PDF files and write one JSON line per file.")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories to scan for *.pdf.")
+    parser.add_argument("-o", "--output", help="Output filename. The standard output by default.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument("--summary", action="store_true", help="Leave out the boxes, labels and hashes of each page.")
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _construct_argparse().parse_args(argv)
+    failed = 0
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for info in inspect_pdfs(args.paths, args.workers, not args.summary):
+            failed += "error" in info
+            out.write(json.dumps(info, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from PyPDF2 import PageObject
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject, NameObject, StreamObject
+
+
+logger = logging.getLogger(__name__)
+
+
+# The operators that put marks on the page. A content stream without them draws nothing.
+_PAINT_OPERATORS = {b"Tj", b"TJ", b"'", b'"', b"Do", b"BI", b"sh", b"f", b"F", b"f*", b"B", b"B*", b"b", b"b*", b"S", b"s"}
+
+_STRINGS = re.compile(rb"\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>|/[^\s/\[\]()<>{}%]*|%[^\r\n]*")
+_OPERATORS = re.compile(rb"[A-Za-z'\"*]+")
+
+OVERLAY_PREFIX = "/Overlay"
+
+
+def is_blank_content(data: bytes) -> bool:
+    """Return True if the content stream has no painting operator, i.e. an empty page of reportlab."""
+    data = _STRINGS.sub(b" ", data)
+    return not any(op in _PAINT_OPERATORS for op in _OPERATORS.findall(data))
+
+
+def _content_streams(page: PageObject) -> List[Any]:
+    """Return the content streams of the page, as references if the page uses references."""
+    contents = page.get("/Contents")
+    if contents is None:
+        return []
+    resolved = contents.get_object()
+    if isinstance(resolved, ArrayObject):
+        return list(resolved)
+
+    return [contents]
+
+
+def _resource(page: PageObject, resource_type: str) -> DictionaryObject:
+    """Return a copy of the resource dictionary of the type, i.e. /Font, of the page."""
+    resources = page.get("/Resources", DictionaryObject()).get_object()
+    return DictionaryObject(resources.get(resource_type, DictionaryObject()).get_object())
+
+
+def page_to_xobject(page: PageObject) -> Optional[StreamObject]:
+    """Wrap the page as a Form XObject, or return None if the page draws nothing."""
+    streams = [s.get_object() for s in _content_streams(page)]
+    data = b"\n".join(s.get_data() for s in streams)
+    if is_blank_content(data):
+        return None
+
+    if len(streams) == 1 and isinstance(streams[0], EncodedStreamObject):
+        # keep the compressed data as it is.
+        xobject: StreamObject = EncodedStreamObject()
+        xobject._data = streams[0]._data
+        for key in ("/Filter", "/DecodeParms"):
+            if key in streams[0]:
+                xobject[NameObject(key)] = streams[0][key]
+    else:
+        xobject = DecodedStreamObject()
+        xobject.set_data(data)
+
+    xobject[NameObject("/Type")] = NameObject("/XObject")
+    xobject[NameObject("/Subtype")] = NameObject("/Form")
+    xobject[NameObject("/BBox")] = ArrayObject(page.mediabox)
+    resources = page.get("/Resources")
+    if resources is not None:
+        # The fonts stay references, so that they are copied to the output once.
+        xobject[NameObject("/Resources")] = resources
+    return xobject
+
+
+class OverlayStamper:
+    """Draws overlay pages, or content streams, on base pages without rewriting the base content streams.
+
+    An overlay page is drawn with one Do operator. The added content streams are shared by the pages with the same
+    content through add_stream, i.e. PdfWriter._add_object. Without it they are kept direct.
+    """
+
+    def __init__(self, add_stream: Optional[Callable[[StreamObject], Any]] = None) -> None:
+        self.add_stream = add_stream
+        self._streams: Dict[bytes, Any] = {}
+
+    def _stream(self, data: bytes) -> Any:
+        stream = self._streams.get(data)
+        if stream is None:
+            stream = DecodedStreamObject()
+            stream.set_data(data)
+            if self.add_stream is not None:
+                stream = self.add_stream(stream)
+            self._streams[data] = stream
+        return stream
+
+    def stamp(self, page: PageObject, overlays: List[PageObject]) -> PageObject:
+        """Return a shallow copy of page with the overlays drawn on top. The page itself is not changed."""
+        xobjects = [xobject for xobject in (page_to_xobject(overlay) for overlay in overlays) if xobject is not None]
+        if not xobjects:
+            return page
+
+        page_xobjects = _resource(page, "/XObject")
+        names: Dict[str, Any] = {}
+        for i, xobject in enumerate(xobjects):
+            name = f"{OVERLAY_PREFIX}{i}"
+            while name in page_xobjects:
+                name += "_"
+            names[name] = xobject
+
+        draw = " ".join(f"q {name} Do Q" for name in names)
+        return self._stamp(page, "/XObject", names, draw.encode())
+
+    def stamp_content(self, page: PageObject, content: bytes, fonts: Dict[str, Any]) -> PageObject:
+        """Return a shallow copy of page with the content stream drawn on top, adding fonts to the page fonts.
+
+        The font names in content must not be used by the page.
+        """
+        if not content:
+            return page
+        return self._stamp(page, "/Font", fonts, content)
+
+    def _stamp(self, page: PageObject, resource_type: str, entries: Dict[str, Any], draw: bytes) -> PageObject:
+        stamped = PageObject(page.pdf, page.indirect_reference)
+        stamped.update(page)
+
+        resources = DictionaryObject(page.get("/Resources", DictionaryObject()).get_object())
+        page_entries = _resource(page, resource_type)
+        for name, value in entries.items():
+            page_entries[NameObject(name)] = value
+        resources[NameObject(resource_type)] = page_entries
+        stamped[NameObject("/Resources")] = resources
+
+        # the base content is wrapped in q/Q, so that a graphics state it leaves does not move the stamp.
+        contents = [self._stream(b"q\n"), *_content_streams(page), self._stream(b"\nQ " + draw + b"\n")]
+        stamped[NameObject("/Contents")] = ArrayObject(contents)
+        return stamped
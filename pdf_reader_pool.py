@@ -0,0 +1,219 @@
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from typing import IO, TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from PyPDF2 import PdfReader
+
+
+logger = logging.getLogger(__name__)
+
+
+# The pool keeps the files mapped up to this many bytes in total, closing the least recently used first.
+DEFAULT_MAX_MAPPED_BYTES = 512 * 1024 * 1024
+
+
+class _MappedFile:
+    """A file open for the readers of the pool. Each reader has its own map, so it has its own read position."""
+
+    def __init__(self, filename: str, size: int, mtime_ns: int) -> None:
+        self.filename = filename
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.file: IO = open(filename, "rb")
+        # the readers not leased, and the leased ones by id(reader)
+        self.idle: List[Tuple["PdfReader", mmap.mmap]] = []
+        self.leased: Dict[int, Tuple["PdfReader", mmap.mmap]] = {}
+        # the number of readers being parsed
+        self.opening = 0
+        # no longer in the pool, closed when the last lease is returned.
+        self.retired = False
+
+    @property
+    def in_use(self) -> bool:
+        return bool(self.leased) or self.opening > 0
+
+    def new_reader(self) -> Tuple["PdfReader", mmap.mmap]:
+        from PyPDF2 import PdfReader
+
+        data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return PdfReader(data, strict=False), data  # type: ignore
+        except Exception:
+            data.close()
+            raise
+
+    def close(self) -> None:
+        for _reader, data in self.idle:
+            data.close()
+        self.idle.clear()
+        self.file.close()
+
+
+class MappedReaderPool:
+    """Shares PdfReaders of files between the commands of the process.
+
+    The readers read from memory-mapped files, so the files are not loaded in memory and the pages of a file
+    read by several readers are in memory once. A reader is reused while the size and the modified time of its file
+    stay the same, and is leased to one user at a time, so threads never share the read position of a reader.
+    The least recently used files are closed when the mapped bytes are over max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MAPPED_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[str, _MappedFile]" = OrderedDict()
+        # id(reader) -> the file of the leased reader
+        self._leases: Dict[int, _MappedFile] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(filename: str) -> str:
+        return os.path.normcase(os.path.abspath(filename))
+
+    @property
+    def mapped_bytes(self) -> int:
+        return sum(f.size for f in self._files.values())
+
+    def acquire(self, filename: str) -> "PdfReader":
+        """Lease a reader of the file. Return it with release() when done."""
+        key = self._key(filename)
+        stat = os.stat(key)
+        if stat.st_size == 0:
+            # an empty file can't be mapped, PyPDF2 raises its own error.
+            from PyPDF2 import PdfReader
+
+            return PdfReader(filename, strict=False)
+
+        with self._lock:
+            entry = self._files.get(key)
+            if entry is not None and (entry.size, entry.mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                logger.debug(f"{filename} has changed, reopening.")
+                self._retire(key)
+                entry = None
+            if entry is None:
+                entry = self._files[key] = _MappedFile(key, stat.st_size, stat.st_mtime_ns)
+                self._evict()
+            self._files.move_to_end(key)
+            leased = entry.idle.pop() if entry.idle else None
+            if leased is not None:
+                entry.leased[id(leased[0])] = leased
+                self._leases[id(leased[0])] = entry
+                return leased[0]
+            # the file stays open while the reader is parsed outside the lock.
+            entry.opening += 1
+
+        try:
+            leased = entry.new_reader()
+        except Exception:
+            with self._lock:
+                entry.opening -= 1
+                if entry.retired and not entry.in_use:
+                    entry.close()
+            raise
+        with self._lock:
+            entry.opening -= 1
+            entry.leased[id(leased[0])] = leased
+            self._leases[id(leased[0])] = entry
+        return leased[0]
+
+    def release(self, reader: "PdfReader") -> None:
+        with self._lock:
+            entry = self._leases.pop(id(reader), None)
+            if entry is None:
+                return  # not from the pool, i.e. an empty file
+            leased = entry.leased.pop(id(reader))
+            if entry.retired:
+                leased[1].close()
+                if not entry.in_use:
+                    entry.close()
+            else:
+                entry.idle.append(leased)
+                self._evict()
+
+    @contextmanager
+    def reader(self, filename: str):
+        reader = self.acquire(filename)
+        try:
+            yield reader
+        finally:
+            self.release(reader)
+
+    def _retire(self, key: str) -> None:
+        entry = self._files.pop(key)
+        entry.retired = True
+        if not entry.in_use:
+            entry.close()
+
+    def _evict(self) -> None:
+        total = self.mapped_bytes
+        # the most recently used file is kept, even if it's larger than max_bytes.
+        for key in list(self._files)[:-1]:
+            if total <= self.max_bytes:
+                break
+            entry = self._files[key]
+            if entry.in_use:
+                continue
+            logger.debug(f"Closing {entry.filename} of the reader pool.")
+            total -= entry.size
+            self._retire(key)
+
+    def discard(self, filename: str) -> None:
+        """Close the readers of the file, i.e. before the file is replaced. Leased readers are closed when released."""
+        with self._lock:
+            key = self._key(filename)
+            if key in self._files:
+                self._retire(key)
+
+    def close(self) -> None:
+        with self._lock:
+            for key in list(self._files):
+                self._retire(key)
+
+
+# the mode of a file created by open(filename, "wb")
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+_FILE_MODE = 0o666 & ~_UMASK
+
+_default_pool: Optional[MappedReaderPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_reader_pool() -> MappedReaderPool:
+    """Return the reader pool of the process, closed at exit."""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = MappedReaderPool()
+                atexit.register(_default_pool.close)
+    return _default_pool
+
+
+@contextmanager
+def replacing_file(filename: str):
+    """Yield a temporary filename next to the file to write to, and move it to the file on success.
+
+    The readers of the old file in the pool are closed first. On POSIX a leased reader keeps reading the old file,
+    which a write in place would truncate under its map. On Windows an open file can't be replaced, so the move
+    raises PermissionError while a reader of the file is leased; release the readers before writing the file.
+    """
+    fd, tmp_filename = tempfile.mkstemp(suffix=".pdf", dir=os.path.dirname(os.path.abspath(filename)))
+    os.close(fd)
+    try:
+        yield tmp_filename
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+
+    # mkstemp creates the file readable by the owner only.
+    os.chmod(tmp_filename, _FILE_MODE)
+    if _default_pool is not None:
+        _default_pool.discard(filename)
+    os.replace(tmp_filename, filename)
@@ -0,0 +1,342 @@
+import logging
+import mmap
+import re
+from typing import Dict, List, Optional, Tuple, Union
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+
+# Read the page count from the trailer, the cross-reference sections and the root /Pages object only,
+# without parsing the rest of the file. Anything unexpected returns None, and the caller parses the file.
+
+# startxref is in the last 1024 bytes of a PDF, but some writers add garbage after %%EOF.
+_TAIL_SIZE = 4096
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_XREF_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n?")
+_TRAILER_DICT = re.compile(rb"trailer\s*(<<.*?>>)\s*(?:startxref|xref|$)", re.S)
+_OBJ_HEADER = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\b")
+_REF = rb"\s+(\d+)\s+(\d+)\s+R"
+_ROOT = re.compile(rb"/Root" + _REF)
+_PAGES = re.compile(rb"/Pages" + _REF)
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_XREFSTM = re.compile(rb"/XRefStm\s+(\d+)")
+_COUNT = re.compile(rb"/Count\s+(\d+)\b(?!\s+\d+\s+R)")
+_TYPE_PAGES = re.compile(rb"/Type\s*/Pages\b")
+_ENCRYPT = re.compile(rb"/Encrypt\b")
+_W = re.compile(rb"/W\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s*\]")
+_INDEX = re.compile(rb"/Index\s*\[([\d\s]*)\]")
+_SIZE = re.compile(rb"/Size\s+(\d+)")
+_FIRST = re.compile(rb"/First\s+(\d+)")
+_N = re.compile(rb"/N\s+(\d+)")
+_FILTER = re.compile(rb"/Filter\s*\[?\s*/(\w+)\s*\]?")
+_PREDICTOR = re.compile(rb"/Predictor\s+(\d+)")
+_COLUMNS = re.compile(rb"/Columns\s+(\d+)")
+_STREAM = re.compile(rb"\bstream\r?\n")
+
+_MAX_XREF_SECTIONS = 64
+
+# object number -> (0, offset) for the objects in the file or (1, object stream number) for compressed objects.
+XrefEntry = Tuple[int, int]
+
+
+class _XrefError(Exception):
+    pass
+
+
+def _png_unpredict(data: bytes, columns: int) -> bytes:
+    """Undo the PNG predictors (/Predictor 10 to 15) of a stream, one filter type byte per row."""
+    row_size = columns + 1
+    prev = bytearray(columns)
+    out = bytearray()
+    for start in range(0, len(data) - row_size + 1, row_size):
+        filter_type = data[start]
+        row = bytearray(data[start + 1 : start + row_size])
+        if filter_type == 1:  # Sub, the xref streams have 1-byte pixels
+            for i in range(1, columns):
+                row[i] = (row[i] + row[i - 1]) & 0xFF
+        elif filter_type == 2:  # Up
+            for i in range(columns):
+                row[i] = (row[i] + prev[i]) & 0xFF
+        elif filter_type == 3:  # Average
+            for i in range(columns):
+                left = row[i - 1] if i else 0
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xFF
+        elif filter_type == 4:  # Paeth
+            for i in range(columns):
+                a = row[i - 1] if i else 0
+                b = prev[i]
+                c = prev[i - 1] if i else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                row[i] = (row[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+        elif filter_type != 0:
+            raise _XrefError(f"Unknown PNG predictor {filter_type}.")
+        out += row
+        prev = row
+    return bytes(out)
+
+
+class _XrefTable:
+    """A classic xref table. The 20-byte entries are read on lookup, not all at once."""
+
+    def __init__(self, data: "mmap.mmap", offset: int) -> None:
+        self.data = data
+        # (first object number, count, offset of the first entry, entry size)
+        self.subsections: List[Tuple[int, int, int, int]] = []
+        pos = offset + 4
+        while True:
+            m = _XREF_SUBSECTION.match(data, pos)
+            if not m:
+                break
+            start, count = int(m.group(1)), int(m.group(2))
+            pos = m.end()
+            # entries are 20 bytes, but some writers end them with a single \n.
+            entry_size = 20 if count == 0 or data[pos + 18 : pos + 20] in (b" \n", b" \r", b"\r\n") else 19
+            self.subsections.append((start, count, pos, entry_size))
+            pos += count * entry_size
+        self.end = pos
+
+    def lookup(self, obj_num: int) -> Optional[XrefEntry]:
+        for start, count, pos, entry_size in self.subsections:
+            if start <= obj_num < start + count:
+                entry_pos = pos + (obj_num - start) * entry_size
+                fields = self.data[entry_pos : entry_pos + 18].split()
+                if len(fields) != 3 or fields[2] not in (b"n", b"f"):
+                    raise _XrefError(f"Malformed xref entry of object {obj_num}.")
+                return (0, int(fields[0])) if fields[2] == b"n" else (0, -1)
+        return None
+
+
+class _XrefStream:
+    """A cross-reference stream, decoded once and read by rows on lookup."""
+
+    def __init__(self, header: bytes, decoded: bytes) -> None:
+        w = _W.search(header)
+        size = _SIZE.search(header)
+        if not w or not size:
+            raise _XrefError("Malformed xref stream.")
+        self.widths = [int(v) for v in w.groups()]
+        self.row_size = sum(self.widths)
+        self.decoded = decoded
+        index = _INDEX.search(header)
+        numbers = [int(v) for v in index.group(1).split()] if index else [0, int(size.group(1))]
+        # (first object number, count, first row)
+        self.subsections: List[Tuple[int, int, int]] = []
+        row = 0
+        for start, count in zip(numbers[0::2], numbers[1::2]):
+            self.subsections.append((start, count, row))
+            row += count
+        if len(decoded) < row * self.row_size:
+            raise _XrefError("Truncated xref stream.")
+
+    def _field(self, pos: int, index: int) -> int:
+        start = pos + sum(self.widths[:index])
+        return int.from_bytes(self.decoded[start : start + self.widths[index]], "big")
+
+    def lookup(self, obj_num: int) -> Optional[XrefEntry]:
+        for start, count, row in self.subsections:
+            if start <= obj_num < start + count:
+                pos = (row + obj_num - start) * self.row_size
+                entry_type = self._field(pos, 0) if self.widths[0] else 1
+                if entry_type == 1:
+                    return (0, self._field(pos, 1))
+                if entry_type == 2:
+                    return (1, self._field(pos, 1))
+                return (0, -1)
+        return None
+
+
+class XrefReader:
+    """Looks up objects of a PDF through its cross-reference tables and streams, newest section first."""
+
+    def __init__(self, data: "mmap.mmap") -> None:
+        self.data = data
+        self.sections: List[Union[_XrefTable, _XrefStream]] = []
+        self.trailer = b""
+        self._object_streams: Dict[int, Tuple[bytes, Dict[int, int]]] = {}
+
+        tail = data[max(0, len(data) - _TAIL_SIZE) :]
+        matches = list(_STARTXREF.finditer(tail))
+        if not matches:
+            raise _XrefError("No startxref.")
+        self._read_sections(int(matches[-1].group(1)))
+
+    def _read_sections(self, offset: int) -> None:
+        seen = set()
+        pending = [offset]
+        while pending:
+            offset = pending.pop(0)
+            if offset in seen or len(seen) >= _MAX_XREF_SECTIONS:
+                continue
+            seen.add(offset)
+            if self.data[offset : offset + 4] == b"xref":
+                table = _XrefTable(self.data, offset)
+                self.sections.append(table)
+                m = _TRAILER_DICT.search(self.data, table.end, table.end + 65536)
+                if not m:
+                    raise _XrefError("No trailer.")
+                trailer = m.group(1)
+                # a hybrid file: the compressed objects are in the xref stream, older than the table but newer than /Prev.
+                xref_stm = _XREFSTM.search(trailer)
+                if xref_stm:
+                    pending.insert(0, int(xref_stm.group(1)))
+            else:
+                trailer, decoded = self._stream_at(offset)
+                self.sections.append(_XrefStream(trailer, decoded))
+            if not self.trailer:
+                self.trailer = trailer
+            m = _PREV.search(trailer)
+            if m:
+                pending.append(int(m.group(1)))
+
+    def lookup(self, obj_num: int) -> XrefEntry:
+        for section in self.sections:
+            entry = section.lookup(obj_num)
+            if entry is not None:
+                return entry
+        return (0, -1)
+
+    def _stream_at(self, offset: int) -> Tuple[bytes, bytes]:
+        """Return the dictionary and the decoded data of the stream object at the offset."""
+        data = self.data
+        if not _OBJ_HEADER.match(data, offset):
+            raise _XrefError(f"No object at {offset}.")
+        m = _STREAM.search(data, offset, offset + 65536)
+        if not m:
+            raise _XrefError(f"No stream at {offset}.")
+        header = data[offset : m.start()]
+        end = data.find(b"endstream", m.end())
+        if end < 0:
+            raise _XrefError("No endstream.")
+        raw = data[m.end() : end]
+
+        f = _FILTER.search(header)
+        if f is None:
+            decoded = raw
+        elif f.group(1) == b"FlateDecode":
+            try:
+                decoded = zlib.decompressobj().decompress(raw)
+            except zlib.error as e:
+                raise _XrefError(str(e))
+        else:
+            raise _XrefError(f"Unsupported filter {f.group(1)!r}.")
+
+        predictor = _PREDICTOR.search(header)
+        if predictor and int(predictor.group(1)) >= 10:
+            columns = _COLUMNS.search(header)
+            decoded = _png_unpredict(decoded, int(columns.group(1)) if columns else 1)
+        elif predictor and int(predictor.group(1)) != 1:
+            raise _XrefError("Unsupported TIFF predictor.")
+
+        return header, decoded
+
+    def _object_stream(self, stream_num: int) -> Tuple[bytes, Dict[int, int]]:
+        cached = self._object_streams.get(stream_num)
+        if cached is None:
+            kind, offset = self.lookup(stream_num)
+            if kind != 0 or offset < 0:
+                raise _XrefError(f"No object stream {stream_num}.")
+            header, decoded = self._stream_at(offset)
+            first, n = _FIRST.search(header), _N.search(header)
+            if not first or not n:
+                raise _XrefError("Malformed object stream.")
+            numbers = [int(v) for v in decoded[: int(first.group(1))].split()]
+            offsets = {numbers[i]: int(first.group(1)) + numbers[i + 1] for i in range(0, 2 * int(n.group(1)), 2)}
+            cached = self._object_streams[stream_num] = (decoded, offsets)
+        return cached
+
+    def object(self, obj_num: int) -> bytes:
+        """Return the object without its obj and endobj keywords."""
+        kind, where = self.lookup(obj_num)
+        if kind == 1:
+            decoded, offsets = self._object_stream(where)
+            if obj_num not in offsets:
+                raise _XrefError(f"No object {obj_num} in object stream {where}.")
+            start = offsets[obj_num]
+            end = min((offset for offset in offsets.values() if offset > start), default=len(decoded))
+            return decoded[start:end]
+
+        if where < 0:
+            raise _XrefError(f"No object {obj_num}.")
+        m = _OBJ_HEADER.match(self.data, where)
+        if not m or int(m.group(1)) != obj_num:
+            raise _XrefError(f"Object {obj_num} is not at {where}.")
+        end = self.data.find(b"endobj", m.end())
+        if end < 0:
+            raise _XrefError(f"No endobj of object {obj_num}.")
+        return self.data[m.end() : end]
+
+
+def _top_level(obj: bytes) -> bytes:
+    """Return the keys and the simple values of the outermost dictionary of the object, without nested dictionaries.
+
+    The part read so far is returned for a dictionary that is not terminated.
+    """
+    start = obj.find(b"<<")
+    if start < 0:
+        raise _XrefError("Not a dictionary.")
+    parts: List[bytes] = []
+    depth = 0
+    mark = start
+    pos = start
+    while True:
+        # bytes.find is much faster than a regular expression on a long /Kids array.
+        found = [p for p in (obj.find(b"<", pos), obj.find(b">", pos), obj.find(b"(", pos)) if p >= 0]
+        if not found:
+            break
+        token_start = min(found)
+        token = obj[token_start : token_start + 2]
+        if token not in (b"<<", b">>"):
+            token = token[:1]
+        pos = token_start + len(token)
+        if token == b"<<":
+            if depth == 1:
+                parts.append(obj[mark:token_start])
+            depth += 1
+            if depth == 1:
+                mark = pos
+        elif token == b">>":
+            depth -= 1
+            if depth == 1:
+                mark = pos
+            elif depth == 0:
+                parts.append(obj[mark:token_start])
+                return b" ".join(parts)
+        elif token == b">":
+            continue
+        else:
+            # a string, its brackets could be taken for dictionary brackets
+            end = obj.find(b")" if token == b"(" else b">", pos)
+            if end < 0:
+                break
+            pos = end + 1
+
+    if depth == 1:
+        parts.append(obj[mark:])
+    return b" ".join(parts)
+
+
+def read_page_count(filename: str) -> Optional[int]:
+    """Return the /Count of the root /Pages object of the PDF, or None if it can't be read without a full parse."""
+    try:
+        with open(filename, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                xref = XrefReader(data)
+                if _ENCRYPT.search(xref.trailer):
+                    return None  # the object streams are encrypted
+                root = _ROOT.search(xref.trailer)
+                if not root:
+                    return None
+                pages = _PAGES.search(_top_level(xref.object(int(root.group(1)))))
+                if not pages:
+                    return None
+                pages_dict = _top_level(xref.object(int(pages.group(1))))
+                count = _COUNT.search(pages_dict)
+                if not count or not _TYPE_PAGES.search(pages_dict):
+                    return None
+                return int(count.group(1))
+    except (_XrefError, ValueError, OSError, IndexError) as e:
+        logger.debug(f"Can't read the page count of {filename} from the xref: {e}")
+        return None
@@ -0,0 +1,12 @@
+from typing import Callable
+
+import pytest
+
+from benchmarks.synthetic import synthetic_pdf
+
+
+@pytest.fixture(scope="session")
+def synthetic(tmp_path_factory) -> Callable[[int], str]:
+    """Return a function that makes the synthetic PDF of a number of pages, shared by the tests."""
+    data_dir = str(tmp_path_factory.mktemp("synthetic"))
+    return lambda num_pages: synthetic_pdf(data_dir, num_pages)
@@ -0,0 +1,113 @@
+import threading
+from typing import List, Optional
+
+import pytest
+
+from command.base_pdf_cmd import BasePDFCmd
+from command.command_executor import CommandExecutor
+
+
+class _TextCmd(BasePDFCmd):
+    """Write the text of the input file, or of the input command kept in memory, followed by a tag."""
+
+    def __init__(self, output_file: str, input_file: Optional[object] = None, tag: str = "", barrier: Optional[threading.Barrier] = None):
+        super().__init__(output_file)
+        self.input_file = input_file
+        self.tag = tag
+        self.barrier = barrier
+        self.text = ""
+
+    def _execute(self) -> None:
+        if self.barrier is not None:
+            # every command of the barrier has to be running at once to pass it.
+            self.barrier.wait(timeout=5)
+        text = ""
+        if isinstance(self.input_file, _TextCmd):
+            text = self.input_file.output_document or open(self.input_file.output_file).read()
+        elif self.input_file is not None:
+            text = open(self.input_file).read()
+        self.text = text + self.tag
+        self.publish(self.text)
+
+    def _write_document(self, document: str, filename: str) -> None:  # type: ignore[override]
+        with open(filename, "w") as f:
+            f.write(document)
+
+    def input_filenames(self) -> List[object]:
+        return [self.input_file] if self.input_file is not None else []
+
+
+def _deps(*cmds: BasePDFCmd) -> list:
+    return CommandExecutor(list(cmds)).dependencies()
+
+
+def test_read_after_write(tmp_path):
+    a = str(tmp_path / "a.txt")
+    assert _deps(_TextCmd(a), _TextCmd(str(tmp_path / "b.txt"), a)) == [set(), {0}]
+
+
+def test_write_after_read(tmp_path):
+    a = str(tmp_path / "a.txt")
+    assert _deps(_TextCmd(str(tmp_path / "b.txt"), a), _TextCmd(a)) == [set(), {0}]
+
+
+def test_write_the_same_output(tmp_path):
+    a = str(tmp_path / "a.txt")
+    assert _deps(_TextCmd(a, tag="1"), _TextCmd(a, tag="2")) == [set(), {0}]
+
+
+def test_read_the_output_in_memory(tmp_path):
+    first = _TextCmd("", tag="a")
+    first.in_memory = True
+    second = _TextCmd(str(tmp_path / "b.txt"), first, tag="b")
+
+    assert _deps(first, second) == [set(), {0}]
+
+
+def test_independent_commands_run_at_once(tmp_path):
+    barrier = threading.Barrier(2)
+    cmds = [_TextCmd(str(tmp_path / f"{i}.txt"), tag=str(i), barrier=barrier) for i in range(2)]
+    assert _deps(*cmds) == [set(), set()]
+
+    CommandExecutor(cmds, max_workers=2).execute()
+
+    assert [cmd.text for cmd in cmds] == ["0", "1"]
+
+
+def test_dependent_commands_run_in_order(tmp_path):
+    a, b = str(tmp_path / "a.txt"), str(tmp_path / "b.txt")
+    memory = _TextCmd("", a, tag="c")
+    memory.in_memory = True
+    cmds = [_TextCmd(a, tag="a"), _TextCmd(b, a, tag="b"), _TextCmd(a, tag="A"), memory, _TextCmd(b, memory, tag="d")]
+
+    CommandExecutor(cmds, max_workers=4).execute()
+
+    # the second write of a waits for the read of a, and the last command reads the output in memory.
+    assert [cmd.text for cmd in cmds] == ["a", "ab", "A", "Ac", "Acd"]
+    assert open(b).read() == "Acd"
+
+
+def test_failed_command_stops_the_dependent_ones(tmp_path):
+    a = str(tmp_path / "a.txt")
+    cmds = [_TextCmd(a, str(tmp_path / "missing.txt")), _TextCmd(str(tmp_path / "b.txt"), a)]
+
+    with pytest.raises(FileNotFoundError):
+        CommandExecutor(cmds).execute()
+    assert cmds[1].text == ""
+
+
+def test_process_state_is_copied_back(tmp_path):
+    b = str(tmp_path / "b.txt")
+    first = _TextCmd("", tag="a")
+    first.in_memory = True
+    cmds = [first, _TextCmd(b, first, tag="b")]
+
+    CommandExecutor(cmds, max_workers=2, use_processes=True).execute()
+
+    # the output kept in memory in the worker process is saved to a file, since it can't be sent back.
+    assert [cmd.text for cmd in cmds] == ["a", "ab"]
+    assert first.output_document is None and first.autodelete
+    # the copy of the first command read by the second worker process doesn't delete its output.
+    assert open(first.output_file).read() == "a"
+    assert open(b).read() == "ab"
+
@@ -0,0 +1,72 @@
+import pytest
+
+from command.font_select import (
+    AUTO_FONT,
+    KOREAN_FONT,
+    LATIN_FONT,
+    Script,
+    detect_script,
+    font_runs,
+    script_of,
+    select_font,
+    split_font_runs,
+)
+
+
+@pytest.mark.parametrize(
+    "ch, script",
+    [("A", Script.LATIN), ("z", Script.LATIN), ("é", Script.LATIN), (" ", Script.COMMON), ("7", Script.COMMON), ("(", Script.COMMON)]
+    + [("가", Script.HANGUL), ("ㄱ", Script.HANGUL), ("漢", Script.CJK), ("ｆ", Script.CJK), ("。", Script.CJK)],
+)
+def test_script_of(ch, script):
+    assert script_of(ch) == script
+
+
+@pytest.mark.parametrize(
+    "text, script, font",
+    [
+        ("KM", Script.LATIN, LATIN_FONT),
+        ("English Ministry", Script.LATIN, LATIN_FONT),
+        ("사역자", Script.HANGUL, KOREAN_FONT),
+        # the script of most letters wins, spaces and digits don't count.
+        ("KM 사역자 (2024)", Script.HANGUL, KOREAN_FONT),
+        ("Youth 청년", Script.LATIN, LATIN_FONT),
+        ("漢字", Script.CJK, KOREAN_FONT),
+        ("2024 - 1", Script.COMMON, LATIN_FONT),
+        ("", Script.COMMON, LATIN_FONT),
+    ],
+)
+def test_detect_script(text, script, font):
+    assert detect_script(text) == script
+    assert select_font(text) == font
+
+
+@pytest.mark.parametrize(
+    "text, runs",
+    [
+        ("KM 사역자 (2024)", [("KM ", LATIN_FONT), ("사역자 (2024)", KOREAN_FONT)]),
+        ("(사역자) KM", [("(사역자) ", KOREAN_FONT), ("KM", LATIN_FONT)]),
+        ("English Ministry", [("English Ministry", LATIN_FONT)]),
+        ("漢字 and 한글", [("漢字 ", KOREAN_FONT), ("and ", LATIN_FONT), ("한글", KOREAN_FONT)]),
+        # a text without letters is drawn with the latin font.
+        ("2024", [("2024", LATIN_FONT)]),
+        ("", []),
+    ],
+)
+def test_split_font_runs(text, runs):
+    assert list(split_font_runs(text)) == runs
+    assert "".join(segment for segment, _font in runs) == text
+
+
+def test_font_runs():
+    assert font_runs("KM 사역자", AUTO_FONT) == split_font_runs("KM 사역자")
+    # a named font draws the whole text.
+    assert font_runs("KM 사역자", KOREAN_FONT) == (("KM 사역자", KOREAN_FONT),)
+
+
+def test_results_are_cached():
+    split_font_runs("KM 사역자 (cached)")
+    hits = split_font_runs.cache_info().hits
+
+    assert split_font_runs("KM 사역자 (cached)") is split_font_runs("KM 사역자 (cached)")
+    assert split_font_runs.cache_info().hits == hits + 2
@@ -0,0 +1,138 @@
+from argparse import Namespace
+import pickle
+
+import pytest
+
+from benchmarks.backend_parity import compare_positions
+from command.base_pdf_cmd import InchesToPoint
+from command.font_select import AUTO_FONT, select_font
+from command.hf_pdf_cmd import HeaderFooterPDFCmd
+from command.hf_template import HeaderFooterTemplate, OverlayPlan, TextItem
+from command.text_layout import Overflow, TextAlign
+from emc_booklet import booklet_template
+
+
+def _texts(plan: OverlayPlan) -> list:
+    return [[item.text for item in plan(page_no)] for page_no in range(plan.num_pages)]
+
+
+def test_pages_and_skip():
+    template = HeaderFooterTemplate({"skip": "0", "elements": [{"text": "{page}/{num_pages}", "pages": "0:3,-2:"}, {"text": "{page_no}"}]})
+
+    assert _texts(template.compile(6)) == [[], ["2/6", "1"], ["3/6", "2"], ["3"], ["5/6", "4"], ["6/6", "5"]]
+
+
+def test_out_of_range_pages():
+    template = HeaderFooterTemplate({"elements": [{"text": "{page}", "pages": "10"}]})
+
+    with pytest.raises(ValueError, match="out of range"):
+        template.compile(6)
+
+
+def test_sections():
+    elements = [{"text": "{section}", "when": "section"}, {"text": "{section}{page}"}]
+    template = HeaderFooterTemplate({"page_offset": 0, "sections": {"1": "A", "4": "B"}, "elements": elements})
+
+    # the section title is empty before the first section, and an empty text draws nothing.
+    assert _texts(template.compile(6)) == [["0"], ["A", "A1"], ["A2"], ["A3"], ["B", "B4"], ["B5"]]
+
+
+def test_odd_and_even_override_the_style():
+    element = {"text": "{page}", "size": 12, "x": 10, "y": 20, "odd": {"x": 30, "align": "right"}, "even": {"size": 8}}
+    plan = HeaderFooterTemplate({"elements": [element]}).compile(2)
+
+    assert plan(0) == [TextItem("Helvetica", 8, 10, 20, TextAlign.LEFT, "1")]
+    assert plan(1) == [TextItem("Helvetica", 12, 30, 20, TextAlign.RIGHT, "2")]
+
+
+def test_max_width_and_overflow():
+    element = {"text": "{page}", "font": AUTO_FONT, "max_width": 50, "overflow": "wrap"}
+    item = HeaderFooterTemplate({"elements": [element]}).compile(1)(0)[0]
+
+    assert (item.name, item.max_width, item.overflow) == (AUTO_FONT, 50, Overflow.WRAP)
+
+
+@pytest.mark.parametrize(
+    "element, message",
+    [
+        ({"x": 1}, "needs 'text'"),
+        ({"text": "", "align": "middle"}, "Unknown align"),
+        ({"text": "", "even": {"overflow": "cut"}}, "Unknown overflow"),
+    ],
+)
+def test_invalid_elements(element, message):
+    with pytest.raises(ValueError, match=message):
+        HeaderFooterTemplate({"elements": [element]})
+
+
+def test_pages_with_the_same_items_share_an_overlay():
+    template = HeaderFooterTemplate({"sections": {"2": "A"}, "elements": [{"text": "{section}", "when": "section"}, {"text": "-"}]})
+    plan = template.compile(5)
+
+    assert len(plan.overlays) == 2
+    assert plan.page_overlays == (0, 0, 1, 0, 0)
+
+
+def test_shard_and_subplan():
+    elements = [{"text": "{section}", "when": "section"}, {"text": "{page}"}]
+    template = HeaderFooterTemplate({"sections": {"0": "A", "5": "B"}, "elements": elements})
+    plan = template.compile(20)
+    shards = plan.shard(3)
+
+    assert len(shards) == 3
+    assert shards[0][0] == 0 and shards[-1][1] == 20
+    assert all(end == start for (_s, end), (start, _e) in zip(shards, shards[1:]))
+    subplans = [plan.subplan(start, end) for start, end in shards]
+    assert [items for subplan in subplans for items in _texts(subplan)] == _texts(plan)
+    # the plans are sent to worker processes.
+    assert _texts(pickle.loads(pickle.dumps(subplans[1]))) == _texts(subplans[1])
+
+    assert plan.shard(1) == [(0, 20)]
+    assert len(plan.shard(50)) <= 20
+
+
+def test_toml_template_is_the_json_template(tmp_path):
+    json_template, toml_template = tmp_path / "hf.json", tmp_path / "hf.toml"
+    json_template.write_text('{"page_size": [396, 612], "sections": {"1": "A"}, "elements": [{"text": "{page}", "odd": {"x": 5}}]}')
+    toml_template.write_text('page_size = [396, 612]\nsections = {1 = "A"}\n[[elements]]\ntext = "{page}"\nodd = {x = 5}\n')
+
+    template = HeaderFooterTemplate.load(str(toml_template))
+    assert template.page_size == (396, 612)
+    assert _texts(template.compile(3)) == _texts(HeaderFooterTemplate.load(str(json_template)).compile(3))
+
+
+# the pages of the booklet the test is compared on, with the group titles at the pages of a booklet of that size.
+BOOKLET_PAGES = 80
+ADDRESS_BOOK_START_PAGE_NO = 29
+GROUP_TITLE = {32: "사역자", 41: "KM", 58: "English Ministry", 71: "Youth Group"}
+
+
+def _callback_content_function(page_no: int):
+    """The callback emc_booklet drew the page numbers and group titles with before the template."""
+    statement_x = InchesToPoint(5.5)
+    statement_y = InchesToPoint(8.5)
+    content_list = []
+    if page_no >= 2 and not (ADDRESS_BOOK_START_PAGE_NO <= page_no and page_no <= ADDRESS_BOOK_START_PAGE_NO + 2):
+        content = Namespace(name="Helvetica", font_size=10, x=statement_x // 2, y=16, align=TextAlign.CENTER, text=str(page_no + 1))
+        content_list.append(content)
+    if page_no in GROUP_TITLE:
+        text = GROUP_TITLE[page_no]
+        x, align = (32, TextAlign.LEFT) if page_no % 2 == 1 else (statement_x - 32, TextAlign.RIGHT)
+        # langdetect picked the Korean font for the Korean titles.
+        content_list.append(Namespace(name=select_font(text), font_size=14, x=x, y=statement_y - 24, align=align, text=text))
+
+    return content_list
+
+
+def test_booklet_template_is_the_callback(tmp_path):
+    page_size = (InchesToPoint(5.5), InchesToPoint(8.5))
+    plan = booklet_template(GROUP_TITLE, ADDRESS_BOOK_START_PAGE_NO).compile(BOOKLET_PAGES)
+    for page_no in range(BOOKLET_PAGES):
+        callback = [(c.font_size, c.x, c.y, c.align, c.text) for c in _callback_content_function(page_no)]
+        assert [(i.font_size, i.x, i.y, i.align, i.text) for i in plan(page_no)] == callback, page_no
+
+    template_file, callback_file = str(tmp_path / "template.pdf"), str(tmp_path / "callback.pdf")
+    HeaderFooterPDFCmd(template_file, BOOKLET_PAGES, page_size, plan).execute()
+    HeaderFooterPDFCmd(callback_file, BOOKLET_PAGES, page_size, _callback_content_function).execute()
+
+    assert compare_positions(callback_file, template_file) == []
@@ -0,0 +1,118 @@
+import tracemalloc
+from typing import Callable, Dict, List
+
+import pytest
+
+from benchmarks.backend_parity import IMPOSE_CASES, IMPOSE_VARIANTS, compare_positions, mixed_size_copy, rotated_copy
+from command.impose_engine import ImposeSchema, Impositor, impose_streaming
+from command.impose_pdf_cmd import ImposePDFCmd
+from pdf_backend import get_backend
+
+
+NUM_PAGES = 12
+
+
+def _side_slots(side) -> List[tuple]:
+    """The number, rotation and margins of each slot of a side of the engine or a matrix of pdfimpose."""
+    slots = []
+    for x, y in side.coordinates():
+        slot = side[x, y]
+        slots.append((x, y, slot.number, slot.rotate, *(round(v, 4) for v in (slot.left, slot.right, slot.top, slot.bottom))))
+    return slots
+
+
+def _pdfimpose_impositor(impositor: Impositor):
+    from pdfimpose.schema import perfect, saddle
+
+    options = dict(
+        folds=impositor.folds,
+        imargin=impositor.imargin,
+        omargin=saddle.Margins(*impositor.omargin),
+        group=impositor.group,
+        last=impositor.last,
+        bind=impositor.bind,
+    )
+    if impositor.schema == ImposeSchema.PERFECT:
+        return perfect.PerfectImpositor(**options)
+    return saddle.SaddleImpositor(creep=impositor.creep, **options)
+
+
+@pytest.mark.parametrize("num_pages", [1, 7, 16, 33])
+@pytest.mark.parametrize("folds, schema, options", IMPOSE_CASES, ids=[f"{c[0]}-{c[1].name}" for c in IMPOSE_CASES])
+def test_slots_match_pdfimpose(folds, schema, options, num_pages):
+    impositor = Impositor(folds, schema, **options)
+    theirs = _pdfimpose_impositor(impositor)
+
+    blank_pages = impositor.blank_pages(num_pages)
+    assert blank_pages == theirs.blank_page_number(num_pages)
+    assert [_side_slots(side) for side in impositor.sides(num_pages)] == [
+        _side_slots(matrix) for matrix in theirs.matrixes(num_pages + blank_pages)
+    ]
+
+
+def _indirect_contents_copy(source: str, filename: str) -> str:
+    """Copy the source to filename with the /Contents of each page an indirect array of its content stream."""
+    backend = get_backend("pymupdf")
+    doc = backend.open(source)
+    for page in doc:
+        _kind, contents = doc.xref_get_key(page.xref, "Contents")
+        array = doc.get_new_xref()
+        doc.update_object(array, f"[{contents}]")
+        doc.xref_set_key(page.xref, "Contents", f"{array} 0 R")
+    backend.save(doc, filename)
+    backend.close(doc)
+    return filename
+
+
+@pytest.fixture(scope="module")
+def sources(synthetic, tmp_path_factory) -> Callable[[str], str]:
+    """Return a function that makes the source of a kind: plain pages, pages with /Rotate, pages of two sizes or pages
+    whose /Contents refers to an array."""
+    workdir = tmp_path_factory.mktemp("impose")
+    makers: Dict[str, Callable[[str], str]] = {
+        "plain": lambda source: source,
+        "rotated": lambda source: rotated_copy(source, str(workdir / "rotated.pdf")),
+        "mixed": lambda source: mixed_size_copy(source, str(workdir / "mixed.pdf")),
+        "indirect": lambda source: _indirect_contents_copy(source, str(workdir / "indirect.pdf")),
+    }
+    made: Dict[str, str] = {}
+
+    def source(kind: str) -> str:
+        if kind not in made:
+            made[kind] = makers[kind](synthetic(NUM_PAGES))
+        return made[kind]
+
+    return source
+
+
+@pytest.mark.parametrize("kind", ["plain", "rotated", "mixed", "indirect"])
+@pytest.mark.parametrize("folds, schema, options", IMPOSE_CASES, ids=[f"{c[0]}-{c[1].name}" for c in IMPOSE_CASES])
+def test_positions_match_pdfimpose(sources, tmp_path, folds, schema, options, kind):
+    source = sources(kind)
+    outputs = {}
+    for name, variant in IMPOSE_VARIANTS.items():
+        outputs[name] = str(tmp_path / f"{name}.pdf")
+        ImposePDFCmd(outputs[name], [source], folds, schema=schema, **variant, **options).execute()
+
+    for name in list(IMPOSE_VARIANTS)[1:]:
+        assert compare_positions(outputs["pdfimpose"], outputs[name]) == [], name
+
+
+def _streaming_peak(source: str, output: str) -> int:
+    tracemalloc.start()
+    try:
+        impose_streaming([source], Impositor("hv"), output)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_streaming_imposition_memory_is_bounded(synthetic, tmp_path, monkeypatch):
+    # the parsed source pages are dropped every few output pages instead of 64, so that small files show it.
+    monkeypatch.setattr("command.stream_pdf_writer.RELEASE_INTERVAL", 4)
+    _streaming_peak(synthetic(NUM_PAGES), str(tmp_path / "warmup.pdf"))
+    small_peak = _streaming_peak(synthetic(100), str(tmp_path / "small.pdf"))
+    large_peak = _streaming_peak(synthetic(400), str(tmp_path / "large.pdf"))
+
+    # the page references and the xref table grow with the pages, the parsed pages don't.
+    assert large_peak < 2.5 * small_peak
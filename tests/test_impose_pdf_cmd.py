@@ -0,0 +1,97 @@
+from argparse import Namespace
+from typing import List
+
+import pytest
+
+from benchmarks.backend_parity import GRID_CASES, IMPOSE_CASES, IMPOSE_VARIANTS, compare_positions
+from benchmarks.synthetic import STATEMENT_SIZE
+from command.hf_pdf_cmd import TextAlign
+from command.impose_engine import GridImpositor, Impositor, impose
+from command.impose_pdf_cmd import ImposePDFCmd, MultiImposePDFCmd
+from command.merge_pdf_cmd import FilenamePages, MergePDFCmd
+from command.stamp_pdf_cmd import StampPDFCmd
+from pdf_backend import get_backend
+
+
+NUM_PAGES = 12
+
+
+def _content_function(page_no: int):
+    return [Namespace(name="Helvetica", font_size=10, x=STATEMENT_SIZE[0] // 2, y=16, align=TextAlign.CENTER, text=f"- {page_no + 1} -")]
+
+
+def _virtual_pages(source: str) -> List[FilenamePages]:
+    """Page ranges, a blank page and a repeated page of the source, and a range of two files read as one."""
+    return [FilenamePages(source, "0:5,blank,9:,3*2"), FilenamePages([source, source], [(1, 4)])]
+
+
+@pytest.fixture
+def merged(synthetic, tmp_path) -> str:
+    """The virtual pages merged to a file."""
+    filename = str(tmp_path / "merged.pdf")
+    MergePDFCmd(filename, _virtual_pages(synthetic(NUM_PAGES))).execute()
+    return filename
+
+
+@pytest.mark.parametrize("variant", list(IMPOSE_VARIANTS))
+def test_impose_virtual_pages_is_impose_merged_pages(synthetic, tmp_path, merged, variant):
+    virtual, imposed = str(tmp_path / "virtual.pdf"), str(tmp_path / "imposed.pdf")
+    ImposePDFCmd(virtual, _virtual_pages(synthetic(NUM_PAGES)), "hv", **IMPOSE_VARIANTS[variant]).execute()
+    ImposePDFCmd(imposed, [merged], "hv", **IMPOSE_VARIANTS[variant]).execute()
+
+    assert compare_positions(imposed, virtual) == []
+
+
+@pytest.mark.parametrize("variant", ["native", "streaming"])
+def test_impose_virtual_pages_without_merging(synthetic, tmp_path, monkeypatch, variant):
+    monkeypatch.setattr(MergePDFCmd, "_execute", lambda _cmd: pytest.fail("the pages were merged first"))
+    ImposePDFCmd(str(tmp_path / "virtual.pdf"), _virtual_pages(synthetic(NUM_PAGES)), "hv", **IMPOSE_VARIANTS[variant]).execute()
+
+
+def test_stamp_virtual_pages_is_stamp_merged_pages(synthetic, tmp_path, merged, monkeypatch):
+    stamped = str(tmp_path / "stamped.pdf")
+    StampPDFCmd(stamped, merged, _content_function).execute()
+
+    monkeypatch.setattr(MergePDFCmd, "_execute", lambda _cmd: pytest.fail("the pages were merged first"))
+    virtual = str(tmp_path / "virtual.pdf")
+    StampPDFCmd(virtual, _virtual_pages(synthetic(NUM_PAGES)), _content_function).execute()
+
+    assert compare_positions(stamped, virtual) == []
+
+
+def _layouts() -> list:
+    """The saddle and perfect impositions of the parity cases and the grids, imposed together."""
+    return [Impositor(folds, schema, **options) for folds, schema, options in IMPOSE_CASES] + [
+        GridImpositor(*grid, **options) for grid, options in GRID_CASES
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_multi_impose_is_each_layout_alone(synthetic, tmp_path, workers):
+    source = synthetic(NUM_PAGES)
+    layouts = _layouts()
+    outputs = [str(tmp_path / f"multi-{i}.pdf") for i in range(len(layouts))]
+    MultiImposePDFCmd(outputs, [source], layouts, workers=workers).execute()
+
+    for i, (layout, output) in enumerate(zip(layouts, outputs)):
+        alone = str(tmp_path / f"alone-{i}.pdf")
+        get_backend("pymupdf").save(impose([source], layout), alone)
+        assert compare_positions(alone, output) == [], i
+
+
+def test_cut_and_stack_duplex_is_pdfimpose_wire(synthetic, tmp_path):
+    from pdfimpose.schema import saddle, wire
+
+    source = synthetic(NUM_PAGES)
+    grid, options = GRID_CASES[-1]
+    output, wired = str(tmp_path / "grid.pdf"), str(tmp_path / "wire.pdf")
+    MultiImposePDFCmd([output], [source], [GridImpositor(*grid, **options)]).execute()
+    omargin = saddle.Margins(*options["omargin"])
+    wire.impose([source], wired, imargin=options["imargin"], omargin=omargin, last=options["last"], signature=grid)
+
+    assert compare_positions(wired, output) == []
+
+
+def test_multi_impose_needs_an_output_per_layout(tmp_path):
+    with pytest.raises(ValueError, match="2 layouts need as many output files"):
+        MultiImposePDFCmd([str(tmp_path / "a.pdf")], ["source.pdf"], [GridImpositor(2, 2), GridImpositor(2, 1)])
@@ -0,0 +1,86 @@
+from collections import Counter
+import tracemalloc
+
+import pytest
+
+from benchmarks.backend_parity import compare_outputs
+from command.merge_pdf_cmd import FilenamePages, MergePDFCmd, load_manifest
+from pdf_info import get_num_pages
+from pdf_reader_pool import default_reader_pool
+
+
+N = 100
+
+
+def _merge(source: str, output: str, streaming: bool) -> int:
+    """Merge the source twice to the output and return the peak of the Python heap."""
+    tracemalloc.start()
+    try:
+        MergePDFCmd(output, [FilenamePages(source, None), FilenamePages(source, None)], streaming=streaming).execute()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _merge_work(source: str, output: str, streaming: bool, monkeypatch) -> Counter:
+    """Merge the source twice to the output and count the readers opened, the pages added and the objects written."""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    from command.stream_pdf_writer import StreamingPdfWriter
+
+    calls: Counter = Counter()
+
+    def counted(cls: type, name: str) -> None:
+        method = getattr(cls, name)
+
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(cls, name, wrapper)
+
+    counted(PdfReader, "__init__")
+    counted(StreamingPdfWriter if streaming else PdfWriter, "add_page")
+    # the readers shared by the process are opened again.
+    default_reader_pool().discard(source)
+    MergePDFCmd(output, [FilenamePages(source, None), FilenamePages(source, None)], streaming=streaming).execute()
+    monkeypatch.undo()
+
+    calls["objects"] = int(PdfReader(output, strict=False).trailer["/Size"])
+    return calls
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_merge_work_is_linear(synthetic, tmp_path, monkeypatch, streaming):
+    small = _merge_work(synthetic(N), str(tmp_path / "small.pdf"), streaming, monkeypatch)
+    large = _merge_work(synthetic(4 * N), str(tmp_path / "large.pdf"), streaming, monkeypatch)
+
+    assert get_num_pages(str(tmp_path / "large.pdf")) == 8 * N
+    # the input is parsed once however many times it's used, and each page is added once.
+    assert small["__init__"] == large["__init__"] == 1
+    assert (small["add_page"], large["add_page"]) == (2 * N, 8 * N)
+    # the pages of the input used twice share their content, fonts and images.
+    assert large["objects"] <= 4 * small["objects"]
+
+
+def test_streaming_merge_memory_is_bounded(synthetic, tmp_path):
+    small_peak = _merge(synthetic(N), str(tmp_path / "small.pdf"), True)
+    large_peak = _merge(synthetic(4 * N), str(tmp_path / "large.pdf"), True)
+
+    assert large_peak < 2 * small_peak
+
+
+def test_streaming_merge_is_the_in_memory_merge(synthetic, tmp_path):
+    source = synthetic(N)
+    _merge(source, str(tmp_path / "in_memory.pdf"), False)
+    _merge(source, str(tmp_path / "streaming.pdf"), True)
+
+    assert compare_outputs(str(tmp_path / "in_memory.pdf"), str(tmp_path / "streaming.pdf")) == []
+
+
+def test_toml_manifest_is_the_json_manifest(tmp_path):
+    json_manifest, toml_manifest = tmp_path / "jobs.json", tmp_path / "jobs.toml"
+    json_manifest.write_text('{"jobs": [{"output": "a.pdf", "inputs": ["b.pdf:0-4", "c.pdf"], "dedup": true}]}')
+    toml_manifest.write_text('[[jobs]]\noutput = "a.pdf"\ninputs = ["b.pdf:0-4", "c.pdf"]\ndedup = true\n')
+
+    assert load_manifest(str(toml_manifest)) == load_manifest(str(json_manifest))
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+
+import pytest
+
+from command.access_pdf_cmd import PrintConfig
+from command.office_worker import FakeOfficeApp, OfficeWorker, OfficeWorkerClient, OfficeWorkerError
+
+# seconds of a word job of the fake worker
+WORD_DELAY = 0.2
+
+
+@pytest.fixture
+def source(tmp_path) -> str:
+    filename = str(tmp_path / "address.mdb")
+    open(filename, "wb").close()
+    return filename
+
+
+@pytest.fixture
+def worker():
+    apps = {"word": lambda: FakeOfficeApp("word", delay=WORD_DELAY), "access": lambda: FakeOfficeApp("access")}
+    with OfficeWorker(apps, port=0, max_pending=1).start() as worker:
+        yield worker
+
+
+@pytest.fixture
+def client(worker) -> OfficeWorkerClient:
+    return OfficeWorkerClient(*worker.address)
+
+
+def _wait_done(client: OfficeWorkerClient, app: str, done: int) -> dict:
+    """Wait until the app has finished done jobs, the late ones included, and return its status."""
+    for _i in range(100):
+        status = client.ping()["apps"][app]
+        if status["done"] >= done:
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"{app} did not finish {done} jobs: {status}")
+
+
+def test_access_reports_are_printed_by_the_access_thread(tmp_path, client, source):
+    # FakeOfficeApp fails like COM when it's called from another thread than the one that created it.
+    configs = [PrintConfig("FAMILY-SUM", "Q", "NAME", str(tmp_path / f"report-{i}.pdf")) for i in range(3)]
+    outputs = client.export_access(source, configs)
+
+    assert outputs == [c.output_filename for c in configs]
+    assert all(os.path.isfile(fn) for fn in outputs)
+
+
+def test_pending_limit_does_not_block_other_apps(tmp_path, client, source):
+    # one word job runs and one waits, so a third is refused.
+    threads = [threading.Thread(target=client.export_word, args=(source, str(tmp_path / f"word-{i}.pdf"))) for i in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    try:
+        with pytest.raises(OfficeWorkerError, match="busy"):
+            client.export_word(source, str(tmp_path / "word-busy.pdf"))
+
+        start = time.perf_counter()
+        client.export_access(source, [PrintConfig("FAMILY-SUM", "Q", "NAME", str(tmp_path / "report.pdf"))])
+        assert time.perf_counter() - start < WORD_DELAY * 0.75
+    finally:
+        for thread in threads:
+            thread.join()
+
+    assert os.path.isfile(tmp_path / "word-0.pdf") and os.path.isfile(tmp_path / "word-1.pdf")
+
+
+def test_late_job_restarts_the_app(tmp_path, client, source):
+    with pytest.raises(OfficeWorkerError, match="did not finish"):
+        client.export_word(source, str(tmp_path / "late.pdf"), timeout=WORD_DELAY / 4)
+
+    # the running call can't be interrupted, so the app is quit when it returns.
+    assert _wait_done(client, "word", 1)["running"] is False
+
+
+def test_failed_job_restarts_the_app(tmp_path, client, source):
+    client.export_word(source, str(tmp_path / "word.pdf"))
+    assert client.ping()["apps"]["word"]["running"] is True
+
+    with pytest.raises(OfficeWorkerError, match="FileNotFoundError"):
+        client.export_word(str(tmp_path / "missing.docx"), str(tmp_path / "missing.pdf"))
+    assert client.ping()["apps"]["word"]["running"] is False
+
+    client.export_word(source, str(tmp_path / "word.pdf"))
+    assert client.ping()["apps"]["word"]["running"] is True
+
+
+def test_invalid_requests(client, worker, source):
+    with pytest.raises(OfficeWorkerError, match="Unknown app 'excel'"):
+        client.export("excel", source, output="x.pdf")
+    with pytest.raises(OfficeWorkerError, match="needs 'source' and 'output'"):
+        client.export("word", source)
+
+    assert worker.handle({"action": "print", "id": 7}) == {"ok": False, "error": "Unknown action 'print'.", "id": 7}
+
+
+def test_shutdown(client, worker):
+    assert client.is_running()
+
+    client.shutdown()
+    worker.wait()
+
+    assert not client.is_running()
+    with pytest.raises(OfficeWorkerError, match="Can't reach the office worker"):
+        client.ping()
@@ -0,0 +1,86 @@
+import os
+import shutil
+
+from command.access_pdf_cmd import AccessPDFCmd, PrintConfig
+from command.impose_pdf_cmd import ImposePDFCmd
+from command.merge_content_pdf_cmd import MergeContentPDFCmd
+from command.merge_pdf_cmd import FilenamePages, MergePDFCmd
+from command.output_cache import OutputCache
+from pdf_info import get_num_pages
+from pdf_reader_pool import default_reader_pool
+
+
+def _access_cmd(tmp_path, cache: OutputCache) -> AccessPDFCmd:
+    mdb_filename = tmp_path / "address.mdb"
+    mdb_filename.write_bytes(b"mdb")
+    configs = [PrintConfig("FAMILY-SUM", f"Q{i}", "NAME", str(tmp_path / f"{i}.pdf")) for i in range(4)]
+    cmd = AccessPDFCmd(str(mdb_filename), configs)
+    cmd.cache = cache
+    return cmd
+
+
+def test_multi_output_command_restored_from_cache(tmp_path):
+    cache = OutputCache(str(tmp_path / "cache"))
+    cmd = _access_cmd(tmp_path, cache)
+    for i, fn in enumerate(cmd.output_filenames()):
+        with open(fn, "wb") as f:
+            f.write(f"report {i}".encode())
+    cache.store(cmd.cache_key(), cmd.output_filenames())
+    for fn in cmd.output_filenames():
+        os.remove(fn)
+
+    # Access is not started on a hit, so output_files comes from the print configs.
+    cmd.execute()
+
+    assert cache.hits == 1
+    assert cmd.output_files == [c.output_filename for c in cmd.printout_configs]
+    assert [open(fn, "rb").read() for fn in cmd.output_files] == [f"report {i}".encode() for i in range(4)]
+
+
+def test_multi_output_commands_do_not_share_output_files():
+    cmd1 = AccessPDFCmd("a.mdb", [])
+    cmd2 = AccessPDFCmd("b.mdb", [])
+    cmd1.output_files.append("x.pdf")
+
+    assert cmd2.output_files == []
+
+
+def test_restore_over_a_mapped_output(synthetic, tmp_path):
+    source = synthetic(10)
+    output = str(tmp_path / "output.pdf")
+    cache = OutputCache(str(tmp_path / "cache"))
+    cache.store("key", [synthetic(20)])
+    shutil.copyfile(source, output)
+
+    pool = default_reader_pool()
+    with pool.reader(output) as reader:
+        assert cache.lookup("key", [output])
+        # the leased reader keeps the old file mapped, a copy in place would truncate it under the map.
+        assert len(reader.pages) == 10
+        reader.pages[9].extract_text()
+
+    assert get_num_pages(output) == 20
+    with pool.reader(output) as reader:
+        assert len(reader.pages) == 20
+
+
+def test_backend_and_streaming_are_in_the_cache_key(synthetic, tmp_path):
+    source = synthetic(10)
+    output = str(tmp_path / "output.pdf")
+    cmds = [
+        MergePDFCmd(output, [FilenamePages(source, None)], backend="pypdf2"),
+        MergePDFCmd(output, [FilenamePages(source, None)], backend="pymupdf"),
+        MergePDFCmd(output, [FilenamePages(source, None)], backend="pypdf2", streaming=True),
+        MergeContentPDFCmd(output, [source, source], backend="pypdf2"),
+        MergeContentPDFCmd(output, [source, source], backend="pymupdf"),
+        ImposePDFCmd(output, [source], "hv"),
+        ImposePDFCmd(output, [source], "hv", streaming=True),
+    ]
+    cache = OutputCache(str(tmp_path / "cache"))
+    for cmd in cmds:
+        cmd.cache = cache
+        cmd.execute()
+
+    # each command wrote a different file, so none is restored from the output of another.
+    assert cache.hits == 0
+    assert len({cmd.cache_key() for cmd in cmds}) == len(cmds)
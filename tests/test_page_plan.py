@@ -0,0 +1,35 @@
+import pytest
+
+from command.page_plan import BLANK_PAGE, PagePlan, PageSpec
+
+
+def test_resolve_ranges():
+    plan = PagePlan().add("a.pdf", "0,blank,-2:,::-3").add("b.pdf", [(1, 0)])
+    pages = {"a.pdf": 5, "b.pdf": 3}
+    assert plan.resolve(pages.__getitem__) == [
+        ("a.pdf", 0),
+        ("a.pdf", BLANK_PAGE),
+        ("a.pdf", 3),
+        ("a.pdf", 4),
+        ("a.pdf", 4),
+        ("a.pdf", 1),
+        ("b.pdf", 1),
+        ("b.pdf", 2),
+    ]
+    assert plan.validate(pages.__getitem__) == 8
+
+
+def test_out_of_range():
+    with pytest.raises(ValueError, match="a.pdf: Page 5 is out of range of 5 pages"):
+        PagePlan().add("a.pdf", "5").validate(lambda _source: 5)
+
+
+def test_repeat_blank():
+    assert PageSpec.parse("blank*3").indices(2) == [BLANK_PAGE] * 3
+
+
+def test_blank_page_of_a_file_without_pages():
+    with pytest.raises(ValueError, match="empty.pdf: A blank page needs a page size"):
+        PagePlan().add("empty.pdf", "blank").validate(lambda _source: 0)
+    # without blank pages an empty file adds nothing.
+    assert PagePlan().add("empty.pdf", ":").validate(lambda _source: 0) == 0
@@ -0,0 +1,95 @@
+from argparse import Namespace
+import os
+from typing import List
+
+import pytest
+
+from benchmarks.backend_parity import compare_outputs
+from benchmarks.synthetic import STATEMENT_SIZE
+from command.hf_pdf_cmd import HeaderFooterPDFCmd, TextAlign
+from command.merge_content_pdf_cmd import MIN_CHUNK_PAGES, MergeContentPDFCmd
+from command.merge_pdf_cmd import FilenamePages, MergePDFCmd
+from pdf_backend import BACKENDS, get_backend
+
+
+NUM_PAGES = 10
+
+
+def _content_function(page_no: int):
+    return [Namespace(name="Helvetica", font_size=10, x=STATEMENT_SIZE[0] // 2, y=16, align=TextAlign.CENTER, text=f"- {page_no + 1} -")]
+
+
+def _page_words(filename: str) -> List[List[str]]:
+    """The sorted words of each page, read with PyMuPDF whatever backend wrote the file."""
+    backend = get_backend("pymupdf")
+    with backend.open_document(filename) as doc:
+        return [sorted(backend.page_text(doc, page_no).split()) for page_no in range(backend.page_count(doc))]
+
+
+def _page_boxes(filename: str) -> List[tuple]:
+    backend = get_backend("pymupdf")
+    with backend.open_document(filename) as doc:
+        return [tuple(round(v, 2) for v in backend.page_box(doc, page_no)) for page_no in range(backend.page_count(doc))]
+
+
+@pytest.fixture
+def overlay(tmp_path) -> str:
+    filename = str(tmp_path / "overlay.pdf")
+    HeaderFooterPDFCmd(filename, NUM_PAGES, STATEMENT_SIZE, _content_function).execute()
+    return filename
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_merge_pages_in_order(synthetic, tmp_path, backend):
+    source = synthetic(NUM_PAGES)
+    output = str(tmp_path / "merge.pdf")
+    half = NUM_PAGES // 2
+    MergePDFCmd(output, [FilenamePages(source, [(half, 0)]), FilenamePages(source, [(0, half)])], backend=backend).execute()
+
+    words = _page_words(source)
+    assert _page_words(output) == words[half:] + words[:half]
+    boxes = _page_boxes(source)
+    assert _page_boxes(output) == boxes[half:] + boxes[:half]
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_merge_content_overlays_each_page(synthetic, tmp_path, overlay, backend):
+    source = synthetic(NUM_PAGES)
+    output = str(tmp_path / "merge_content.pdf")
+    MergeContentPDFCmd(output, [source, overlay], backend=backend).execute()
+
+    assert _page_words(output) == [sorted(s + o) for s, o in zip(_page_words(source), _page_words(overlay))]
+    assert _page_boxes(output) == _page_boxes(source)
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_parallel_merge_content_is_the_serial_merge(synthetic, tmp_path, overlay, backend):
+    # two chunks, each written by its own worker with its own copy of the fonts.
+    source = synthetic(2 * MIN_CHUNK_PAGES)
+    serial, parallel = str(tmp_path / "serial.pdf"), str(tmp_path / "parallel.pdf")
+    MergeContentPDFCmd(serial, [source, source], backend=backend).execute()
+    MergeContentPDFCmd(parallel, [source, source], backend=backend, workers=2).execute()
+
+    assert compare_outputs(serial, parallel) == []
+    assert os.path.getsize(parallel) <= os.path.getsize(serial) * 1.1
+
+
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_dedup_keeps_the_pages(synthetic, tmp_path, backend):
+    source = synthetic(NUM_PAGES)
+    output = str(tmp_path / "dedup.pdf")
+    MergePDFCmd(output, [FilenamePages(source, None), FilenamePages(source, None)], backend=backend, dedup=True).execute()
+
+    assert _page_words(output) == _page_words(source) * 2
+
+
+def test_backends_produce_the_same_pages(synthetic, tmp_path, overlay):
+    source = synthetic(NUM_PAGES)
+    outputs = {}
+    for backend in BACKENDS:
+        outputs[backend] = str(tmp_path / f"merge_content-{backend}.pdf")
+        MergeContentPDFCmd(outputs[backend], [source, overlay], backend=backend).execute()
+
+    first, *others = BACKENDS
+    for backend in others:
+        assert compare_outputs(outputs[first], outputs[backend]) == []
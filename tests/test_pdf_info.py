@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from pdf_backend import get_backend
+from pdf_info import _letters, _roman, find_pdf_files, inspect_pdf, inspect_pdfs, main
+
+NUM_PAGES = 6
+
+
+def test_inspect_pdf(synthetic):
+    info = inspect_pdf(synthetic(NUM_PAGES))
+
+    assert "error" not in info
+    assert (info["pages"], info["encrypted"], info["page_labels"]) == (NUM_PAGES, False, False)
+    assert [(f["name"], f["subtype"], f["embedded"]) for f in info["fonts"]] == [
+        ("HYSMyeongJo-Medium", "Type0", False),
+        ("Helvetica", "Type1", False),
+    ]
+    # the 4 images of the synthetic pages are drawn in turn, each image object is listed once.
+    assert len(info["images"]) == 4
+    assert all((image["width"], image["height"], image["bits"]) == (64, 64, 8) for image in info["images"])
+    assert all(image["filter"][-1] == "FlateDecode" and image["bytes"] > 0 for image in info["images"])
+
+    pages = info["page_info"]
+    assert len(pages) == NUM_PAGES
+    assert all(page["mediabox"] == page["cropbox"] == [0, 0, 396, 612] and page["images"] == 1 for page in pages)
+    assert len({page["hash"] for page in pages}) == NUM_PAGES
+    assert "label" not in pages[0]
+
+
+def test_inspect_pdf_summary(synthetic):
+    info = inspect_pdf(synthetic(NUM_PAGES), page_details=False)
+
+    assert info["pages"] == NUM_PAGES
+    assert "page_info" not in info
+
+
+def test_embedded_font(tmp_path):
+    import reportlab
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    pdfmetrics.registerFont(TTFont("Vera", os.path.join(os.path.dirname(reportlab.__file__), "fonts", "Vera.ttf")))
+    filename = str(tmp_path / "vera.pdf")
+    c = canvas.Canvas(filename)
+    c.setFont("Vera", 12)
+    c.drawString(72, 720, "Embedded")
+    c.save()
+
+    # the TrueType font is embedded as a subset, the Helvetica of the page setup is not.
+    fonts = {f["name"].split("+")[-1]: (f["subtype"], f["embedded"]) for f in inspect_pdf(filename)["fonts"]}
+    assert fonts == {"BitstreamVeraSans-Roman": ("TrueType", True), "Helvetica": ("Type1", False)}
+
+
+def test_page_labels(synthetic, tmp_path):
+    filename = str(tmp_path / "labels.pdf")
+    backend = get_backend("pymupdf")
+    with backend.open_document(synthetic(8)) as doc:
+        doc.set_page_labels(
+            [
+                {"startpage": 0, "style": "r"},
+                {"startpage": 2, "style": "D", "prefix": "A-", "firstpagenum": 5},
+                {"startpage": 5, "style": "A"},
+                {"startpage": 7, "prefix": "Back"},
+            ]
+        )
+        doc.save(filename)
+        expected = [page.get_label() for page in doc]
+
+    info = inspect_pdf(filename)
+
+    assert info["page_labels"] is True
+    assert [page["label"] for page in info["page_info"]] == expected == ["i", "ii", "A-5", "A-6", "A-7", "A", "B", "Back"]
+
+
+@pytest.mark.parametrize("number, text", [(1, "i"), (4, "iv"), (9, "ix"), (14, "xiv"), (40, "xl"), (90, "xc"), (1994, "mcmxciv")])
+def test_roman(number, text):
+    assert _roman(number) == text
+
+
+@pytest.mark.parametrize("number, text", [(1, "a"), (26, "z"), (27, "aa"), (52, "zz"), (53, "aaa")])
+def test_letters(number, text):
+    assert _letters(number) == text
+
+
+@pytest.fixture
+def pdf_dir(synthetic, tmp_path) -> str:
+    """A directory of PDF files in a subdirectory too, a file that isn't a PDF and a broken PDF."""
+    directory = tmp_path / "pdfs"
+    (directory / "sub").mkdir(parents=True)
+    shutil.copyfile(synthetic(3), directory / "b.pdf")
+    shutil.copyfile(synthetic(NUM_PAGES), directory / "sub" / "a.pdf")
+    shutil.copyfile(synthetic(2), directory / "a.pdf")
+    (directory / "broken.pdf").write_bytes(b"%PDF-1.4\nnot a pdf")
+    (directory / "notes.txt").write_text("not a pdf")
+    return str(directory)
+
+
+def test_find_pdf_files(pdf_dir):
+    names = [os.path.relpath(fn, pdf_dir) for fn in find_pdf_files([pdf_dir])]
+
+    assert names == ["a.pdf", "b.pdf", "broken.pdf", os.path.join("sub", "a.pdf")]
+
+
+def test_inspect_pdfs_in_workers_is_in_order(pdf_dir):
+    results = list(inspect_pdfs([pdf_dir], workers=2))
+
+    assert [info["file"] for info in results] == list(find_pdf_files([pdf_dir]))
+    assert results == list(inspect_pdfs([pdf_dir], workers=1))
+    assert [info.get("pages") for info in results] == [2, 3, None, NUM_PAGES]
+
+
+def test_error_lines(pdf_dir, tmp_path):
+    output = str(tmp_path / "info.jsonl")
+
+    # a file that can't be read makes an error line, and the exit code 1.
+    assert main([pdf_dir, "-o", output, "--workers", "2", "--summary"]) == 1
+
+    with open(output, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 4
+    assert [("error" in info) for info in lines] == [False, False, True, False]
+    assert lines[2]["error"].startswith("PdfReadError: ")
+    assert all("page_info" not in info for info in lines)
+
+    assert main([os.path.join(pdf_dir, "a.pdf"), "-o", output]) == 0
@@ -0,0 +1,25 @@
+import os
+
+from command.merge_pdf_cmd import MergePDFCmd
+from pdf_info import open_pdfreader
+from pdf_reader_pool import default_reader_pool
+
+
+def _pooled(filename: str) -> bool:
+    pool = default_reader_pool()
+    return pool._key(filename) in pool._files
+
+
+def test_removed_output_leaves_the_pool(synthetic):
+    cmd = MergePDFCmd("", [synthetic(10)])
+    cmd.execute()
+    output = cmd.output_file
+    with open_pdfreader(output) as reader:
+        assert len(reader.pages) == 10
+    assert _pooled(output)
+
+    # a file mapped by the pool can't be removed on Windows.
+    cmd.close()
+
+    assert not os.path.exists(output)
+    assert not _pooled(output)
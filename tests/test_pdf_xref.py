@@ -0,0 +1,102 @@
+import os
+import shutil
+from typing import Callable, Dict
+
+import pytest
+
+from pdf_backend import get_backend
+from pdf_info import _file_num_pages, get_num_pages
+from pdf_xref import read_page_count
+
+NUM_PAGES = 10
+
+
+def _parsed_page_count(filename: str) -> int:
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(filename, strict=False).pages)
+
+
+def _object_streams(source: str, filename: str) -> str:
+    """Save the source with the objects compressed in object streams and an xref stream."""
+    backend = get_backend("pymupdf")
+    with backend.open_document(source) as doc:
+        doc.save(filename, garbage=1, use_objstms=1)
+    return filename
+
+
+def _incremental(source: str, filename: str) -> str:
+    """Append an update that removes two pages to a copy of the source, chained to its xref by /Prev."""
+    shutil.copyfile(source, filename)
+    backend = get_backend("pymupdf")
+    with backend.open_document(filename) as doc:
+        doc.delete_pages(2, 3)
+        doc.save(filename, incremental=True, encryption=0)
+    return filename
+
+
+def _incremental_object_streams(source: str, filename: str) -> str:
+    """The incremental update of a file with object streams, so both the xref streams are followed."""
+    return _incremental(_object_streams(source, filename + ".objstms.pdf"), filename)
+
+
+# the kind of file -> the function that makes it from a source to a filename
+_MAKERS: Dict[str, Callable[[str, str], str]] = {
+    "xref table": lambda source, filename: source,
+    "object streams": _object_streams,
+    "incremental": _incremental,
+    "incremental object streams": _incremental_object_streams,
+}
+
+
+@pytest.mark.parametrize("kind", list(_MAKERS))
+def test_page_count_is_the_parsed_page_count(synthetic, tmp_path, kind):
+    filename = _MAKERS[kind](synthetic(NUM_PAGES), str(tmp_path / "source.pdf"))
+
+    count = read_page_count(filename)
+    assert count is not None
+    assert count == _parsed_page_count(filename)
+
+
+def test_incremental_update_is_read(synthetic, tmp_path):
+    filename = _incremental(synthetic(NUM_PAGES), str(tmp_path / "source.pdf"))
+
+    with open(filename, "rb") as f:
+        assert b"/Prev" in f.read()[-1024:]
+    assert read_page_count(filename) == NUM_PAGES - 2
+
+
+def test_encrypted_file_is_parsed(synthetic, tmp_path):
+    import pymupdf
+
+    filename = str(tmp_path / "encrypted.pdf")
+    with get_backend("pymupdf").open_document(synthetic(NUM_PAGES)) as doc:
+        doc.save(filename, encryption=pymupdf.PDF_ENCRYPT_RC4_128, owner_pw="owner", use_objstms=1)
+
+    assert read_page_count(filename) is None
+    assert get_num_pages(filename) == NUM_PAGES
+
+
+def test_garbage_after_eof_is_parsed(synthetic, tmp_path):
+    filename = str(tmp_path / "garbage.pdf")
+    shutil.copyfile(synthetic(NUM_PAGES), filename)
+    with open(filename, "ab") as f:
+        f.write(b"\n" + b"garbage " * 600)
+
+    # startxref is looked for in the last 4 KB only.
+    assert read_page_count(filename) is None
+    assert get_num_pages(filename) == NUM_PAGES
+
+
+def test_rewritten_file_is_counted_again(synthetic, tmp_path):
+    filename = str(tmp_path / "rewritten.pdf")
+    shutil.copyfile(synthetic(NUM_PAGES), filename)
+    assert get_num_pages(filename) == NUM_PAGES
+
+    # the count is cached by the size and the modified time of the file, not by its name.
+    shutil.copyfile(synthetic(NUM_PAGES * 2), filename)
+    assert get_num_pages(filename) == NUM_PAGES * 2
+
+    hits = _file_num_pages.cache_info().hits
+    assert get_num_pages(filename) == NUM_PAGES * 2
+    assert _file_num_pages.cache_info().hits == hits + 1
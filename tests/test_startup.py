@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.bench_startup import HEAVY_MODULES, ROOT_DIR, TARGETS, parse_importtime
+
+
+@pytest.mark.parametrize("args", [["-c", "import emc_booklet"], *TARGETS.values()], ids=lambda args: " ".join(args))
+def test_no_heavy_module_at_startup(args):
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+
+    _import_ms, modules = parse_importtime(proc.stderr)
+    # an empty list would mean that the output of -X importtime was not parsed.
+    assert modules
+    assert sorted({m.split(".")[0] for m in modules} & set(HEAVY_MODULES)) == []
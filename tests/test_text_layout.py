@@ -0,0 +1,138 @@
+from argparse import Namespace
+
+import pytest
+
+from command.font_select import AUTO_FONT, KOREAN_FONT, LATIN_FONT
+from command.text_layout import (
+    ELLIPSIS,
+    LEADING_RATIO,
+    MIN_FONT_SIZE,
+    Overflow,
+    TextAlign,
+    fit_size,
+    font_metrics,
+    layout_text,
+    measure,
+    measure_batch,
+    page_contents_params,
+    truncate,
+    wrap,
+)
+
+TEXT = "The quick brown fox jumps over the lazy dog"
+
+
+def _string_width(text: str, font: str, size: float) -> float:
+    from reportlab.pdfbase import pdfmetrics  # type:ignore
+
+    return pdfmetrics.stringWidth(text, font, size)
+
+
+def test_font_metrics_cache():
+    metrics = font_metrics(KOREAN_FONT)
+    assert font_metrics(KOREAN_FONT) is metrics
+
+    width = metrics.text_width("A사")
+    # Latin-1 widths are kept in the array, the others in the dict.
+    assert metrics.latin1[ord("A")] >= 0 and "사" in metrics.others
+    assert metrics.text_width("A사") == width
+    assert metrics.text_width("") == 0
+
+
+@pytest.mark.parametrize("text, font", [(TEXT, LATIN_FONT), ("다람쥐 헌 쳇바퀴", KOREAN_FONT), ("é ü ß", LATIN_FONT)])
+def test_measure_is_reportlab_width(text, font):
+    assert measure(text, font, 12) == pytest.approx(_string_width(text, font, 12))
+
+
+def test_measure_auto_font_sums_the_runs():
+    expected = _string_width("KM ", LATIN_FONT, 14) + _string_width("사역자", KOREAN_FONT, 14)
+    assert measure("KM 사역자", AUTO_FONT, 14) == pytest.approx(expected)
+
+
+def test_measure_batch():
+    texts = [TEXT, "", "KM 사역자", "123"]
+    assert measure_batch(texts, AUTO_FONT, 10) == [measure(text, AUTO_FONT, 10) for text in texts]
+    assert measure_batch([], LATIN_FONT, 10) == []
+
+
+def test_empty_text():
+    assert measure("", LATIN_FONT, 10) == 0
+    assert truncate("", LATIN_FONT, 10, 0) == ""
+    assert wrap("", LATIN_FONT, 10, 50) == [""]
+    assert fit_size("", LATIN_FONT, 10, 50) == 10
+    for font in (LATIN_FONT, AUTO_FONT):
+        placed = layout_text(Namespace(name=font, font_size=10, x=0, y=0, align=TextAlign.LEFT, text=""))
+        assert "".join(p.text for p in placed) == ""
+
+
+def test_truncate():
+    assert truncate(TEXT, LATIN_FONT, 10, 1000) == TEXT
+
+    max_width = measure(TEXT, LATIN_FONT, 10) / 2
+    cut = truncate(TEXT, LATIN_FONT, 10, max_width)
+    assert cut.endswith(ELLIPSIS) and TEXT.startswith(cut[:-1])
+    assert measure(cut, LATIN_FONT, 10) <= max_width
+    # the longest prefix that fits is kept.
+    longer = TEXT[: len(cut)].rstrip() + ELLIPSIS
+    assert longer == cut or measure(longer, LATIN_FONT, 10) > max_width
+
+
+def test_wrap():
+    max_width = measure("The quick brown", LATIN_FONT, 10)
+    lines = wrap(TEXT, LATIN_FONT, 10, max_width)
+
+    assert lines == ["The quick brown", "fox jumps over", "the lazy dog"]
+    assert all(measure(line, LATIN_FONT, 10) <= max_width for line in lines)
+
+
+def test_wrap_breaks_a_word_longer_than_a_line():
+    word = "Supercalifragilistic"
+    max_width = measure(word, LATIN_FONT, 10) / 3
+    lines = wrap(f"a {word}", LATIN_FONT, 10, max_width)
+
+    assert lines[0] == "a" and "".join(lines[1:]) == word
+    assert all(measure(line, LATIN_FONT, 10) <= max_width for line in lines)
+
+
+def test_fit_size():
+    width = measure(TEXT, LATIN_FONT, 10)
+    assert fit_size(TEXT, LATIN_FONT, 10, width) == 10
+    assert fit_size(TEXT, LATIN_FONT, 10, width / 2) == pytest.approx(5)
+    assert fit_size(TEXT, LATIN_FONT, 10, width / 100) == MIN_FONT_SIZE
+
+
+@pytest.mark.parametrize("align, offset", [(TextAlign.LEFT, 0), (TextAlign.CENTER, 0.5), (TextAlign.RIGHT, 1)])
+def test_layout_text_aligns_the_runs(align, offset):
+    content = Namespace(name=AUTO_FONT, font_size=14, x=200, y=500, align=align, text="KM 사역자")
+    placed = layout_text(content)
+    width = measure(content.text, AUTO_FONT, 14)
+
+    assert [(p.text, p.font, p.size, p.y) for p in placed] == [("KM ", LATIN_FONT, 14, 500), ("사역자", KOREAN_FONT, 14, 500)]
+    assert placed[0].x == pytest.approx(200 - width * offset)
+    assert placed[1].x == pytest.approx(placed[0].x + measure("KM ", LATIN_FONT, 14))
+
+
+def test_layout_text_overflow():
+    def content(overflow: Overflow) -> Namespace:
+        return Namespace(name=LATIN_FONT, font_size=10, x=0, y=100, align=TextAlign.LEFT, text=TEXT, max_width=80, overflow=overflow)
+
+    assert [p.text for p in layout_text(content(Overflow.TRUNCATE))] == [truncate(TEXT, LATIN_FONT, 10, 80)]
+
+    wrapped = layout_text(content(Overflow.WRAP))
+    assert [p.text for p in wrapped] == wrap(TEXT, LATIN_FONT, 10, 80)
+    assert [p.y for p in wrapped] == pytest.approx([100 - i * 10 * LEADING_RATIO for i in range(len(wrapped))])
+
+    (fitted,) = layout_text(content(Overflow.FIT))
+    assert (fitted.text, fitted.size) == (TEXT, fit_size(TEXT, LATIN_FONT, 10, 80))
+
+
+def test_page_contents_params():
+    def content_function(page_no: int):
+        if page_no == 1:
+            return None
+        return [Namespace(name=LATIN_FONT, font_size=10, x=page_no, y=0, align=TextAlign.LEFT, text=str(page_no))] * page_no
+
+    contents = page_contents_params(content_function, 3)
+
+    # a page without a list of contents has none.
+    assert contents == [[], [], [{"name": LATIN_FONT, "font_size": 10, "x": 2, "y": 0, "align": TextAlign.LEFT, "text": "2"}] * 2]
@@ -142,6 +142,9 @@ class App:
         return process_exists("access.exe")
 
     def __init__(self, visible: bool = True) -> None:
+        # COM must be initialized on each thread that creates the application.
+        pythoncom.CoInitialize()
+
         # https://stackoverflow.com/questions/50127959/win32-dispatch-vs-win32-gencache-in-python-what-are-the-pros-and-cons
         # self.access = win32com.client.gencache.EnsureDispatch("Access.Application")
         self.access = win32com.client.Dispatch("Access.Application")
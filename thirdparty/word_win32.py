@@ -144,12 +144,16 @@ class App:
     def is_running() -> bool:
         return process_exists("winword.exe")
 
-    def __init__(self, visible: bool = True):
+    def __init__(self, visible: bool = True, dedicated: bool = False):
         pythoncom.CoInitialize()
 
         # https://stackoverflow.com/questions/50127959/win32-dispatch-vs-win32-gencache-in-python-what-are-the-pros-and-cons
         # self.word = win32com.client.gencache.EnsureDispatch("Word.Application")
-        self.word = win32com.client.Dispatch("Word.Application")
+        if dedicated:
+            # a new Word process of its own, which can be quit without closing the documents of the user.
+            self.word = win32com.client.DispatchEx("Word.Application")
+        else:
+            self.word = win32com.client.Dispatch("Word.Application")
 
         if visible:
             self.word.Visible = 1